@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the processing of a whole cohort, with synthetic MED-PC files from benchmark.synthetic.
+Times parsing, latency extraction and port occupancy for cohorts of different sizes,
+and records the throughput and the peak memory of each stage.
+
+The sessions are parsed in chunks into the event table of extract.events,
+because the wide dataframe of 100,000 sessions doesn't fit in memory.
+And the port occupancy is calculated in chunks of sessions, and averaged into one peri-tone curve.
+
+Run from the src directory with:
+    python -m benchmark.cohort --number_of_sessions 10 100 1000 --output cohort_benchmark.csv
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from benchmark.synthetic import write_synthetic_medpc_files
+from extract.dataframe import get_medpc_dataframe_from_list_of_files
+from extract.events import get_event_table_from_medpc_dataframe
+from processing.port import get_peri_tone_inside_port_tensor_from_event_table
+from processing.tone import get_port_entries_and_latencies_from_event_table
+
+# The columns that are needed for the latencies and the port occupancy
+EVENT_COLUMNS = ["(S)CSpresentation", "(P)Portentry", "(N)Portexit"]
+
+def measure_function(function, trace_memory=True, **kwargs):
+    """
+    Measures how long a function takes to run, and the most memory that it used at once.
+    The memory is measured with tracemalloc, which also counts the NumPy arrays.
+    Tracing the memory slows down code that makes a lot of Python objects(i.e. parsing), 
+    so the function is timed without tracing, and then run again with tracing to get the memory.
+
+    Args:
+        function: function
+            - The function to be measured
+        trace_memory: bool
+            - Whether or not to measure the memory
+        **kwargs:
+            - The keyword arguments for the function
+
+    Returns:
+        float, int or None, any
+            - The run time in seconds
+            - The peak memory in bytes. None if the memory isn't traced.
+            - The output of the function
+    """
+    start_time = time.perf_counter()
+    output = function(**kwargs)
+    run_time = time.perf_counter() - start_time
+    if not trace_memory:
+        return run_time, None, output
+
+    tracemalloc.start()
+    try:
+        function(**kwargs)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return run_time, peak_memory, output
+
+def parse_cohort_into_event_table(medpc_files, chunk_size=1000, number_of_workers=1):
+    """
+    Parses MED-PC files in chunks, and combines the event tables of all the chunks.
+    Only one chunk's wide dataframe is kept in memory at a time.
+
+    Args:
+        medpc_files: list
+            - The paths of the MED-PC files
+        chunk_size: int
+            - The number of files that are parsed into a wide dataframe at a time
+        number_of_workers: int or None
+            - The number of processes that read the files at the same time
+
+    Returns:
+        Pandas DataFrame, Pandas DataFrame
+            - The event table of all the files. Same as extract.events.get_event_table_from_medpc_dataframe.
+            - The session dataframe of all the files
+    """
+    all_event_df = []
+    all_session_df = []
+    number_of_sessions = 0
+    for chunk_start in range(0, len(medpc_files), chunk_size):
+        medpc_df = get_medpc_dataframe_from_list_of_files(medpc_files=medpc_files[chunk_start:chunk_start + chunk_size], \
+            number_of_workers=number_of_workers, chunk_size=16)
+        event_df, session_df = get_event_table_from_medpc_dataframe(concatted_medpc_df=medpc_df, columns=EVENT_COLUMNS)
+        # Numbering the sessions of each chunk after the sessions of the chunks before
+        event_df["session_id"] += number_of_sessions
+        session_df.index += number_of_sessions
+        number_of_sessions += len(session_df)
+        all_event_df.append(event_df)
+        all_session_df.append(session_df)
+    return pd.concat(all_event_df, ignore_index=True), pd.concat(all_session_df)
+
+def get_average_peri_tone_occupancy(event_df, session_df, chunk_size=1000, before_tone_duration=2000, after_tone_duration=2000):
+    """
+    Gets the probability that the subject is in the port around the tones, averaged over every tone of every session.
+    The peri-tone arrays are made for a chunk of sessions at a time, so the memory doesn't grow with the number of sessions.
+
+    Args:
+        event_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe, sorted by session ID
+        session_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        chunk_size: int
+            - The number of sessions to make the peri-tone arrays for at a time
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+
+    Returns:
+        Numpy Array
+            - The probability of being in the port for each increment from -before_tone_duration to after_tone_duration
+    """
+    inside_port_sums = np.zeros(before_tone_duration + after_tone_duration)
+    valid_counts = np.zeros(before_tone_duration + after_tone_duration)
+    session_ids = event_df["session_id"].to_numpy()
+    for chunk_start in range(0, len(session_df), chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, len(session_df))
+        event_start, event_stop = np.searchsorted(session_ids, [chunk_start, chunk_stop])
+        chunk_event_df = event_df.iloc[event_start:event_stop].copy()
+        chunk_event_df["session_id"] -= chunk_start
+        peri_tone_tensor, is_valid, _ = get_peri_tone_inside_port_tensor_from_event_table(event_df=chunk_event_df, \
+            session_df=session_df.iloc[chunk_start:chunk_stop], before_tone_duration=before_tone_duration, \
+            after_tone_duration=after_tone_duration, dtype=bool)
+        inside_port_sums += peri_tone_tensor.sum(axis=(0, 1))
+        valid_counts += is_valid.sum(axis=(0, 1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return inside_port_sums / valid_counts
+
+def benchmark_cohort(medpc_files, number_of_sessions_list=(10, 100, 1000), chunk_size=1000, number_of_workers=1, trace_memory=True):
+    """
+    Times parsing, latency extraction and port occupancy for cohorts of different sizes.
+    Each cohort is the first number of sessions of medpc_files.
+
+    Args:
+        medpc_files: list
+            - The paths of the MED-PC files. Must have at least as many files as the biggest cohort.
+        number_of_sessions_list: list
+            - The number of sessions of each cohort
+        chunk_size: int
+            - The number of sessions that are parsed, and that the port occupancy is calculated for, at a time
+        number_of_workers: int or None
+            - The number of processes that read the files at the same time
+        trace_memory: bool
+            - Whether or not to measure the peak memory of each stage. Each stage is run twice to measure it.
+
+    Returns:
+        Pandas DataFrame
+            - A row for each cohort size and stage, with the seconds, sessions per second and peak memory in MB
+    """
+    all_results = []
+    for number_of_sessions in number_of_sessions_list:
+        if number_of_sessions > len(medpc_files):
+            raise ValueError("Only {} files for a cohort of {} sessions".format(len(medpc_files), number_of_sessions))
+        run_time, peak_memory, (event_df, session_df) = measure_function(parse_cohort_into_event_table, trace_memory=trace_memory, \
+            medpc_files=medpc_files[:number_of_sessions], chunk_size=chunk_size, number_of_workers=number_of_workers)
+        all_results.append((number_of_sessions, "parsing", run_time, peak_memory))
+        run_time, peak_memory, _ = measure_function(get_port_entries_and_latencies_from_event_table, trace_memory=trace_memory, \
+            event_df=event_df, session_df=session_df)
+        all_results.append((number_of_sessions, "latency", run_time, peak_memory))
+        run_time, peak_memory, _ = measure_function(get_average_peri_tone_occupancy, trace_memory=trace_memory, \
+            event_df=event_df, session_df=session_df, chunk_size=chunk_size)
+        all_results.append((number_of_sessions, "occupancy", run_time, peak_memory))
+
+    benchmark_df = pd.DataFrame(all_results, columns=["number_of_sessions", "stage", "seconds", "peak_memory_bytes"])
+    benchmark_df["sessions_per_second"] = benchmark_df["number_of_sessions"] / benchmark_df["seconds"]
+    benchmark_df["peak_memory_mb"] = benchmark_df["peak_memory_bytes"] / 1024 ** 2
+    return benchmark_df.drop(columns=["peak_memory_bytes"])
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of parsing, latencies and port occupancy for synthetic cohorts")
+    parser.add_argument("--number_of_sessions", type=int, nargs="+", default=[10, 100, 1000], help="Sizes of the cohorts")
+    parser.add_argument("--data_directory", default=None, \
+        help="Directory with synthetic files from benchmark.synthetic. Files are written to a temporary directory if not given.")
+    parser.add_argument("--chunk_size", type=int, default=1000, help="Number of sessions processed at a time")
+    parser.add_argument("--number_of_workers", type=int, default=1, help="Number of processes that read and write the files")
+    parser.add_argument("--no_memory", action="store_true", help="Don't measure the peak memory, which runs every stage twice")
+    parser.add_argument("--output", default=None, help="CSV file to save the results to")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        data_directory = args.data_directory or temporary_directory
+        medpc_files = sorted(glob.glob(os.path.join(data_directory, "*.txt")))
+        if len(medpc_files) < max(args.number_of_sessions):
+            medpc_files = write_synthetic_medpc_files(output_directory=data_directory, number_of_sessions=max(args.number_of_sessions), \
+                number_of_workers=args.number_of_workers)
+        benchmark_df = benchmark_cohort(medpc_files=medpc_files, number_of_sessions_list=args.number_of_sessions, \
+            chunk_size=args.chunk_size, number_of_workers=args.number_of_workers, trace_memory=not args.no_memory)
+    print(benchmark_df.to_string(index=False))
+    if args.output:
+        benchmark_df.to_csv(args.output, index=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark of extract.parser against medpc2excel.medpc_read for reading MED-PC files into a combined dataframe.
+The files are copied into a temporary directory first because medpc2excel saves an Excel file next to the recordings.
+
+Run from the src directory with:
+    python -m benchmark.parsing --medpc_directory ../jupyter_notebooks/example_recordings
+"""
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+import pandas as pd
+from extract.dataframe import get_medpc_dataframe_from_list_of_files
+
+# The example recordings that come with this repository
+EXAMPLE_RECORDINGS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "jupyter_notebooks", "example_recordings")
+
+def time_function(function, number_of_repeats=1, **kwargs):
+    """
+    Times how long a function takes to run. The fastest time out of all the repeats is used.
+
+    Args:
+        function: function
+            - The function to be timed
+        number_of_repeats: int
+            - How many times the function is run
+        **kwargs:
+            - The keyword arguments for the function
+
+    Returns:
+        float, any
+            - The fastest run time in seconds
+            - The output of the last run of the function
+    """
+    all_run_times = []
+    for _ in range(number_of_repeats):
+        start_time = time.perf_counter()
+        output = function(**kwargs)
+        all_run_times.append(time.perf_counter() - start_time)
+    return min(all_run_times), output
+
+def benchmark_medpc_parsers(medpc_directory=EXAMPLE_RECORDINGS_DIRECTORY, number_of_repeats=3):
+    """
+    Times extract.dataframe.get_medpc_dataframe_from_list_of_files with extract.parser and with medpc2excel.
+    The valid tone, port entry and port exit times of both are also compared to make sure they are the same.
+
+    Args:
+        medpc_directory: str
+            - The directory with the MED-PC files and the MED-PC scripts(.MPC files) of the recordings
+        number_of_repeats: int
+            - How many times each parser is run. The fastest time is used.
+
+    Returns:
+        Pandas DataFrame
+            - The parser as the index, with the total seconds, seconds per file and files per second as the columns
+    """
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        # Copying the recordings and scripts so that medpc2excel doesn't add Excel files to the original directory
+        for file_path in glob.glob(os.path.join(medpc_directory, "*.txt")) + glob.glob(os.path.join(medpc_directory, "*.MPC")):
+            shutil.copy(file_path, temporary_directory)
+        medpc_files = sorted(glob.glob(os.path.join(temporary_directory, "*.txt")))
+
+        parser_to_run_time = {}
+        parser_to_medpc_df = {}
+        for parser, use_medpc2excel in [("medpc2excel", True), ("extract.parser", False)]:
+            parser_to_run_time[parser], parser_to_medpc_df[parser] = time_function(get_medpc_dataframe_from_list_of_files, \
+                number_of_repeats=number_of_repeats, medpc_files=medpc_files, use_medpc2excel=use_medpc2excel)
+
+    # medpc2excel adds the values of unlabeled arrays to the end of the labeled arrays, so only the real values are compared
+    for column in ["(P)Portentry", "(N)Portexit"]:
+        pd.testing.assert_series_equal(*[medpc_df.dropna(subset=[column]).groupby("file_path")[column].apply(list) \
+            for medpc_df in parser_to_medpc_df.values()])
+
+    benchmark_df = pd.DataFrame({"total_seconds": parser_to_run_time})
+    benchmark_df["seconds_per_file"] = benchmark_df["total_seconds"] / len(medpc_files)
+    benchmark_df["files_per_second"] = len(medpc_files) / benchmark_df["total_seconds"]
+    benchmark_df["speedup"] = benchmark_df.loc["medpc2excel", "total_seconds"] / benchmark_df["total_seconds"]
+    return benchmark_df
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of extract.parser against medpc2excel.medpc_read")
+    parser.add_argument("--medpc_directory", default=EXAMPLE_RECORDINGS_DIRECTORY, help="Directory with the MED-PC files and .MPC scripts")
+    parser.add_argument("--number_of_repeats", type=int, default=3, help="How many times each parser is run")
+    args = parser.parse_args()
+    print(benchmark_medpc_parsers(medpc_directory=args.medpc_directory, number_of_repeats=args.number_of_repeats))
+
+if __name__ == '__main__': 
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark of processing.port.scale_times_to_whole_numbers against Series.apply with processing.port.scale_time_to_whole_number.
+This is how notebook 03 scales the port entry, port exit and tone columns.
+
+Run from the src directory with:
+    python -m benchmark.scaling --number_of_copies 10
+"""
+import argparse
+import glob
+import os
+import numpy as np
+import pandas as pd
+from benchmark.parsing import EXAMPLE_RECORDINGS_DIRECTORY, time_function
+from extract.dataframe import get_medpc_dataframe_from_list_of_files
+from processing.port import scale_time_to_whole_number, scale_times_to_whole_numbers
+
+# The columns that notebook 03 scales
+TIME_COLUMNS = ["(P)Portentry", "(N)Portexit", "(S)CSpresentation"]
+
+def scale_columns_with_apply(medpc_df, columns=TIME_COLUMNS):
+    """
+    Scales each column with Series.apply, the way that notebook 03 does it.
+
+    Args:
+        medpc_df: Pandas DataFrame
+            - Output of extract.dataframe.get_medpc_dataframe_from_list_of_files
+        columns: list
+            - The columns to scale
+
+    Returns:
+        Pandas DataFrame
+            - The scaled columns
+    """
+    return pd.DataFrame({column: medpc_df[column].apply(scale_time_to_whole_number) for column in columns})
+
+def benchmark_time_scaling(medpc_directory=EXAMPLE_RECORDINGS_DIRECTORY, number_of_copies=1, number_of_repeats=3):
+    """
+    Times scaling the time columns of the example recordings with Series.apply and with scale_times_to_whole_numbers.
+    The recordings can be copied to get a bigger dataframe, which is closer to the size of a whole cohort.
+
+    Args:
+        medpc_directory: str
+            - The directory with the MED-PC files and the MED-PC scripts(.MPC files) of the recordings
+        number_of_copies: int
+            - The number of times that the dataframe of all the recordings is repeated
+        number_of_repeats: int
+            - How many times each method is run. The fastest time is used.
+
+    Returns:
+        Pandas DataFrame
+            - The method as the index, with the total seconds, rows per second and speedup as the columns.
+            - Also has the number of values that are different from the Series.apply method
+    """
+    medpc_df = get_medpc_dataframe_from_list_of_files(medpc_files=sorted(glob.glob(os.path.join(medpc_directory, "*.txt"))))
+    medpc_df = pd.concat([medpc_df[TIME_COLUMNS]] * number_of_copies, ignore_index=True)
+
+    method_to_run_time = {}
+    method_to_scaled_df = {}
+    method_to_run_time["Series.apply"], method_to_scaled_df["Series.apply"] = time_function(scale_columns_with_apply, \
+        number_of_repeats=number_of_repeats, medpc_df=medpc_df)
+    for rounding in ["truncate", "round"]:
+        method = "scale_times_to_whole_numbers({})".format(rounding)
+        method_to_run_time[method], method_to_scaled_df[method] = time_function(scale_times_to_whole_numbers, \
+            number_of_repeats=number_of_repeats, times=medpc_df, rounding=rounding)
+
+    benchmark_df = pd.DataFrame({"total_seconds": method_to_run_time})
+    benchmark_df["rows_per_second"] = len(medpc_df) / benchmark_df["total_seconds"]
+    benchmark_df["speedup"] = benchmark_df.loc["Series.apply", "total_seconds"] / benchmark_df["total_seconds"]
+    benchmark_df["values_different_from_apply"] = [int(np.sum(scaled_df.to_numpy() != method_to_scaled_df["Series.apply"].to_numpy())) \
+        for scaled_df in method_to_scaled_df.values()]
+    return benchmark_df
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the vectorized time scaling against Series.apply")
+    parser.add_argument("--medpc_directory", default=EXAMPLE_RECORDINGS_DIRECTORY, help="Directory with the MED-PC files and .MPC scripts")
+    parser.add_argument("--number_of_copies", type=int, default=1, help="How many times the recordings are repeated")
+    parser.add_argument("--number_of_repeats", type=int, default=3, help="How many times each method is run")
+    args = parser.parse_args()
+    print(benchmark_time_scaling(medpc_directory=args.medpc_directory, number_of_copies=args.number_of_copies, \
+        number_of_repeats=args.number_of_repeats))
+
+if __name__ == '__main__': 
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Functions for generating synthetic MED-PC files that look like the recordings of the levelNP_CS_reward_laserepochON1st_noshock MSN.
+The files have the same header, the A: to Z: scalars and the array blocks in the same order and formatting as the real files.
+So they can be read by extract.parser and medpc2excel, and used to benchmark the processing of cohorts of any size.
+
+Run from the src directory to write 1000 sessions:
+    python -m benchmark.synthetic ./synthetic_recordings --number_of_sessions 1000
+"""
+import argparse
+from datetime import datetime, timedelta
+from functools import partial
+import os
+import shutil
+import subprocess
+import numpy as np
+from benchmark.parsing import EXAMPLE_RECORDINGS_DIRECTORY
+from extract.parallel import map_in_order
+from processing.video import get_ffmpeg_executable
+
+# The MSN that the synthetic files copy
+SYNTHETIC_MSN = "levelNP_CS_reward_laserepochON1st_noshock"
+# The lists that are declared in the MSN. V is the ITI values in MED-PC ticks(1000 per 10 seconds)
+MSN_LISTS = {
+    "V": [8000.0, 9000.0, 8000.0, 9000.0, 10000.0, 9500.0, 9000.0, 8000.0, 9000.0, 10000.0, 9000.0, 12000.0] + [9000.0] * 47,
+    "E": [12000.0, 8000.0, 9500.0],
+    "J": [0.7, 0.7, 0.7, 0.7],
+    "M": [1.0] * 40
+    }
+# The length of the arrays that MED-PC prints all of, because they don't have an end marker
+FULL_ARRAY_LENGTH = 2501
+# The length of the counter array
+COUNTER_ARRAY_LENGTH = 11
+# The time of the first tone in seconds
+FIRST_TONE_TIME = 60.01
+# The number of seconds after the tone that the sucrose is delivered
+SUCROSE_DELAY = 4
+
+def get_port_visits(rng, session_duration, tone_times, port_visit_rate=0.25, response_probability=0.8, mean_latency=2.0, \
+        mean_visit_duration=0.5):
+    """
+    Generates the port entries and exits of a session.
+    Visits happen randomly throughout the session, and the subject also goes to the port after most tones.
+
+    Args:
+        rng: numpy.random.Generator
+            - The random number generator of the session
+        session_duration: float
+            - The length of the session in seconds
+        tone_times: Numpy Array
+            - The tone times of the session in seconds
+        port_visit_rate: float
+            - The number of random port visits per second
+        response_probability: float
+            - The chance that the subject goes to the port after a tone
+        mean_latency: float
+            - The average number of seconds from a tone to the port entry after it
+        mean_visit_duration: float
+            - The average number of seconds that the subject stays in the port
+
+    Returns:
+        Numpy Array, Numpy Array
+            - The port entry times, rounded to 10ms
+            - The port exit times, rounded to 10ms
+    """
+    random_entries = rng.uniform(0, session_duration, rng.poisson(port_visit_rate * session_duration))
+    responded_tones = tone_times[rng.random(len(tone_times)) < response_probability]
+    response_entries = responded_tones + rng.exponential(mean_latency, len(responded_tones))
+    port_entries = np.round(np.sort(np.concatenate([random_entries, response_entries])), 2)
+    port_exits = np.round(port_entries + 0.02 + rng.exponential(mean_visit_duration, len(port_entries)), 2)
+
+    # Removing the visits that start before the last visit ended, so that the entries and exits alternate
+    is_kept = np.ones(len(port_entries), dtype=bool)
+    last_exit = -np.inf
+    for index, (port_entry, port_exit) in enumerate(zip(port_entries, port_exits)):
+        if port_entry <= last_exit:
+            is_kept[index] = False
+        else:
+            last_exit = port_exit
+    is_kept &= port_exits < session_duration
+    return port_entries[is_kept], port_exits[is_kept]
+
+def generate_medpc_session(seed, session_duration=3726.5, number_of_tones=41, port_visit_rate=0.25):
+    """
+    Generates the variables of a MED-PC session of the levelNP_CS_reward_laserepochON1st_noshock MSN.
+    The output is the same as extract.parser.get_medpc_arrays_from_file, without the metadata.
+
+    Args:
+        seed: int or list
+            - The seed of the random number generator. i.e. [base seed, session number]
+        session_duration: float
+            - The length of the session in seconds
+        number_of_tones: int
+            - The number of tones in the session. The tones are spread out evenly with some jitter.
+        port_visit_rate: float
+            - The number of random port visits per second, on top of the visits after the tones
+
+    Returns:
+        dict
+            - "scalars": The variable letter as the key, and the float as the value
+            - "arrays": The variable letter as the key, and the 1D Numpy Array of float64 as the value
+    """
+    rng = np.random.default_rng(seed)
+    # Tones are spread out over the session, with the last one more than 20 seconds before the end
+    inter_tone_interval = (session_duration - FIRST_TONE_TIME - 20) / max(number_of_tones, 1)
+    tone_times = FIRST_TONE_TIME + np.arange(number_of_tones) * inter_tone_interval
+    tone_times = np.round(np.floor(tone_times + rng.uniform(0, inter_tone_interval / 4, number_of_tones)) + 0.01, 2)
+    port_entries, port_exits = get_port_visits(rng=rng, session_duration=session_duration, tone_times=tone_times, \
+        port_visit_rate=port_visit_rate)
+    sucrose_times = np.floor(tone_times) + SUCROSE_DELAY
+
+    cs_types = np.zeros(FULL_ARRAY_LENGTH)
+    cs_types[:number_of_tones] = 1
+    counters = np.zeros(COUNTER_ARRAY_LENGTH)
+    counters[[0, 1, 2, 4, 5, 8]] = [len(port_entries), number_of_tones, len(sucrose_times), len(port_exits), number_of_tones, \
+        len(sucrose_times)]
+
+    arrays = {
+        "B": np.zeros(FULL_ARRAY_LENGTH),
+        "C": counters,
+        "E": np.array(MSN_LISTS["E"]),
+        "J": np.array(MSN_LISTS["J"]),
+        "K": cs_types,
+        "M": np.array(MSN_LISTS["M"]),
+        "N": port_exits,
+        "P": port_entries,
+        "Q": sucrose_times,
+        "R": np.full(len(sucrose_times), (SUCROSE_DELAY - 0.01) * 100),
+        "S": tone_times,
+        "V": np.array(MSN_LISTS["V"]),
+        "W": np.zeros(FULL_ARRAY_LENGTH)
+        }
+    last_tone_time = tone_times[-1] if number_of_tones else 0.0
+    scalars = {"A": 2099.0, "D": 9000.0, "F": 2000.0, "G": 0.0, "H": 0.0, "I": 0.0, "L": 0.0, "O": 0.0, "T": session_duration, \
+        "U": last_tone_time, "X": 0.0, "Y": 0.0, "Z": 0.0}
+    return {"scalars": scalars, "arrays": arrays}
+
+def format_medpc_file(meta_data, scalars, arrays):
+    """
+    Formats the variables of a session as the text of a MED-PC data file, with Windows line endings.
+    The scalars are written before the arrays, and both are in alphabetical order like MED-PC does.
+
+    Args:
+        meta_data: dict
+            - The header name as the key, and the header value as the value
+        scalars: dict
+            - The variable letter as the key, and the float as the value
+        arrays: dict
+            - The variable letter as the key, and the 1D Numpy Array as the value
+
+    Returns:
+        str
+            - The text of the MED-PC file
+    """
+    lines = ["File: {}".format(meta_data["File"]), "", ""]
+    lines += ["{}: {}".format(header, value) for header, value in meta_data.items() if header != "File"]
+    lines += ["{}:{:>12.3f}".format(letter, value) for letter, value in sorted(scalars.items())]
+    for letter, values in sorted(arrays.items()):
+        lines.append("{}:".format(letter))
+        lines += ["{:>6}:{:>13.3f}".format(index, value) for index, value in enumerate(values.tolist())]
+    return "\r\n".join(lines) + "\r\n"
+
+def write_synthetic_medpc_file(session_number, output_directory, seed=0, number_of_subjects=16, subjects_per_cage=4, \
+        start_date=datetime(2022, 5, 4, 8, 42), session_duration=3726.5, number_of_tones=41, port_visit_rate=0.25):
+    """
+    Generates one synthetic session and writes it as a MED-PC file.
+    The sessions go through all the subjects each day, so the date and subject are different for every session number.
+
+    Args:
+        session_number: int
+            - The number of the session. Also used in the seed, so each session is different but reproducible.
+        output_directory: str
+            - The directory to write the file to
+        seed: int
+            - The base seed of all the sessions
+        number_of_subjects: int
+            - The number of subjects in the cohort
+        subjects_per_cage: int
+            - The number of subjects in each cage, which is saved as the "Group" metadata
+        start_date: datetime
+            - The date and time of the first session
+        session_duration: float
+            - The length of the session in seconds
+        number_of_tones: int
+            - The number of tones in the session
+        port_visit_rate: float
+            - The number of random port visits per second, on top of the visits after the tones
+
+    Returns:
+        str
+            - The path of the file
+    """
+    day, subject_index = divmod(session_number, number_of_subjects)
+    cage = subject_index // subjects_per_cage + 1
+    box = subject_index % subjects_per_cage + 1
+    subject = "{}.{}".format(cage, box)
+    start_time = start_date + timedelta(days=day, minutes=subject_index)
+    end_time = start_time + timedelta(seconds=session_duration)
+    file_name = "{}_Subject {}.txt".format(start_time.strftime("%Y-%m-%d_%Hh%Mm"), subject)
+    meta_data = {
+        "File": "C:\\MED-PC\\Data\\{}".format(file_name),
+        "Start Date": start_time.strftime("%m/%d/%y"),
+        "End Date": end_time.strftime("%m/%d/%y"),
+        "Subject": subject,
+        "Experiment": "Synthetic",
+        "Group": "Cage {}".format(cage),
+        "Box": str(box),
+        "Start Time": start_time.strftime("%H:%M:%S"),
+        "End Time": end_time.strftime("%H:%M:%S"),
+        "MSN": SYNTHETIC_MSN
+        }
+    session = generate_medpc_session(seed=[seed, session_number], session_duration=session_duration, number_of_tones=number_of_tones, \
+        port_visit_rate=port_visit_rate)
+    file_path = os.path.join(output_directory, file_name)
+    with open(file_path, "w", newline="") as file:
+        file.write(format_medpc_file(meta_data=meta_data, scalars=session["scalars"], arrays=session["arrays"]))
+    return file_path
+
+def write_synthetic_medpc_files(output_directory, number_of_sessions, seed=0, number_of_subjects=16, session_duration=3726.5, \
+        number_of_tones=41, port_visit_rate=0.25, number_of_workers=1, chunk_size=64):
+    """
+    Writes a cohort of synthetic MED-PC files, along with the MED-PC script(.MPC file) that is used to name the columns.
+
+    Args:
+        output_directory: str
+            - The directory to write the files to. It is created if it doesn't exist.
+        number_of_sessions: int
+            - The number of files to write
+        seed: int
+            - The base seed of all the sessions. The same seed always writes the same files.
+        number_of_subjects: int
+            - The number of subjects in the cohort
+        session_duration: float
+            - The length of each session in seconds
+        number_of_tones: int
+            - The number of tones in each session
+        port_visit_rate: float
+            - The number of random port visits per second, on top of the visits after the tones
+        number_of_workers: int or None
+            - The number of processes that write the files at the same time. None uses the number of CPUs on the computer.
+        chunk_size: int
+            - The number of files that are sent to a worker process at a time
+
+    Returns:
+        list
+            - The paths of the files, in the order of the session numbers
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    shutil.copy(os.path.join(EXAMPLE_RECORDINGS_DIRECTORY, "{}.MPC".format(SYNTHETIC_MSN)), output_directory)
+    write_file = partial(write_synthetic_medpc_file, output_directory=output_directory, seed=seed, number_of_subjects=number_of_subjects, \
+        session_duration=session_duration, number_of_tones=number_of_tones, port_visit_rate=port_visit_rate)
+    return list(map_in_order(write_file, range(number_of_sessions), number_of_workers=number_of_workers, chunk_size=chunk_size))
+
+def write_synthetic_video(video_path, video_start_time="2022-07-01 12:48:15", duration=120, frame_rate=30, keyframe_interval=60, \
+        ffmpeg_executable=None):
+    """
+    Writes a synthetic video with a clock on it(ffmpeg's test pattern), along with a timestamp CSV of each frame like the one 
+    that is saved with the videos of the sessions. Used to test cutting the clips of processing.video without real videos.
+
+    Args:
+        video_path: str
+            - The path to write the video to. The timestamp CSV is written next to it with a .csv extension.
+        video_start_time: str
+            - The date and time of the first frame
+        duration: float
+            - The length of the video in seconds
+        frame_rate: int
+            - The number of frames per second
+        keyframe_interval: int
+            - The number of frames between each keyframe
+        ffmpeg_executable: str
+            - The path of the ffmpeg executable. None uses processing.video.get_ffmpeg_executable
+
+    Returns:
+        str
+            - The path of the timestamp CSV
+    """
+    ffmpeg_executable = ffmpeg_executable or get_ffmpeg_executable()
+    subprocess.run([ffmpeg_executable, "-hide_banner", "-nostdin", "-loglevel", "error", "-y", "-f", "lavfi", \
+        "-i", "testsrc=duration={}:size=320x240:rate={}".format(duration, frame_rate), "-c:v", "mpeg4", "-q:v", "5", \
+        "-g", str(keyframe_interval), video_path], check=True)
+
+    first_frame_time = datetime.strptime(video_start_time, "%Y-%m-%d %H:%M:%S")
+    frame_times = [first_frame_time + timedelta(seconds=frame_number / frame_rate) for frame_number in range(int(duration * frame_rate))]
+    timestamp_path = "{}.csv".format(os.path.splitext(video_path)[0])
+    with open(timestamp_path, "w") as file:
+        for frame_number, frame_time in enumerate(frame_times):
+            file.write("{},{}\n".format(frame_number, frame_time.strftime("%Y-%m-%d %H:%M:%S.%f")))
+    return timestamp_path
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+    parser = argparse.ArgumentParser(description="Write synthetic MED-PC files")
+    parser.add_argument("output_directory", help="Directory to write the files to")
+    parser.add_argument("--number_of_sessions", type=int, default=100, help="Number of files to write")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed of all the sessions")
+    parser.add_argument("--number_of_subjects", type=int, default=16, help="Number of subjects in the cohort")
+    parser.add_argument("--session_duration", type=float, default=3726.5, help="Length of each session in seconds")
+    parser.add_argument("--number_of_tones", type=int, default=41, help="Number of tones in each session")
+    parser.add_argument("--port_visit_rate", type=float, default=0.25, help="Random port visits per second")
+    parser.add_argument("--number_of_workers", type=int, default=1, help="Number of processes that write the files")
+    args = parser.parse_args()
+    write_synthetic_medpc_files(output_directory=args.output_directory, number_of_sessions=args.number_of_sessions, seed=args.seed, \
+        number_of_subjects=args.number_of_subjects, session_duration=args.session_duration, number_of_tones=args.number_of_tones, \
+        port_visit_rate=args.port_visit_rate, number_of_workers=args.number_of_workers)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Functions for caching the parsed MED-PC files on disk, so that unchanged files don't have to be parsed again.
+Each parsed file is saved as an uncompressed .npz file, with one NumPy array per MED-PC variable.
+The cache key is made from the path, size and modification time of the file, and extract.parser.PARSER_VERSION.
+So a file that is changed, or a new version of the parser, automatically gets a new cache file.
+
+The least recently used cache files are deleted once the cache gets bigger than a maximum size.
+"""
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+from extract.parser import PARSER_VERSION, get_medpc_arrays_from_file
+
+# The default maximum size of the cache directory before the least recently used files are deleted
+DEFAULT_MAX_CACHE_SIZE_BYTES = 2 * 1024 ** 3
+
+def get_file_signature(file_path):
+    """
+    Gets the values that tell whether or not a file has changed since it was last read.
+
+    Args:
+        file_path: str
+            - The path to the file
+
+    Returns:
+        dict
+            - The absolute path, the size in bytes and the modification time in nanoseconds of the file
+    """
+    file_stat = os.stat(file_path)
+    return {"path": os.path.abspath(file_path), "size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns}
+
+def get_cache_file_path(file_path, cache_directory):
+    """
+    Gets the path of the cache file for a MED-PC file.
+    The name of the cache file is a hash of the file signature and the parser version.
+
+    Args:
+        file_path: str
+            - The path to the MED-PC data file
+        cache_directory: str
+            - The directory that has all the cache files
+
+    Returns:
+        str
+            - The path to the .npz cache file. The file might not exist yet.
+    """
+    cache_key_values = get_file_signature(file_path=file_path)
+    cache_key_values["parser_version"] = PARSER_VERSION
+    cache_key = hashlib.sha1(json.dumps(cache_key_values, sort_keys=True).encode()).hexdigest()
+    return os.path.join(cache_directory, "{}.npz".format(cache_key))
+
+def save_parsed_medpc_file(parsed_file, cache_file_path):
+    """
+    Saves the output of extract.parser.get_medpc_arrays_from_file as a .npz file.
+    The file is written under a temporary name first, so that other processes never read a half written file.
+
+    Args:
+        parsed_file: dict
+            - The output of extract.parser.get_medpc_arrays_from_file
+        cache_file_path: str
+            - The path to save the .npz file to
+    """
+    name_to_array = {"array_{}".format(letter): values for letter, values in parsed_file["arrays"].items()}
+    name_to_array["scalar_letters"] = np.array(list(parsed_file["scalars"].keys()), dtype=str)
+    name_to_array["scalar_values"] = np.array(list(parsed_file["scalars"].values()), dtype=np.float64)
+    name_to_array["meta_data"] = np.array(json.dumps(parsed_file["meta_data"]))
+    name_to_array["date"] = np.array(parsed_file["date"])
+
+    temporary_file_path = "{}.{}.tmp".format(cache_file_path, os.getpid())
+    with open(temporary_file_path, "wb") as file:
+        np.savez(file, **name_to_array)
+    os.replace(temporary_file_path, cache_file_path)
+
+def load_parsed_medpc_file(cache_file_path, array_letters=None):
+    """
+    Loads a .npz file that was saved by extract.cache.save_parsed_medpc_file.
+    Each array is stored separately in the .npz file, so the arrays that aren't in array_letters are never read.
+
+    Args:
+        cache_file_path: str
+            - The path to the .npz file
+        array_letters: list or None
+            - The letters of the arrays to load. None loads all of them.
+
+    Returns:
+        dict
+            - The same dictionary as the output of extract.parser.get_medpc_arrays_from_file
+    """
+    with np.load(cache_file_path) as cache_file:
+        arrays = {name[len("array_"):]: cache_file[name] for name in cache_file.files \
+            if name.startswith("array_") and (array_letters is None or name[len("array_"):] in array_letters)}
+        scalars = dict(zip(cache_file["scalar_letters"].tolist(), cache_file["scalar_values"].tolist()))
+        meta_data = json.loads(cache_file["meta_data"].item())
+        date = cache_file["date"].item()
+    return {"meta_data": meta_data, "date": date, "scalars": scalars, "arrays": arrays}
+
+def get_medpc_arrays_from_file_with_cache(file_path, cache_directory, array_letters=None):
+    """
+    Gets the output of extract.parser.get_medpc_arrays_from_file from the cache if the file hasn't changed.
+    Otherwise the file is parsed and the output is saved to the cache.
+    The modification time of the cache file is updated every time that it is used, to keep track of the least recently used files.
+    The cache always has all the arrays of the file, so that the same cache file can be used by analyses that need different arrays.
+
+    Args:
+        file_path: str
+            - The path to the MED-PC data file
+        cache_directory: str
+            - The directory that has all the cache files. It is created if it doesn't exist.
+        array_letters: list or None
+            - The letters of the arrays to return. None returns all of them.
+
+    Returns:
+        dict
+            - The same dictionary as the output of extract.parser.get_medpc_arrays_from_file
+    """
+    cache_file_path = get_cache_file_path(file_path=file_path, cache_directory=cache_directory)
+    if os.path.exists(cache_file_path):
+        try:
+            parsed_file = load_parsed_medpc_file(cache_file_path=cache_file_path, array_letters=array_letters)
+            # Marking the cache file as recently used
+            os.utime(cache_file_path)
+            return parsed_file
+        # The cache file can be removed by another process or be unreadable, so the file is parsed again
+        except (OSError, ValueError, KeyError):
+            pass
+    parsed_file = get_medpc_arrays_from_file(file_path=file_path)
+    os.makedirs(cache_directory, exist_ok=True)
+    save_parsed_medpc_file(parsed_file=parsed_file, cache_file_path=cache_file_path)
+    if array_letters is not None:
+        parsed_file["arrays"] = {letter: values for letter, values in parsed_file["arrays"].items() if letter in array_letters}
+    return parsed_file
+
+def evict_least_recently_used_cache_files(cache_directory, max_cache_size_bytes=DEFAULT_MAX_CACHE_SIZE_BYTES):
+    """
+    Deletes the least recently used cache files until the cache directory is smaller than the maximum size.
+    This goes through the whole directory, so it should be run once after a batch of files rather than after every file.
+
+    Args:
+        cache_directory: str
+            - The directory that has all the cache files
+        max_cache_size_bytes: int
+            - The maximum total size of all the cache files
+
+    Returns:
+        list
+            - The paths of all the cache files that were deleted
+    """
+    cache_file_stats = []
+    for cache_file_path in glob.glob(os.path.join(cache_directory, "*.npz")):
+        try:
+            cache_file_stats.append((cache_file_path, os.stat(cache_file_path)))
+        # Another process could have deleted the file already
+        except FileNotFoundError:
+            continue
+    total_size = sum(file_stat.st_size for _, file_stat in cache_file_stats)
+
+    deleted_cache_files = []
+    # Going from the least recently used file to the most recently used file
+    for cache_file_path, file_stat in sorted(cache_file_stats, key=lambda path_and_stat: path_and_stat[1].st_mtime_ns):
+        if total_size <= max_cache_size_bytes:
+            break
+        try:
+            os.remove(cache_file_path)
+            deleted_cache_files.append(cache_file_path)
+        except FileNotFoundError:
+            pass
+        total_size -= file_stat.st_size
+    return deleted_cache_files
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+
+if __name__ == '__main__':
+    main()
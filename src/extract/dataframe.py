@@ -6,9 +6,16 @@ For more information on the MED-PC's programming language, Trans:
 - https://www.med-associates.com/wp-content/uploads/2017/01/DOC-003-R3.4-SOF-735-MED-PC-IV-PROGRAMMER%E2%80%99S-MANUAL.pdf
 """
 from collections import defaultdict
+from functools import partial
 import traceback
+import numpy as np
 import pandas as pd 
 from medpc2excel.medpc_read import medpc_read
+from extract.cache import DEFAULT_MAX_CACHE_SIZE_BYTES, evict_least_recently_used_cache_files, get_medpc_arrays_from_file_with_cache
+from extract.metadata import scan_med_pc_meta_data
+from extract.parallel import map_in_order
+from extract.parser import get_array_letters_from_labels, get_medpc_arrays_from_file, get_msn_file_path, get_msn_schema
+from profiling.stages import profile_stage
 
 def get_first_key_from_dictionary(input_dictionary):
     """
@@ -47,9 +54,128 @@ def get_medpc_dataframe_from_medpc_read_output(medpc_read_dictionary_output):
     # Dataframe must use both the date and subject key with the inputted dictionary
     return date, subject, medpc_read_dictionary_output[date][subject]
 
-def get_medpc_dataframe_from_list_of_files(medpc_files, stop_with_error=False):
+def get_medpc_dataframe_from_medpc_arrays(arrays, array_letter_to_label):
     """
-    Gets the dataframe from the output from medpc2excel.medpc_read that extracts data from a MED-PC file.
+    Makes a dataframe from the arrays parsed out of a MED-PC file with extract.parser.get_medpc_arrays_from_file.
+    Each array becomes a column that is named by its label. Shorter arrays are padded with NaNs,
+    so that the dataframe is the same as the one made by medpc2excel.medpc_read.
+
+    Args:
+        arrays: dict
+            - The array letter as the key, and the 1D Numpy Array of the values as the value
+        array_letter_to_label: dict
+            - The array letter as the key, and the column label as the value
+            - Usually from extract.parser.get_array_labels_from_msn_file
+            - Only the arrays in here are added to the dataframe, in the same order
+
+    Returns:
+        Pandas DataFrame
+            - The dataframe of all the labeled arrays
+    """
+    labeled_letters = [letter for letter in array_letter_to_label if letter in arrays]
+    max_length = max([len(arrays[letter]) for letter in labeled_letters], default=0)
+    # Filling in one NaN padded block is much faster than concatenating a Series for each array
+    padded_arrays = np.full((max_length, len(labeled_letters)), np.nan)
+    for column_index, letter in enumerate(labeled_letters):
+        padded_arrays[:len(arrays[letter]), column_index] = arrays[letter]
+    return pd.DataFrame(padded_arrays, columns=[array_letter_to_label[letter] for letter in labeled_letters])
+
+def get_medpc_dataframe_from_file(file_path, msn_directory=None, cache_directory=None, columns=None):
+    """
+    Gets the dataframe of all the labeled arrays from a MED-PC file without using medpc2excel.
+    The labels come from the MED-PC script(.MPC file) of the recording, the same way as medpc2excel.
+    Each script is only read once per process with extract.parser.get_msn_schema.
+    When columns are given, the script is looked up from the metadata before the file is parsed,
+    so that only the arrays of those columns are parsed.
+
+    Args:
+        file_path: str
+            - The path to the MED-PC data file
+        msn_directory: str
+            - The directory that has the MED-PC scripts.
+            - Defaults to the directory of the MED-PC data file(which is what medpc2excel expects)
+        cache_directory: str
+            - The directory to cache the parsed file in with extract.cache. 
+            - The file is only parsed again if it has changed. None doesn't use a cache.
+        columns: list or None
+            - The column labels to get, i.e. ["(S)CSpresentation", "(P)Portentry", "(N)Portexit"]. None gets all of them.
+            - The dataframe is only as long as the longest of these arrays
+
+    Returns:
+        str, str, Pandas DataFrame
+            - The date of the recording formatted as YYYYMMDD
+            - The subject of the recording
+            - The dataframe extracted from the MED-PC file
+    """
+    array_letters = None
+    if columns is not None:
+        # The name of the script is in the metadata at the start of the file, so the rest of the file doesn't have to be parsed first
+        msn_file_path = get_msn_file_path(medpc_file_path=file_path, msn=scan_med_pc_meta_data(file_path=file_path)["MSN"], \
+            msn_directory=msn_directory)
+        array_letter_to_label = get_array_letters_from_labels(array_letter_to_label=get_msn_schema(msn_file_path=msn_file_path), \
+            array_labels=columns)
+        array_letters = list(array_letter_to_label)
+    with profile_stage("extract.dataframe.parse_file", file_path=file_path):
+        if cache_directory is None:
+            parsed_file = get_medpc_arrays_from_file(file_path=file_path, array_letters=array_letters)
+        else:
+            parsed_file = get_medpc_arrays_from_file_with_cache(file_path=file_path, cache_directory=cache_directory, \
+                array_letters=array_letters)
+    if columns is None:
+        msn_file_path = get_msn_file_path(medpc_file_path=file_path, msn=parsed_file["meta_data"]["MSN"], msn_directory=msn_directory)
+        array_letter_to_label = get_msn_schema(msn_file_path=msn_file_path)
+    medpc_df = get_medpc_dataframe_from_medpc_arrays(arrays=parsed_file["arrays"], array_letter_to_label=array_letter_to_label)
+    return parsed_file["date"], parsed_file["meta_data"]["Subject"], medpc_df
+
+def get_medpc_dataframe_with_traceback(file_path, use_medpc2excel=False, msn_directory=None, cache_directory=None, columns=None):
+    """
+    Gets the dataframe of the data from one MED-PC file, with the date, subject and file path added as columns.
+    Any error is caught and returned as a traceback, so that the file can be skipped over by the caller.
+    This is what each worker process runs in extract.dataframe.get_medpc_dataframe_from_list_of_files.
+
+    Args:
+        file_path: str
+            - The path to the MED-PC data file
+        use_medpc2excel: bool
+            - Whether or not to read the file with medpc2excel.medpc_read instead of extract.parser
+        msn_directory: str
+            - The directory that has the MED-PC scripts(.MPC files) that are used to name the columns
+        cache_directory: str
+            - The directory to cache the parsed file in with extract.cache. None doesn't use a cache.
+        columns: list or None
+            - The column labels to get, i.e. ["(S)CSpresentation", "(P)Portentry", "(N)Portexit"]. None gets all of them.
+            - medpc2excel still reads every array, and the other columns are dropped afterwards
+
+    Returns:
+        Pandas DataFrame or None, str or None
+            - The MED-PC DataFrame with the date and subject. None if there was an error.
+            - The formatted traceback of the error. None if there was no error.
+    """
+    try:
+        with profile_stage("extract.dataframe.read_file", file_path=file_path) as stage_record:
+            if use_medpc2excel:
+                with profile_stage("extract.dataframe.medpc_read", file_path=file_path):
+                    # Reading in the MED-PC log file
+                    ts_df, medpc_log = medpc_read(file=file_path, override=True, replace=False)
+                # Extracting the corresponding MED-PC Dataframe, date, and subject ID
+                date, subject, medpc_df = get_medpc_dataframe_from_medpc_read_output(medpc_read_dictionary_output=ts_df)
+                if columns is not None:
+                    medpc_df = medpc_df[list(columns)].dropna(how="all")
+            else:
+                date, subject, medpc_df = get_medpc_dataframe_from_file(file_path=file_path, msn_directory=msn_directory, \
+                    cache_directory=cache_directory, columns=columns)
+            medpc_df["date"] = date
+            medpc_df["subject"] = subject
+            medpc_df["file_path"] = file_path
+            stage_record["rows"] = len(medpc_df)
+        return medpc_df, None
+    except Exception:
+        return None, traceback.format_exc()
+
+def get_medpc_dataframe_from_list_of_files(medpc_files, stop_with_error=False, use_medpc2excel=False, msn_directory=None, \
+        number_of_workers=1, chunk_size=1, cache_directory=None, max_cache_size_bytes=DEFAULT_MAX_CACHE_SIZE_BYTES, columns=None):
+    """
+    Gets the dataframe of the data from each MED-PC file.
     This is done with multiple files from a list. And the date and the subject of the recording session is extracted as well.
     The data and subject metadata are added to the dataframe. And then all the dataframes for all the files are combined.
 
@@ -59,32 +185,59 @@ def get_medpc_dataframe_from_list_of_files(medpc_files, stop_with_error=False):
         stop_with_error: bool
             - Flag to terminate the program when an error is raised.
             - Sometimes MED-PC files have incorrect formatting, so can be skipped over.
+        use_medpc2excel: bool
+            - Whether or not to read the files with medpc2excel.medpc_read instead of extract.parser
+            - medpc2excel is much slower, and saves an Excel file in the directory of the files
+        msn_directory: str
+            - The directory that has the MED-PC scripts(.MPC files) that are used to name the columns
+            - Defaults to the directory of each MED-PC file. medpc2excel always uses that directory.
+        number_of_workers: int or None
+            - The number of processes that read the files at the same time. 1 reads them one at a time in this process.
+            - None uses the number of CPUs on the computer.
+        chunk_size: int
+            - The number of files that are sent to a worker process at a time. Only used with more than one worker.
+        cache_directory: str
+            - The directory to cache the parsed files in with extract.cache. Only files that are new or changed are parsed.
+            - None doesn't use a cache. The cache isn't used with medpc2excel.
+        max_cache_size_bytes: int
+            - The least recently used cache files are deleted after all the files are read, 
+            until the cache directory is smaller than this.
+        columns: list or None
+            - The column labels to get, i.e. ["(S)CSpresentation", "(P)Portentry", "(N)Portexit"]. None gets all of them.
+            - Only these arrays are parsed, which makes reading the files faster and the dataframe smaller
     Returns:
         Pandas DataFrame
             - Combined MED-PC DataFrame for all the files with the corresponding date and subject.
+            - The files are always in the same order as medpc_files, no matter how many workers are used.
     """
+    # Making a list so that the file paths can be matched up with the outputs of the workers
+    medpc_files = list(medpc_files)
+    read_file = partial(get_medpc_dataframe_with_traceback, use_medpc2excel=use_medpc2excel, msn_directory=msn_directory, \
+        cache_directory=cache_directory, columns=columns)
     # List to combine all the Data Frames at the end
     all_medpc_df = []    
-    for file_path in medpc_files:
-        try:
-            # Reading in the MED-PC log file
-            ts_df, medpc_log = medpc_read(file=file_path, override=True, replace=False)
-            # Extracting the corresponding MED-PC Dataframe, date, and subject ID
-            date, subject, medpc_df = get_medpc_dataframe_from_medpc_read_output(medpc_read_dictionary_output=ts_df)
-            medpc_df["date"] = date
-            medpc_df["subject"] = subject
-            medpc_df["file_path"] = file_path
-            all_medpc_df.append(medpc_df)
-        except Exception: 
-            # Printing out error messages and the corresponding traceback
-            print(traceback.format_exc())
-            if stop_with_error:
-                # Stopping the program all together
-                raise ValueError("Invalid Formatting for file: {}".format(file_path))
-            else:
-                # Continuing with execution
-                print("Invalid Formatting for file: {}".format(file_path))
-    return pd.concat(all_medpc_df)
+    with profile_stage("extract.dataframe.read_files") as stage_record:
+        for file_path, (medpc_df, error_traceback) in zip(medpc_files, \
+                map_in_order(read_file, medpc_files, number_of_workers=number_of_workers, chunk_size=chunk_size)):
+            if error_traceback is None:
+                all_medpc_df.append(medpc_df)
+            else: 
+                # Printing out error messages and the corresponding traceback
+                print(error_traceback)
+                if stop_with_error:
+                    # Stopping the program all together
+                    raise ValueError("Invalid Formatting for file: {}".format(file_path))
+                else:
+                    # Continuing with execution
+                    print("Invalid Formatting for file: {}".format(file_path))
+        stage_record["rows"] = sum([len(medpc_df) for medpc_df in all_medpc_df])
+    if cache_directory is not None and not use_medpc2excel:
+        with profile_stage("extract.cache.evict"):
+            evict_least_recently_used_cache_files(cache_directory=cache_directory, max_cache_size_bytes=max_cache_size_bytes)
+    with profile_stage("extract.dataframe.concat") as stage_record:
+        concatted_medpc_df = pd.concat(all_medpc_df)
+        stage_record["rows"] = len(concatted_medpc_df)
+    return concatted_medpc_df
 
 def main():
     """
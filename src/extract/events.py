@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Functions for turning the wide MED-PC dataframe into a long table of events, and back.
+The wide dataframe has a column for each MED-PC array, which are all padded with NaNs to the longest array of the file.
+And every row repeats the file path, date and subject.
+The event table only has a row for each recorded value, with the session ID, the variable and the time:
+    session_id  variable           time
+    0           (P)Portentry       2563
+    0           (P)Portentry       2604
+    ...
+    0           (S)CSpresentation  6001
+The times are saved as whole number ticks(i.e. 100 ticks per second are 10ms), which is how MED-PC records them.
+The file path, date and subject of each session are saved once in a separate session dataframe.
+"""
+import numpy as np
+import pandas as pd
+
+# The number of ticks per second of the times in the event table. MED-PC records times to the 10ms.
+DEFAULT_TICKS_PER_SECOND = 100
+# The tone columns that end with the ITI values(multiples of 1000) when read with medpc2excel. See processing.tone.get_valid_tones
+DEFAULT_SENTINEL_COLUMNS = ["(S)CSpresentation"]
+
+def get_first_position_of_each_session(session_codes, positions, number_of_sessions, default_position, last=False):
+    """
+    Gets the first(or last) position for each session, from positions that are sorted by session.
+
+    Args:
+        session_codes: Numpy Array
+            - The session of each position, sorted from smallest to largest
+        positions: Numpy Array
+            - The positions to choose from
+        number_of_sessions: int
+            - The total number of sessions
+        default_position: int
+            - The position of the sessions that don't have any positions
+        last: bool
+            - Whether to get the last position of each session instead of the first
+
+    Returns:
+        Numpy Array
+            - The first(or last) position for each session
+    """
+    session_positions = np.full(number_of_sessions, default_position, dtype=np.int64)
+    if last:
+        session_codes, positions = session_codes[::-1], positions[::-1]
+    sessions, first_indexes = np.unique(session_codes, return_index=True)
+    session_positions[sessions] = positions[first_indexes]
+    return session_positions
+
+def get_event_table_from_medpc_dataframe(concatted_medpc_df, columns=None, sentinel_columns=DEFAULT_SENTINEL_COLUMNS, \
+        drop_trailing_zeros=True, ticks_per_second=DEFAULT_TICKS_PER_SECOND, file_path_column="file_path", session_columns=("date", "subject")):
+    """
+    Turns the wide dataframe of MED-PC arrays into a long table of events, with the padding and sentinels removed.
+    Each file is a session. This is done for every session and column at once, without looping through the files.
+    - NaNs are removed
+    - Tone columns are cut off at the first multiple of 1000, the same as processing.tone.get_valid_tones
+    - The zeros at the end of each array are removed, because MED-PC fills the unused part of an array with zeros
+
+    Args:
+        concatted_medpc_df: Pandas Dataframe
+            - Output of extract.dataframe.get_medpc_dataframe_from_list_of_files
+        columns: list
+            - The columns of the MED-PC arrays to turn into events. None uses every column that isn't the file path or a session column.
+        sentinel_columns: list
+            - The columns that are cut off at the first multiple of 1000
+        drop_trailing_zeros: bool
+            - Whether or not to remove the zeros at the end of each array.
+            Arrays of codes that end with real zeros(i.e. a last trial with a code of 0) can't be told apart from unused zeros.
+        ticks_per_second: int or None
+            - The times are multiplied by this and rounded to make int32 ticks. 100 ticks per second is lossless for MED-PC times.
+            - None keeps the times as float64 seconds
+        file_path_column: str
+            - Name of the column that has the path of the file of each row. Each file becomes a session.
+        session_columns: list
+            - The columns with one value per file that are saved in the session dataframe
+
+    Returns:
+        Pandas DataFrame, Pandas DataFrame
+            - The event table, sorted by session ID, variable and the original order of each array.
+            With the "session_id"(int32), "variable"(categorical of the column names in the order of columns) and "time" columns
+            - The session dataframe, with the session ID as the index, and the file path and session columns.
+            The sessions are in the order that the files first appear in concatted_medpc_df.
+    """
+    session_columns = [column for column in session_columns if column in concatted_medpc_df.columns]
+    if columns is None:
+        columns = [column for column in concatted_medpc_df.columns if column != file_path_column and column not in session_columns]
+    columns = list(columns)
+
+    # Sorting the rows by file once, keeping the original order within each file
+    session_codes, file_paths = pd.factorize(concatted_medpc_df[file_path_column])
+    row_order = np.argsort(session_codes, kind="stable")
+    session_codes = session_codes[row_order]
+    number_of_sessions = len(file_paths)
+    row_positions = np.arange(len(row_order))
+    # Rows without a file path have a code of -1, so are left out
+    has_session = session_codes >= 0
+
+    all_session_ids = []
+    all_variable_codes = []
+    all_times = []
+    for variable_code, column in enumerate(columns):
+        values = concatted_medpc_df[column].to_numpy(dtype=np.float64)[row_order]
+        is_event = has_session & ~np.isnan(values)
+        if column in sentinel_columns:
+            is_sentinel = is_event & (values % 1000 == 0)
+            first_sentinel_positions = get_first_position_of_each_session(session_codes=session_codes[is_sentinel], \
+                positions=row_positions[is_sentinel], number_of_sessions=number_of_sessions, default_position=len(values))
+            is_event &= row_positions < first_sentinel_positions[session_codes]
+        if drop_trailing_zeros:
+            is_nonzero = is_event & (values != 0)
+            last_nonzero_positions = get_first_position_of_each_session(session_codes=session_codes[is_nonzero], \
+                positions=row_positions[is_nonzero], number_of_sessions=number_of_sessions, default_position=-1, last=True)
+            is_event &= row_positions <= last_nonzero_positions[session_codes]
+        all_session_ids.append(session_codes[is_event])
+        all_variable_codes.append(np.full(is_event.sum(), variable_code))
+        all_times.append(values[is_event])
+
+    session_ids = np.concatenate(all_session_ids).astype(np.int32)
+    variable_codes = np.concatenate(all_variable_codes).astype(np.int16)
+    times = np.concatenate(all_times)
+    if ticks_per_second is not None:
+        times = np.rint(times * ticks_per_second).astype(np.int32)
+    # Sorting by session and then variable, keeping the original order within each array
+    event_order = np.argsort(session_ids.astype(np.int64) * len(columns) + variable_codes, kind="stable")
+    event_df = pd.DataFrame({"session_id": session_ids[event_order], \
+        "variable": pd.Categorical.from_codes(variable_codes[event_order], categories=columns), "time": times[event_order]})
+
+    first_rows = row_order[np.searchsorted(session_codes, np.arange(number_of_sessions))]
+    session_df = pd.DataFrame({file_path_column: np.asarray(file_paths)})
+    for column in session_columns:
+        session_df[column] = concatted_medpc_df[column].to_numpy()[first_rows]
+    session_df.index.name = "session_id"
+    return event_df, session_df
+
+def get_event_times_in_seconds(event_df, ticks_per_second=DEFAULT_TICKS_PER_SECOND):
+    """
+    Gets the times of the event table in seconds.
+
+    Args:
+        event_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        ticks_per_second: int or None
+            - The ticks per second that the event table was made with. None if the times are already in seconds.
+
+    Returns:
+        Numpy Array
+            - The float64 time of each event in seconds
+    """
+    times = event_df["time"].to_numpy(dtype=np.float64)
+    if ticks_per_second is None:
+        return times
+    return times / ticks_per_second
+
+def get_session_event_times(event_df, variable, number_of_sessions, ticks_per_second=DEFAULT_TICKS_PER_SECOND):
+    """
+    Gets the times of one variable for every session, as one array with the offsets of each session(like a CSR sparse matrix).
+    The times of the i-th session are at times[offsets[i]:offsets[i + 1]].
+
+    Args:
+        event_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        variable: str
+            - The name of the variable. i.e. "(P)Portentry"
+        number_of_sessions: int
+            - The number of sessions. Usually len(session_df)
+        ticks_per_second: int or None
+            - The ticks per second that the event table was made with. None if the times are already in seconds.
+
+    Returns:
+        Numpy Array, Numpy Array
+            - The float64 times in seconds of all the sessions, in the order of the session IDs
+            - The offsets of each session in the times. Has one more item than the number of sessions.
+    """
+    is_variable = (event_df["variable"] == variable).to_numpy()
+    session_ids = event_df["session_id"].to_numpy()[is_variable]
+    times = get_event_times_in_seconds(event_df=event_df[is_variable], ticks_per_second=ticks_per_second)
+    offsets = np.searchsorted(session_ids, np.arange(number_of_sessions + 1))
+    return times, offsets
+
+def get_medpc_dataframe_from_event_table(event_df, session_df, ticks_per_second=DEFAULT_TICKS_PER_SECOND):
+    """
+    Turns the event table back into the wide dataframe of extract.dataframe.get_medpc_dataframe_from_list_of_files.
+    Only needed for code that still uses the wide dataframe. Each array is padded with NaNs to the longest array of its session.
+    The removed padding and sentinels are not added back.
+
+    Args:
+        event_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        session_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        ticks_per_second: int or None
+            - The ticks per second that the event table was made with. None if the times are already in seconds.
+
+    Returns:
+        Pandas DataFrame
+            - A column for each variable in seconds, and a column for each column of session_df.
+            With a row number that starts over at 0 for each session.
+    """
+    session_ids = event_df["session_id"].to_numpy().astype(np.int64)
+    variable_codes = event_df["variable"].cat.codes.to_numpy().astype(np.int64)
+    variables = event_df["variable"].cat.categories
+    # The position of each event within its array
+    array_keys = session_ids * len(variables) + variable_codes
+    array_starts = np.searchsorted(array_keys, array_keys, side="left")
+    row_numbers = np.arange(len(array_keys)) - array_starts
+
+    number_of_rows = np.zeros(len(session_df), dtype=np.int64)
+    np.maximum.at(number_of_rows, session_ids, row_numbers + 1)
+    session_offsets = np.concatenate([[0], np.cumsum(number_of_rows)])
+    wide_values = np.full((session_offsets[-1], len(variables)), np.nan)
+    wide_values[session_offsets[session_ids] + row_numbers, variable_codes] = get_event_times_in_seconds(event_df=event_df, \
+        ticks_per_second=ticks_per_second)
+
+    medpc_df = pd.DataFrame(wide_values, columns=list(variables))
+    for column in session_df.columns:
+        medpc_df[column] = np.repeat(session_df[column].to_numpy(), number_of_rows)
+    medpc_df.index = np.arange(session_offsets[-1]) - np.repeat(session_offsets[:-1], number_of_rows)
+    return medpc_df
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+
+if __name__ == '__main__':
+    main()
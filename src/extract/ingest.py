@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Functions for incrementally ingesting MED-PC files from a directory that the recording computers keep adding files to.
+The files are added to the Parquet session store of extract.storage, and the store directory also has a manifest of every file
+that has already been read. So each run only reads the files that are new or have changed since the last run.
+The ingested sessions are loaded with extract.storage.load_medpc_session_store.
+
+The store directory looks something like:
+    store_directory/
+        manifest.json
+        metadata.parquet
+        sessions/
+            date=20220504/
+                subject=1.1/
+                    MSN=levelNP_CS_reward_laserepochON1st_noshock/
+                        session_3f2a...9c1e-0.parquet
+
+Run from the src directory to keep checking a directory for new files:
+    python -m extract.ingest "C:\\MED-PC\\Data" ./medpc_store --polling_interval_seconds 60
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+import time
+from functools import partial
+import pandas as pd
+from extract.cache import get_file_signature
+from extract.dataframe import get_medpc_dataframe_with_traceback
+from extract.metadata import get_list_of_medpc_files
+from extract.parallel import map_in_order
+from extract.storage import save_medpc_session_store
+
+# Name of the file that keeps track of all the MED-PC files that have been read
+MANIFEST_FILE_NAME = "manifest.json"
+
+def load_manifest(store_directory):
+    """
+    Loads the manifest of all the MED-PC files that have already been ingested into a store directory.
+
+    Args:
+        store_directory: str
+            - The directory with the manifest and the session store
+
+    Returns:
+        dict
+            - The absolute path of the MED-PC file as the key.
+            - The file size, modification time and whether or not the file could be read(and was added to the session store) as the value.
+            - An empty dictionary if nothing has been ingested yet.
+    """
+    manifest_file_path = os.path.join(store_directory, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_file_path):
+        return {}
+    with open(manifest_file_path, "r") as file:
+        return json.load(file)
+
+def save_manifest(manifest, store_directory):
+    """
+    Saves the manifest of a store directory.
+    The file is written under a temporary name first, so that the manifest is never left half written.
+
+    Args:
+        manifest: dict
+            - Output of extract.ingest.load_manifest with the new files added
+        store_directory: str
+            - The directory with the manifest and the session store
+    """
+    manifest_file_path = os.path.join(store_directory, MANIFEST_FILE_NAME)
+    temporary_file_path = "{}.{}.tmp".format(manifest_file_path, os.getpid())
+    with open(temporary_file_path, "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(temporary_file_path, manifest_file_path)
+
+def is_file_in_manifest(file_signature, manifest):
+    """
+    Checks whether or not a MED-PC file was already ingested, and hasn't changed since.
+
+    Args:
+        file_signature: dict
+            - Output of extract.cache.get_file_signature
+        manifest: dict
+            - Output of extract.ingest.load_manifest
+
+    Returns:
+        bool
+            - True if the file has the same size and modification time as when it was ingested
+    """
+    manifest_entry = manifest.get(file_signature["path"])
+    return manifest_entry is not None and manifest_entry["size"] == file_signature["size"] \
+        and manifest_entry["mtime_ns"] == file_signature["mtime_ns"]
+
+def get_files_to_ingest(medpc_files, manifest, file_pattern="*.txt", minimum_file_age_seconds=0):
+    """
+    Gets the MED-PC files that are new or have changed since they were ingested.
+
+    Args:
+        medpc_files: str or list
+            - A directory with the MED-PC files, a glob pattern(i.e. "./data/*/*.txt") or a list of file paths
+        manifest: dict
+            - Output of extract.ingest.load_manifest
+        file_pattern: str
+            - The glob pattern of the MED-PC files in the directory. Only used when medpc_files is a directory.
+        minimum_file_age_seconds: float
+            - Files that were modified more recently than this are skipped until the next run,
+            because MED-PC might still be writing to them.
+
+    Returns:
+        list
+            - The output of extract.cache.get_file_signature for each file to ingest
+    """
+    latest_modification_time_ns = time.time_ns() - int(minimum_file_age_seconds * 1e9)
+    file_signatures = []
+    for file_path in get_list_of_medpc_files(medpc_files=medpc_files, file_pattern=file_pattern):
+        try:
+            file_signature = get_file_signature(file_path=file_path)
+        # The file could be moved or deleted while the directory is being checked
+        except FileNotFoundError:
+            continue
+        if file_signature["mtime_ns"] > latest_modification_time_ns or is_file_in_manifest(file_signature, manifest):
+            continue
+        file_signatures.append(file_signature)
+    return file_signatures
+
+def ingest_new_medpc_files(medpc_files, store_directory, file_pattern="*.txt", minimum_file_age_seconds=0, msn_directory=None, \
+        number_of_workers=1, chunk_size=1, cache_directory=None):
+    """
+    Reads the MED-PC files that are new or have changed since the last run, and adds them to the session store with
+    extract.storage.save_medpc_session_store. Files that changed replace their old sessions in the store.
+    Files that can't be read are also added to the manifest, so that they are only tried again once they have changed.
+    Files that are deleted from the data directory are kept in the store.
+
+    Args:
+        medpc_files: str or list
+            - A directory with the MED-PC files, a glob pattern(i.e. "./data/*/*.txt") or a list of file paths
+        store_directory: str
+            - The directory with the manifest and the session store. It is created if it doesn't exist.
+        file_pattern: str
+            - The glob pattern of the MED-PC files in the directory. Only used when medpc_files is a directory.
+        minimum_file_age_seconds: float
+            - Files that were modified more recently than this are skipped until the next run
+        msn_directory: str
+            - The directory that has the MED-PC scripts(.MPC files) that are used to name the columns
+            - Defaults to the directory of each MED-PC file
+        number_of_workers: int or None
+            - The number of processes that read the files at the same time. None uses the number of CPUs on the computer.
+        chunk_size: int
+            - The number of files that are sent to a worker process at a time. Only used with more than one worker.
+        cache_directory: str
+            - The directory to cache the parsed files in with extract.cache. None doesn't use a cache.
+
+    Returns:
+        list, list
+            - The absolute paths of the files that were ingested
+            - The absolute paths of the files that could not be read
+    """
+    manifest = load_manifest(store_directory=store_directory)
+    file_signatures = get_files_to_ingest(medpc_files=medpc_files, manifest=manifest, file_pattern=file_pattern, \
+        minimum_file_age_seconds=minimum_file_age_seconds)
+    if not file_signatures:
+        return [], []
+
+    read_file = partial(get_medpc_dataframe_with_traceback, msn_directory=msn_directory, cache_directory=cache_directory)
+    file_paths = [file_signature["path"] for file_signature in file_signatures]
+
+    all_medpc_df = []
+    ingested_files = []
+    invalid_files = []
+    for file_signature, (medpc_df, error_traceback) in zip(file_signatures, \
+            map_in_order(read_file, file_paths, number_of_workers=number_of_workers, chunk_size=chunk_size)):
+        manifest_entry = {"size": file_signature["size"], "mtime_ns": file_signature["mtime_ns"]}
+        if error_traceback is None:
+            all_medpc_df.append(medpc_df)
+            ingested_files.append(file_signature["path"])
+            manifest_entry["is_ingested"] = True
+        else:
+            print(error_traceback)
+            print("Invalid Formatting for file: {}".format(file_signature["path"]))
+            invalid_files.append(file_signature["path"])
+            manifest_entry["is_ingested"] = False
+        manifest[file_signature["path"]] = manifest_entry
+
+    os.makedirs(store_directory, exist_ok=True)
+    if all_medpc_df:
+        save_medpc_session_store(concatted_medpc_df=pd.concat(all_medpc_df), store_directory=store_directory)
+    # The manifest is saved after the sessions, so a crash in between only means that the files are ingested again
+    save_manifest(manifest=manifest, store_directory=store_directory)
+    return ingested_files, invalid_files
+
+def watch_medpc_directory(medpc_directory, store_directory, file_pattern="*.txt", polling_interval_seconds=60, \
+        minimum_file_age_seconds=60, number_of_polls=None, **kwargs):
+    """
+    Keeps checking a directory for new or changed MED-PC files, and ingests them into a store directory.
+
+    Args:
+        medpc_directory: str
+            - The directory that the recording computers save the MED-PC files to
+        store_directory: str
+            - The directory with the manifest and the session store
+        file_pattern: str
+            - The glob pattern of the MED-PC files in the directory
+        polling_interval_seconds: float
+            - The number of seconds to wait between each check of the directory
+        minimum_file_age_seconds: float
+            - Files that were modified more recently than this are skipped until the next check,
+            because MED-PC might still be writing to them
+        number_of_polls: int or None
+            - The number of times to check the directory. None keeps checking until the program is stopped.
+        **kwargs:
+            - Passed on to extract.ingest.ingest_new_medpc_files. i.e. msn_directory, number_of_workers, cache_directory
+    """
+    poll_number = 0
+    while number_of_polls is None or poll_number < number_of_polls:
+        ingested_files, invalid_files = ingest_new_medpc_files(medpc_files=medpc_directory, store_directory=store_directory, \
+            file_pattern=file_pattern, minimum_file_age_seconds=minimum_file_age_seconds, **kwargs)
+        if ingested_files or invalid_files:
+            print("{}: Ingested {} files, {} invalid files".format(datetime.now().isoformat(timespec="seconds"), \
+                len(ingested_files), len(invalid_files)))
+        poll_number += 1
+        if number_of_polls is None or poll_number < number_of_polls:
+            time.sleep(polling_interval_seconds)
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+    parser = argparse.ArgumentParser(description="Keep ingesting new MED-PC files from a directory")
+    parser.add_argument("medpc_directory", help="Directory that the MED-PC files are saved to")
+    parser.add_argument("store_directory", help="Directory to save the manifest and the session store to")
+    parser.add_argument("--file_pattern", default="*.txt", help="Glob pattern of the MED-PC files")
+    parser.add_argument("--msn_directory", default=None, help="Directory with the .MPC scripts. Defaults to the directory of each file")
+    parser.add_argument("--polling_interval_seconds", type=float, default=60, help="Seconds between each check of the directory")
+    parser.add_argument("--minimum_file_age_seconds", type=float, default=60, help="Skip files modified more recently than this")
+    parser.add_argument("--number_of_polls", type=int, default=None, help="Number of checks. Keeps going until stopped by default")
+    parser.add_argument("--number_of_workers", type=int, default=1, help="Number of processes that read the files")
+    parser.add_argument("--cache_directory", default=None, help="Directory to cache the parsed files in")
+    args = parser.parse_args()
+    watch_medpc_directory(medpc_directory=args.medpc_directory, store_directory=args.store_directory, \
+        file_pattern=args.file_pattern, polling_interval_seconds=args.polling_interval_seconds, \
+        minimum_file_age_seconds=args.minimum_file_age_seconds, number_of_polls=args.number_of_polls, \
+        msn_directory=args.msn_directory, number_of_workers=args.number_of_workers, cache_directory=args.cache_directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Functions for saving the event arrays of every session to memory-mapped files, and reading slices of them back.
+The arrays of all the sessions are saved one after the other in one file for each variable, with the offsets of each session
+(like the times and offsets of extract.events.get_session_event_times). So the arrays of a few sessions can be read
+without loading the whole cohort into memory. The operating system only reads the parts of the file that are used.
+
+The memory map directory looks something like:
+    memory_map_directory/
+        index.json
+        sessions.pkl
+        array_000.values
+        array_000.offsets
+        array_001.values
+        array_001.offsets
+        ...
+The index has the name, dtype and length of each array, and the session dataframe has the file path, date and subject of each session.
+The times are saved as the int32 ticks of the event table. Other arrays, like the inside port masks of processing.port,
+can be added to the same directory.
+
+Usage:
+    save_memory_mapped_medpc_files(medpc_files=all_med_pc_file, memory_map_directory="./memory_map", chunk_size=1000)
+    session_df, name_to_arrays, ticks_per_second = load_memory_mapped_arrays(memory_map_directory="./memory_map")
+    tone_times, tone_offsets = get_memory_mapped_session_times(name_to_arrays=name_to_arrays, name="(S)CSpresentation", \
+        first_session=0, last_session=100, ticks_per_second=ticks_per_second)
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+from extract.dataframe import get_medpc_dataframe_from_list_of_files
+from extract.events import DEFAULT_TICKS_PER_SECOND, get_event_table_from_medpc_dataframe
+
+# Name of the file with the name, dtype and length of every array
+INDEX_FILE_NAME = "index.json"
+# Name of the file with the session dataframe
+SESSION_FILE_NAME = "sessions.pkl"
+# The dtype of the offsets of every array
+OFFSET_DTYPE = np.int64
+
+def load_memory_map_index(memory_map_directory):
+    """
+    Loads the index of the arrays in a memory map directory.
+
+    Args:
+        memory_map_directory: str
+            - The directory with the memory-mapped arrays
+
+    Returns:
+        dict
+            - "ticks_per_second": The ticks per second of the times. None if the times are in seconds.
+            - "number_of_sessions": The number of sessions that have been saved
+            - "next_array_number": The number for the file name of the next array that is added
+            - "arrays": The name of each array as the key, and the file name, dtype and length of the array as the value.
+            - An index without any arrays or sessions if nothing has been saved yet.
+    """
+    index_file_path = os.path.join(memory_map_directory, INDEX_FILE_NAME)
+    if not os.path.exists(index_file_path):
+        return {"ticks_per_second": None, "number_of_sessions": 0, "next_array_number": 0, "arrays": {}}
+    with open(index_file_path, "r") as file:
+        return json.load(file)
+
+def save_memory_map_index(memory_map_index, memory_map_directory):
+    """
+    Saves the index of a memory map directory.
+    The file is written under a temporary name first, so that the index is never left half written.
+
+    Args:
+        memory_map_index: dict
+            - Output of extract.memory_map.load_memory_map_index with the new arrays added
+        memory_map_directory: str
+            - The directory with the memory-mapped arrays
+    """
+    index_file_path = os.path.join(memory_map_directory, INDEX_FILE_NAME)
+    temporary_file_path = "{}.{}.tmp".format(index_file_path, os.getpid())
+    with open(temporary_file_path, "w") as file:
+        json.dump(memory_map_index, file, indent=1)
+    os.replace(temporary_file_path, index_file_path)
+
+def get_array_file_paths(memory_map_directory, file_name):
+    """
+    Gets the paths of the values and the offsets of an array.
+
+    Args:
+        memory_map_directory: str
+            - The directory with the memory-mapped arrays
+        file_name: str
+            - The file name of the array from the index. i.e. "array_000"
+
+    Returns:
+        str, str
+            - The path of the values of every session
+            - The path of the offsets of each session
+    """
+    file_path = os.path.join(memory_map_directory, file_name)
+    return "{}.values".format(file_path), "{}.offsets".format(file_path)
+
+def append_session_arrays(memory_map_directory, memory_map_index, name, values, offsets):
+    """
+    Adds the arrays of more sessions to the end of an array in a memory map directory.
+    Only the index in memory is changed, so extract.memory_map.save_memory_map_index must be called afterwards.
+
+    Args:
+        memory_map_directory: str
+            - The directory with the memory-mapped arrays
+        memory_map_index: dict
+            - Output of extract.memory_map.load_memory_map_index
+        name: str
+            - The name of the array. i.e. "(P)Portentry"
+        values: Numpy Array
+            - The values of all the new sessions, one after the other
+        offsets: Numpy Array
+            - The offsets of each new session in the values, starting at 0. Has one more item than the number of new sessions.
+    """
+    values = np.ascontiguousarray(values)
+    if name not in memory_map_index["arrays"]:
+        memory_map_index["arrays"][name] = {"file_name": "array_{:03d}".format(memory_map_index["next_array_number"]), \
+            "dtype": values.dtype.str, "length": 0}
+        memory_map_index["next_array_number"] += 1
+        values_file_path, offsets_file_path = get_array_file_paths(memory_map_directory, memory_map_index["arrays"][name]["file_name"])
+        np.zeros(1, dtype=OFFSET_DTYPE).tofile(offsets_file_path)
+        open(values_file_path, "wb").close()
+    array_index = memory_map_index["arrays"][name]
+    if values.dtype.str != array_index["dtype"]:
+        raise ValueError("{} has the dtype {}, not {}".format(name, array_index["dtype"], values.dtype.str))
+
+    values_file_path, offsets_file_path = get_array_file_paths(memory_map_directory, array_index["file_name"])
+    with open(values_file_path, "ab") as file:
+        values.tofile(file)
+    with open(offsets_file_path, "ab") as file:
+        (np.asarray(offsets[1:], dtype=OFFSET_DTYPE) + array_index["length"]).tofile(file)
+    array_index["length"] += len(values)
+
+def remove_memory_mapped_array(memory_map_directory, memory_map_index, name):
+    """
+    Removes an array and its files from a memory map directory.
+    Only the index in memory is changed, so extract.memory_map.save_memory_map_index must be called afterwards.
+
+    Args:
+        memory_map_directory: str
+            - The directory with the memory-mapped arrays
+        memory_map_index: dict
+            - Output of extract.memory_map.load_memory_map_index
+        name: str
+            - The name of the array. i.e. "inside_port_mask"
+    """
+    for file_path in get_array_file_paths(memory_map_directory, memory_map_index["arrays"].pop(name)["file_name"]):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def save_memory_mapped_event_arrays(event_df, session_df, memory_map_directory, variables=None, \
+        ticks_per_second=DEFAULT_TICKS_PER_SECOND, append=False):
+    """
+    Saves the times of each variable of an event table as memory-mapped arrays, with the offsets of each session.
+
+    Args:
+        event_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe, sorted by session ID
+        session_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        memory_map_directory: str
+            - The directory to save to. It is created if it doesn't exist.
+        variables: list
+            - The variables to save. i.e. ["(S)CSpresentation", "(P)Portentry", "(N)Portexit"]. None saves all of them.
+        ticks_per_second: int or None
+            - The ticks per second that the event table was made with. None if the times are in seconds.
+        append: bool
+            - Whether to add the sessions after the sessions that were already saved, instead of replacing them.
+            - The arrays that aren't variables of the event table(i.e. the inside port masks) are removed,
+            because they don't have the new sessions. They have to be saved again afterwards.
+    """
+    os.makedirs(memory_map_directory, exist_ok=True)
+    memory_map_index = load_memory_map_index(memory_map_directory)
+    if variables is None:
+        variables = list(event_df["variable"].cat.categories)
+    append = append and memory_map_index["number_of_sessions"] > 0
+    if append and memory_map_index["ticks_per_second"] != ticks_per_second:
+        raise ValueError("The saved times have {} ticks per second, not {}".format(memory_map_index["ticks_per_second"], ticks_per_second))
+    if append and any(variable not in memory_map_index["arrays"] for variable in variables):
+        raise ValueError("The variables {} weren't saved for the sessions before".format(variables))
+    # Removing the arrays that were saved before, or that won't have the new sessions
+    for name in list(memory_map_index["arrays"]):
+        if not append or name not in variables:
+            remove_memory_mapped_array(memory_map_directory=memory_map_directory, memory_map_index=memory_map_index, name=name)
+    if append:
+        all_session_df = pd.concat([pd.read_pickle(os.path.join(memory_map_directory, SESSION_FILE_NAME)), session_df], ignore_index=True)
+    else:
+        memory_map_index = {"ticks_per_second": ticks_per_second, "number_of_sessions": 0, "next_array_number": 0, "arrays": {}}
+        all_session_df = session_df.reset_index(drop=True)
+
+    session_ids = event_df["session_id"].to_numpy()
+    for variable in variables:
+        is_variable = (event_df["variable"] == variable).to_numpy()
+        offsets = np.searchsorted(session_ids[is_variable], np.arange(len(session_df) + 1))
+        append_session_arrays(memory_map_directory=memory_map_directory, memory_map_index=memory_map_index, name=variable, \
+            values=event_df["time"].to_numpy()[is_variable], offsets=offsets)
+    memory_map_index["number_of_sessions"] += len(session_df)
+
+    all_session_df.index.name = "session_id"
+    all_session_df.to_pickle(os.path.join(memory_map_directory, SESSION_FILE_NAME))
+    save_memory_map_index(memory_map_index=memory_map_index, memory_map_directory=memory_map_directory)
+
+def save_memory_mapped_medpc_files(medpc_files, memory_map_directory, variables=None, chunk_size=1000, number_of_workers=1, \
+        ticks_per_second=DEFAULT_TICKS_PER_SECOND):
+    """
+    Parses MED-PC files in chunks, and saves the event arrays of each chunk to the end of the memory-mapped arrays.
+    Only one chunk of files is kept in memory at a time.
+
+    Args:
+        medpc_files: list
+            - The paths of the MED-PC files
+        memory_map_directory: str
+            - The directory to save to. Anything that was saved there before is replaced.
+        variables: list
+            - The columns to save. i.e. ["(S)CSpresentation", "(P)Portentry", "(N)Portexit"]. None saves all of them.
+        chunk_size: int
+            - The number of files that are parsed into a wide dataframe at a time
+        number_of_workers: int or None
+            - The number of processes that read the files at the same time
+        ticks_per_second: int or None
+            - The times are saved as int32 ticks with this many ticks per second. None saves the float64 seconds.
+    """
+    for chunk_start in range(0, len(medpc_files), chunk_size):
+        # Only parsing the arrays that are saved
+        medpc_df = get_medpc_dataframe_from_list_of_files(medpc_files=medpc_files[chunk_start:chunk_start + chunk_size], \
+            number_of_workers=number_of_workers, columns=variables)
+        event_df, session_df = get_event_table_from_medpc_dataframe(concatted_medpc_df=medpc_df, columns=variables, \
+            ticks_per_second=ticks_per_second)
+        save_memory_mapped_event_arrays(event_df=event_df, session_df=session_df, memory_map_directory=memory_map_directory, \
+            variables=variables, ticks_per_second=ticks_per_second, append=chunk_start > 0)
+
+def load_memory_mapped_arrays(memory_map_directory):
+    """
+    Opens all the arrays of a memory map directory as read only memory maps. Nothing is read from the files until the arrays are used.
+
+    Args:
+        memory_map_directory: str
+            - The directory that the arrays were saved to
+
+    Returns:
+        Pandas DataFrame, dict, int or None
+            - The session dataframe, with the session ID as the index
+            - The name of each array as the key, and the values and the offsets of each session as Numpy memory maps
+            - The ticks per second of the times. None if the times are in seconds.
+    """
+    memory_map_index = load_memory_map_index(memory_map_directory)
+    session_df = pd.read_pickle(os.path.join(memory_map_directory, SESSION_FILE_NAME))
+    name_to_arrays = {}
+    for name, array_index in memory_map_index["arrays"].items():
+        values_file_path, offsets_file_path = get_array_file_paths(memory_map_directory, array_index["file_name"])
+        # Memory maps can't be empty, so empty arrays are read normally
+        if array_index["length"] == 0:
+            values = np.zeros(0, dtype=array_index["dtype"])
+        else:
+            values = np.memmap(values_file_path, dtype=array_index["dtype"], mode="r", shape=(array_index["length"],))
+        offsets = np.memmap(offsets_file_path, dtype=OFFSET_DTYPE, mode="r", shape=(memory_map_index["number_of_sessions"] + 1,))
+        name_to_arrays[name] = (values, offsets)
+    return session_df, name_to_arrays, memory_map_index["ticks_per_second"]
+
+def get_session_slice(values, offsets, first_session=0, last_session=None):
+    """
+    Gets the values of a range of sessions, without copying them.
+    i.e. For memory maps, only the values of these sessions are read from the file when they are used.
+
+    Args:
+        values: Numpy Array
+            - The values of every session, one after the other
+        offsets: Numpy Array
+            - The offsets of each session in the values
+        first_session: int
+            - The ID of the first session to get
+        last_session: int
+            - The ID after the last session to get. None gets up to the last session.
+
+    Returns:
+        Numpy Array, Numpy Array
+            - The values of the sessions. A view of the values.
+            - The offsets of each of the sessions in the values, starting at 0
+    """
+    if last_session is None:
+        last_session = len(offsets) - 1
+    session_offsets = np.asarray(offsets[first_session:last_session + 1], dtype=OFFSET_DTYPE)
+    return values[session_offsets[0]:session_offsets[-1]], session_offsets - session_offsets[0]
+
+def get_memory_mapped_session_times(name_to_arrays, name, first_session=0, last_session=None, ticks_per_second=DEFAULT_TICKS_PER_SECOND):
+    """
+    Gets the times of one variable for a range of sessions in seconds. Only the times of these sessions are read.
+
+    Args:
+        name_to_arrays: dict
+            - Output of extract.memory_map.load_memory_mapped_arrays
+        name: str
+            - The name of the variable. i.e. "(P)Portentry"
+        first_session: int
+            - The ID of the first session to get
+        last_session: int
+            - The ID after the last session to get. None gets up to the last session.
+        ticks_per_second: int or None
+            - The ticks per second that the times were saved with. None if the times are in seconds.
+
+    Returns:
+        Numpy Array, Numpy Array
+            - The float64 times in seconds of the sessions
+            - The offsets of each of the sessions in the times, starting at 0
+    """
+    values, offsets = name_to_arrays[name]
+    times, session_offsets = get_session_slice(values=values, offsets=offsets, first_session=first_session, last_session=last_session)
+    times = np.asarray(times, dtype=np.float64)
+    if ticks_per_second is not None:
+        times = times / ticks_per_second
+    return times, session_offsets
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+
+if __name__ == '__main__':
+    main()
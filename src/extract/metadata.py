@@ -7,6 +7,43 @@ For more information on the MED-PC's programming language, Trans:
 - https://www.med-associates.com/wp-content/uploads/2017/01/DOC-003-R3.4-SOF-735-MED-PC-IV-PROGRAMMER%E2%80%99S-MANUAL.pdf
 """
 from collections import defaultdict
+from functools import partial
+import glob
+import os
+import pandas as pd
+from extract.cache import get_medpc_arrays_from_file_with_cache
+from extract.parallel import map_in_order
+from extract.parser import DEFAULT_META_DATA_HEADERS, META_DATA_PREFIX_SIZE, VARIABLE_LINE_PATTERN, get_meta_data_from_text
+
+# The metadata that are converted into dates and times in the metadata dataframe
+DATE_META_DATA_HEADERS = ["Start Date", "End Date"]
+TIME_META_DATA_HEADERS = ["Start Time", "End Time"]
+
+def scan_med_pc_meta_data(file_path, meta_data_headers=None, max_prefix_size=META_DATA_PREFIX_SIZE):
+    """
+    Parses out the metadata from a MED-PC data file without reading the rest of the file.
+    Only the first max_prefix_size characters are read, and the scan stops at the first variable(i.e. "A:    2099.000"),
+    because the metadata is always above the variables.
+
+    Args:
+        file_path: str
+            - The path to the MED-PC data file 
+        meta_data_headers: list
+            - List of the types of metadata to be parsed out for
+            - Default metadata includes: "File", "Start Date", "End Date", "Subject", "Experiment", "Group", "Box", "Start Time", "End Time", "MSN"
+        max_prefix_size: int
+            - The maximum number of characters that are read from the start of the file
+
+    Returns:
+        dict
+            - The meta data headers as the keys, and the meta data as the values
+    """
+    with open(file_path, "r") as file:
+        text = file.read(max_prefix_size)
+    first_variable_match = VARIABLE_LINE_PATTERN.search(text)
+    if first_variable_match:
+        text = text[:first_variable_match.start()]
+    return get_meta_data_from_text(text=text, meta_data_headers=meta_data_headers)
 
 def get_med_pc_meta_data(file_path, meta_data_headers=None, file_path_to_meta_data=None):
     """
@@ -38,6 +75,8 @@ def get_med_pc_meta_data(file_path, meta_data_headers=None, file_path_to_meta_da
               'End Time': '14:10:05',
               'MSN': 'levelNP_CS_reward_laserepochON1st_noshock'}})
     
+    The metadata is read with extract.metadata.scan_med_pc_meta_data, so only the start of the file is read.
+
     Args:
         file_path: str
             - The path to the MED-PC data file 
@@ -54,32 +93,42 @@ def get_med_pc_meta_data(file_path, meta_data_headers=None, file_path_to_meta_da
             - With the file path as the key, and the meta data headers as the values. 
             And then the meta data headers are the nested keys, and the meta data as the values.
     """
-    # The default metadata found in MED-PC files
-    if meta_data_headers is None:
-        meta_data_headers = ["File", "Start Date", "End Date", "Subject", "Experiment", "Group", "Box", "Start Time", "End Time", "MSN"]
     # Creating a new dictionary if none is inputted
     if file_path_to_meta_data is None:
         file_path_to_meta_data = defaultdict(dict)
-
-    # List of all the headers that we've gone through
-    used_headers = []
-    # Going through each line of the MED-PC data file
-    with open(file_path, 'r') as file:
-        for line in file.readlines():
-            # Checking to see if we've gone through all the headers or not
-            if set(meta_data_headers) == set(used_headers):
-                break
-            # Going through each header to see which line starts with the header
-            for header in meta_data_headers:
-                if line.strip().startswith(header):
-                    # Removing all unnecessary characters
-                    file_path_to_meta_data[file_path][header] = line.strip().replace(header, '').strip(":").strip()
-                    used_headers.append(header)
-                    # Move onto next line if header is found
-                    break
+    file_path_to_meta_data[file_path].update(scan_med_pc_meta_data(file_path=file_path, meta_data_headers=meta_data_headers))
     return file_path_to_meta_data
 
-def get_all_med_pc_meta_data_from_files(list_of_files, meta_data_headers=None, file_path_to_meta_data=None):
+def get_med_pc_meta_data_or_none(file_path, meta_data_headers=None, cache_directory=None):
+    """
+    Parses out the metadata of one MED-PC data file with extract.metadata.scan_med_pc_meta_data.
+    Any error is caught so that the file can be skipped over by the caller.
+    This is what each worker process runs in extract.metadata.get_all_med_pc_meta_data_from_files.
+
+    Args:
+        file_path: str
+            - The path to the MED-PC data file 
+        meta_data_headers: list
+            - List of the types of metadata to be parsed out for
+        cache_directory: str
+            - The directory of the extract.cache cache files. The metadata is taken from the cached file if it hasn't changed.
+            - Only used when all of meta_data_headers are in the default metadata, because those are the only ones that are cached.
+
+    Returns:
+        dict or None
+            - The meta data headers as the keys, and the meta data as the values. None if the file could not be read.
+    """
+    try:
+        if cache_directory is not None and set(meta_data_headers or DEFAULT_META_DATA_HEADERS).issubset(DEFAULT_META_DATA_HEADERS):
+            cached_meta_data = get_medpc_arrays_from_file_with_cache(file_path=file_path, cache_directory=cache_directory)["meta_data"]
+            return {header: value for header, value in cached_meta_data.items() if header in (meta_data_headers or DEFAULT_META_DATA_HEADERS)}
+        return scan_med_pc_meta_data(file_path=file_path, meta_data_headers=meta_data_headers)
+    # Except in case file can not be read or is missing
+    except Exception:
+        return None
+
+def get_all_med_pc_meta_data_from_files(list_of_files, meta_data_headers=None, file_path_to_meta_data=None, \
+        number_of_workers=1, chunk_size=1, cache_directory=None):
     """
     Iterates through a list of MED-PC files to extract all the metadata from those files
 
@@ -94,25 +143,107 @@ def get_all_med_pc_meta_data_from_files(list_of_files, meta_data_headers=None, f
             - Any dictionary that has already been produced by this function that more metadata is chosen to be added to.
             The dictionary will have the file path as the key, and the meta data headers as the values. 
             And then the meta data headers are the nested keys, and the meta data as the values.
+        number_of_workers: int or None
+            - The number of processes that read the files at the same time. 1 reads them one at a time in this process.
+            - None uses the number of CPUs on the computer.
+        chunk_size: int
+            - The number of files that are sent to a worker process at a time. Only used with more than one worker.
+        cache_directory: str
+            - The directory of the extract.cache cache files, which also have the default metadata of each file.
+            - Files that are not cached yet are parsed and cached. None reads the metadata from the files.
     
     Returns:
         Nested Default Dictionary:
             - With the file path as the key, and the meta data headers as the values. 
             And then the meta data headers are the nested keys, and the meta data as the values.
+            - The file paths are always in the same order as list_of_files, no matter how many workers are used.
     """
     # Creating a new dictionary if none is inputted
     if file_path_to_meta_data is None:
         file_path_to_meta_data = defaultdict(dict)
     
-    for file_path in list_of_files:
-        # Parsing out the metadata from MED-PC files
-        try:
-            file_path_to_meta_data = get_med_pc_meta_data(file_path=file_path, meta_data_headers=meta_data_headers, file_path_to_meta_data=file_path_to_meta_data)
-        # Except in case file can not be read or is missing
-        except:
+    # Making a list so that the file paths can be matched up with the outputs of the workers
+    list_of_files = list(list_of_files)
+    read_file = partial(get_med_pc_meta_data_or_none, meta_data_headers=meta_data_headers, cache_directory=cache_directory)
+    for file_path, meta_data in zip(list_of_files, \
+            map_in_order(read_file, list_of_files, number_of_workers=number_of_workers, chunk_size=chunk_size)):
+        if meta_data is not None:
+            # Parsing out the metadata from MED-PC files
+            file_path_to_meta_data[file_path].update(meta_data)
+        else:
             print("Please review contents of {}".format(file_path))
     return file_path_to_meta_data
 
+def get_list_of_medpc_files(medpc_files, file_pattern="*.txt"):
+    """
+    Gets a sorted list of MED-PC files from a directory, a glob pattern or a list of files.
+
+    Args:
+        medpc_files: str or list
+            - A directory with the MED-PC files, a glob pattern(i.e. "./data/*/*.txt") or a list of file paths
+        file_pattern: str
+            - The glob pattern of the MED-PC files in the directory. Only used when medpc_files is a directory.
+
+    Returns:
+        list
+            - The file paths of the MED-PC files
+    """
+    if not isinstance(medpc_files, str):
+        return list(medpc_files)
+    if os.path.isdir(medpc_files):
+        medpc_files = os.path.join(medpc_files, file_pattern)
+    return sorted(glob.glob(medpc_files))
+
+def get_med_pc_meta_data_dataframe(medpc_files, file_pattern="*.txt", meta_data_headers=None, number_of_workers=1, chunk_size=256):
+    """
+    Gets the metadata of many MED-PC files as a dataframe, with one row for each file.
+    Only the start of each file is read with extract.metadata.scan_med_pc_meta_data, 
+    so a whole directory of recordings can be indexed without parsing the arrays.
+    The dates are converted into datetimes, and the times are converted into timedeltas. 
+    So the start of a recording is df["Start Date"] + df["Start Time"]. 
+    Dates and times that can't be parsed become NaT.
+
+    Args:
+        medpc_files: str or list
+            - A directory with the MED-PC files, a glob pattern(i.e. "./data/*/*.txt") or a list of file paths
+        file_pattern: str
+            - The glob pattern of the MED-PC files in the directory. Only used when medpc_files is a directory.
+        meta_data_headers: list
+            - List of the types of metadata to be parsed out for
+            - Default metadata includes: "File", "Start Date", "End Date", "Subject", "Experiment", "Group", "Box", "Start Time", "End Time", "MSN"
+        number_of_workers: int or None
+            - The number of processes that read the files at the same time. 1 reads them one at a time in this process.
+            - None uses the number of CPUs on the computer.
+        chunk_size: int
+            - The number of files that are sent to a worker process at a time. Only used with more than one worker.
+            - Reading the metadata of one file is quick, so large chunks keep the workers from waiting on each other.
+
+    Returns:
+        Pandas DataFrame
+            - A "file_path" column, and a column for each of the meta data headers. Metadata that isn't in a file is NaN.
+            - Files that could not be read are skipped over.
+    """
+    if meta_data_headers is None:
+        meta_data_headers = DEFAULT_META_DATA_HEADERS
+    list_of_files = get_list_of_medpc_files(medpc_files=medpc_files, file_pattern=file_pattern)
+    read_file = partial(get_med_pc_meta_data_or_none, meta_data_headers=meta_data_headers)
+
+    all_meta_data = []
+    for file_path, meta_data in zip(list_of_files, \
+            map_in_order(read_file, list_of_files, number_of_workers=number_of_workers, chunk_size=chunk_size)):
+        if meta_data is not None:
+            meta_data["file_path"] = file_path
+            all_meta_data.append(meta_data)
+        else:
+            print("Please review contents of {}".format(file_path))
+    meta_data_df = pd.DataFrame.from_records(all_meta_data, columns=["file_path"] + list(meta_data_headers))
+
+    for header in meta_data_df.columns.intersection(DATE_META_DATA_HEADERS):
+        meta_data_df[header] = pd.to_datetime(meta_data_df[header], format="%m/%d/%y", errors="coerce")
+    for header in meta_data_df.columns.intersection(TIME_META_DATA_HEADERS):
+        meta_data_df[header] = pd.to_timedelta(meta_data_df[header], errors="coerce")
+    return meta_data_df
+
 def main():
     """
     Main function that runs when the script is run
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Functions for running the extraction of many MED-PC files on multiple processes.
+Each MED-PC file can be read independently, so the files are split up between a pool of worker processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from profiling.stages import PROFILING_SETTINGS, add_stage_records, is_profiling_enabled, run_with_stage_records
+
+def map_in_order(function, iterable, number_of_workers=1, chunk_size=1):
+    """
+    Applies a function to every item of an iterable, either in this process or on a pool of worker processes.
+    The outputs are always yielded in the same order as the inputs, no matter which worker finishes first.
+    When profiling is enabled, the stages that run in the workers are sent back and added to the records of this process.
+
+    Args:
+        function: function
+            - The function to apply to each item. Must be picklable(i.e. defined at the top level of a module,
+            or a functools.partial of one) when more than one worker is used.
+        iterable: list
+            - The items to apply the function to. i.e. a list of MED-PC file paths
+        number_of_workers: int or None
+            - The number of worker processes. 1 runs everything in this process without a pool.
+            - None uses the number of CPUs on the computer.
+        chunk_size: int
+            - The number of items that are sent to a worker process at a time.
+            - Larger chunks lower the overhead of sending the items when there are a lot of small files.
+
+    Yields:
+        any
+            - The output of the function for each item, in the order of the iterable
+    """
+    if number_of_workers == 1:
+        yield from map(function, iterable)
+        return
+    with ProcessPoolExecutor(max_workers=number_of_workers) as executor:
+        if not is_profiling_enabled():
+            yield from executor.map(function, iterable, chunksize=chunk_size)
+            return
+        # Profiling the stages in the workers, and adding their records to the records of this process
+        profiled_function = partial(run_with_stage_records, function=function, trace_memory=PROFILING_SETTINGS["trace_memory"])
+        for output, stage_records in executor.map(profiled_function, iterable, chunksize=chunk_size):
+            add_stage_records(stage_records=stage_records)
+            yield output
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Functions for parsing MED-PC output data files directly into NumPy arrays.
+This reads each file in a single pass instead of going through medpc2excel.medpc_read,
+which builds a nested date to subject dictionary of Pandas DataFrames (and saves Excel files) for every file.
+
+For more information on the MED-PC's programming language, Trans:
+- https://www.med-associates.com/wp-content/uploads/2017/01/DOC-003-R3.4-SOF-735-MED-PC-IV-PROGRAMMER%E2%80%99S-MANUAL.pdf
+"""
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
+
+# Version of the parsed output. Increase this whenever the output changes, so that cached files are parsed again
+PARSER_VERSION = 1
+# The default metadata found in MED-PC files
+DEFAULT_META_DATA_HEADERS = ["File", "Start Date", "End Date", "Subject", "Experiment", "Group", "Box", "Start Time", "End Time", "MSN"]
+# Matches the lines that start a variable. i.e. "A:    2099.000" for scalars and "B:" for arrays
+VARIABLE_LINE_PATTERN = re.compile(r"^([A-Z]):[ \t]*(\S*)[ \t]*$", re.MULTILINE)
+# Maximum number of characters that are read from the start of a file when only the metadata is needed
+META_DATA_PREFIX_SIZE = 8192
+# Same pattern that medpc2excel uses to get the array names from the DIM lines of the MSN script
+DIM_LINE_PATTERN = re.compile(r"(DIM\s*)(\w)([\s=\d]*)([\s\\]*)(\w*\s*\w*)(\s+)([\w\(\)]*)")
+
+def get_array_labels_from_msn_file(msn_file_path):
+    """
+    Gets the column labels for all the arrays that are declared in a MED-PC script(.MPC file).
+    The labels are made from the first two words of the comment of each DIM line.
+    This is the same naming that medpc2excel uses, so that the columns match.
+    i.e. "DIM P = 20000 \\Port entry time stamp array" becomes "(P)Portentry"
+
+    Args:
+        msn_file_path: str
+            - The path to the MED-PC script that was used for the recording
+
+    Returns:
+        dict
+            - The array letter as the key, and the label as the value. In the order that the arrays are declared.
+    """
+    array_letter_to_label = {}
+    with open(msn_file_path, "r") as file:
+        for line in file:
+            if "DIM" not in line:
+                continue
+            match = DIM_LINE_PATTERN.search(line)
+            # Skipping the arrays that don't have a comment to name them after
+            if match and match.group(5):
+                letter = match.group(2)
+                array_letter_to_label[letter] = "({}){}".format(letter, re.sub(r"\s*", "", match.group(5)))
+    return array_letter_to_label
+
+@lru_cache(maxsize=None)
+def get_cached_array_labels(msn_file_path, modification_time_ns):
+    """
+    Gets the array labels of a MED-PC script with extract.parser.get_array_labels_from_msn_file, only reading the script once.
+    The modification time is part of the cache key, so a script that is edited is read again.
+
+    Args:
+        msn_file_path: str
+            - The absolute path to the MED-PC script
+        modification_time_ns: int
+            - The modification time of the script in nanoseconds
+
+    Returns:
+        tuple
+            - (letter, label) pairs in the order that the arrays are declared. A tuple so that the cached value can't be changed.
+    """
+    return tuple(get_array_labels_from_msn_file(msn_file_path=msn_file_path).items())
+
+def get_msn_schema(msn_file_path):
+    """
+    Gets the variable schema of a MED-PC script, i.e. the label of each array letter.
+    The script is only read once per process, instead of once for every data file that was recorded with it.
+
+    Args:
+        msn_file_path: str
+            - The path to the MED-PC script that was used for the recording
+
+    Returns:
+        dict
+            - The array letter as the key, and the label as the value. In the order that the arrays are declared.
+    """
+    return dict(get_cached_array_labels(msn_file_path=os.path.abspath(msn_file_path), \
+        modification_time_ns=os.stat(msn_file_path).st_mtime_ns))
+
+def get_array_letters_from_labels(array_letter_to_label, array_labels):
+    """
+    Gets the array letters of the column labels that an analysis needs, i.e. "(P)Portentry" becomes "P".
+
+    Args:
+        array_letter_to_label: dict
+            - Output of extract.parser.get_msn_schema
+        array_labels: list
+            - The column labels to get the letters of
+
+    Returns:
+        dict
+            - The array letter as the key, and the label as the value. In the same order as array_labels.
+    """
+    label_to_array_letter = {label: letter for letter, label in array_letter_to_label.items()}
+    missing_labels = [label for label in array_labels if label not in label_to_array_letter]
+    if missing_labels:
+        raise ValueError("Columns {} are not declared in the MED-PC script".format(missing_labels))
+    return {label_to_array_letter[label]: label for label in array_labels}
+
+@lru_cache(maxsize=None)
+def get_meta_data_header_pattern(meta_data_headers=tuple(DEFAULT_META_DATA_HEADERS)):
+    """
+    Makes one regular expression that matches the lines that start with any of the metadata headers.
+    The headers are tried in the order that they are listed, the same as looping through them with str.startswith.
+    The pattern is only compiled once for each set of headers.
+
+    Args:
+        meta_data_headers: tuple
+            - The types of metadata to match. Must be a tuple so that the pattern can be cached.
+
+    Returns:
+        re.Pattern
+            - Pattern with the header as the first group, and the rest of the line as the second group
+    """
+    return re.compile(r"^[ \t]*({})(.*)$".format("|".join([re.escape(header) for header in meta_data_headers])), re.MULTILINE)
+
+def get_meta_data_from_text(text, meta_data_headers=None):
+    """
+    Parses out the metadata from the text at the start of a MED-PC data file.
+    i.e. "Start Date: 05/04/22" becomes {"Start Date": "05/04/22"}
+
+    Args:
+        text: str
+            - The text that has the metadata. Usually everything before the first variable(i.e. "A:").
+        meta_data_headers: list
+            - List of the types of metadata to be parsed out for
+            - Default metadata includes: "File", "Start Date", "End Date", "Subject", "Experiment", "Group", "Box", "Start Time", "End Time", "MSN"
+
+    Returns:
+        dict
+            - The header name as the key, and the header value as the value
+    """
+    if meta_data_headers is None:
+        meta_data_headers = DEFAULT_META_DATA_HEADERS
+    header_pattern = get_meta_data_header_pattern(meta_data_headers=tuple(meta_data_headers))
+    # Removing all unnecessary characters
+    return {match.group(1): match.group(2).strip().strip(":").strip() for match in header_pattern.finditer(text)}
+
+def get_msn_file_path(medpc_file_path, msn, msn_directory=None):
+    """
+    Gets the path of the MED-PC script that was used for a recording.
+    By default, this is expected to be in the same directory as the recording(which is what medpc2excel expects).
+
+    Args:
+        medpc_file_path: str
+            - The path to the MED-PC data file
+        msn: str
+            - The name of the MED-PC script. Usually from the "MSN" metadata
+        msn_directory: str
+            - The directory that has the MED-PC scripts.
+            - Defaults to the directory of medpc_file_path
+
+    Returns:
+        str
+            - The path to the .MPC file
+    """
+    if msn_directory is None:
+        msn_directory = os.path.dirname(medpc_file_path)
+    return os.path.join(msn_directory, "{}.MPC".format(msn))
+
+def get_medpc_arrays_from_file(file_path, array_letters=None):
+    """
+    Parses a MED-PC data file into the metadata, the scalar variables and the array variables.
+    The output file looks something like:
+        Start Date: 05/04/22
+        ...
+        MSN: levelNP_CS_reward_laserepochON1st_noshock
+        A:    2099.000
+        D:    9000.000
+        ...
+        B:
+             0:        0.000
+             1:        0.000
+    Only the first recording session in the file is parsed.
+    This is the same session that extract.dataframe.get_medpc_dataframe_from_medpc_read_output uses.
+    The arrays that aren't in array_letters are skipped over without splitting or converting their values,
+    which is where most of the time and memory of parsing a file goes.
+
+    Args:
+        file_path: str
+            - The path to the MED-PC data file
+        array_letters: list or None
+            - The letters of the arrays to parse, i.e. ["S", "P", "N"]. None parses all of them. The scalars are always parsed.
+
+    Returns:
+        dict
+            - "meta_data": The header name as the key, and the header value as the value.
+            Uses the same formatting as extract.metadata.get_med_pc_meta_data
+            - "date": The start date of the recording formatted as YYYYMMDD(the same as medpc2excel)
+            - "scalars": The variable letter as the key, and the float as the value
+            - "arrays": The variable letter as the key, and the 1D Numpy Array of float64 as the value. Only the arrays in array_letters.
+    """
+    with open(file_path, "r") as file:
+        text = file.read()
+    # Only keeping the first session if multiple sessions were saved in the same file
+    second_session_index = text.find("Start Date:", text.find("Start Date:") + 1)
+    if second_session_index != -1:
+        text = text[:second_session_index]
+
+    variable_matches = list(VARIABLE_LINE_PATTERN.finditer(text))
+    if not variable_matches:
+        raise ValueError("No variables found in {}".format(file_path))
+
+    # Everything before the first variable is the metadata
+    meta_data = get_meta_data_from_text(text=text[:variable_matches[0].start()])
+    date = datetime.strptime(meta_data["Start Date"], "%m/%d/%y").strftime("%Y%m%d")
+
+    scalars = {}
+    arrays = {}
+    for index, match in enumerate(variable_matches):
+        letter, value = match.group(1), match.group(2)
+        # Scalars have the value on the same line as the letter
+        if value:
+            scalars[letter] = float(value)
+            continue
+        if array_letters is not None and letter not in array_letters:
+            continue
+        # Arrays have one or more "index: value" pairs on each line until the next variable
+        block_end = variable_matches[index + 1].start() if index + 1 < len(variable_matches) else len(text)
+        tokens = text[match.end():block_end].split()
+        arrays[letter] = np.array([token for token in tokens if not token.endswith(":")], dtype=np.float64)
+    return {"meta_data": meta_data, "date": date, "scalars": scalars, "arrays": arrays}
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+
+if __name__ == '__main__':
+    main()
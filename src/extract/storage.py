@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Functions for saving the MED-PC recordings to a partitioned Parquet dataset, and loading them back.
+This replaces saving the dataframes of the notebooks as CSVs, which loses the dtypes and copies the metadata onto every row.
+
+The store directory looks something like:
+    store_directory/
+        metadata.parquet
+        sessions/
+            date=20220504/
+                subject=1.1/
+                    MSN=levelNP_CS_reward_laserepochON1st_noshock/
+                        session_3f2a...9c1e-0.parquet
+The recordings are split up into one directory for each date, subject and MSN.
+So loading one date range, subject or cage only reads the files of those sessions.
+Each MED-PC file is saved as its own Parquet file that is named by a hash of its path. So two files with the same date,
+subject and MSN(i.e. a session that was run again) are both kept, and saving a file again only replaces the rows of that file.
+The metadata of each file is saved once in a separate table, instead of on every row.
+"""
+import glob
+import hashlib
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from extract.metadata import get_med_pc_meta_data_dataframe
+
+# Name of the table with the metadata of every file
+METADATA_FILE_NAME = "metadata.parquet"
+# Name of the directory with the partitioned recordings
+SESSION_DIRECTORY_NAME = "sessions"
+# The columns that the recordings are split up by. These are all saved as strings.
+PARTITION_COLUMNS = ["date", "subject", "MSN"]
+# The columns that are turned into categoricals when they are loaded
+CATEGORICAL_COLUMNS = ["file_path", "date", "subject", "MSN"]
+# Start of the name of the Parquet file of each session, followed by the hash of the file path
+SESSION_FILE_PREFIX = "session_"
+
+def get_session_file_key(file_path):
+    """
+    Gets the part of the name of the Parquet file of a session that is different for every MED-PC file.
+
+    Args:
+        file_path: str
+            - The path to the MED-PC data file
+
+    Returns:
+        str
+            - The hash of the file path
+    """
+    return hashlib.sha1(str(file_path).encode()).hexdigest()
+
+def get_session_partitioning():
+    """
+    Gets how the recordings are split up into directories.
+    The types are set to strings, so that dates like "20220504" and subjects like "1.1" aren't turned into numbers.
+
+    Returns:
+        pyarrow.dataset.Partitioning
+            - Hive style partitioning(i.e. "date=20220504/subject=1.1/MSN=...") by extract.storage.PARTITION_COLUMNS
+    """
+    return ds.partitioning(pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]), flavor="hive")
+
+def get_cage_from_group(group_series):
+    """
+    Gets the cage from the "Group" metadata. i.e. "Cage 4" becomes "4". The same as notebook 01.
+
+    Args:
+        group_series: Pandas Series
+            - The "Group" metadata of each file
+
+    Returns:
+        Pandas Series
+            - The cage of each file
+    """
+    return group_series.astype(str).str.strip("Cage").str.strip()
+
+def combine_filters(first_filter, second_filter):
+    """
+    Combines two pyarrow dataset filters so that a row must match both.
+
+    Args:
+        first_filter: pyarrow.dataset.Expression or None
+            - The filters so far. None if there aren't any yet.
+        second_filter: pyarrow.dataset.Expression
+            - The filter to add
+
+    Returns:
+        pyarrow.dataset.Expression
+            - The combined filter
+    """
+    if first_filter is None:
+        return second_filter
+    return first_filter & second_filter
+
+def save_medpc_session_store(concatted_medpc_df, store_directory, metadata_df=None):
+    """
+    Saves the recordings and the metadata of MED-PC files to a store directory.
+    Sessions that are already in the store are replaced, and all the other sessions are kept.
+    So new recordings can be added to the same store later on.
+
+    Args:
+        concatted_medpc_df: Pandas DataFrame
+            - Output of extract.dataframe.get_medpc_dataframe_from_list_of_files, with the "date", "subject" and "file_path" columns
+        store_directory: str
+            - The directory to save to. It is created if it doesn't exist.
+        metadata_df: Pandas DataFrame
+            - Output of extract.metadata.get_med_pc_meta_data_dataframe, with a "file_path" column and a row for each file.
+            - None reads the metadata from the files in the "file_path" column.
+            - A "cage" column is added from the "Group" column if there isn't one already.
+    """
+    file_paths = pd.unique(concatted_medpc_df["file_path"])
+    if metadata_df is None:
+        metadata_df = get_med_pc_meta_data_dataframe(medpc_files=list(file_paths))
+    metadata_df = metadata_df[metadata_df["file_path"].isin(file_paths)].drop_duplicates(subset="file_path").copy()
+    if "cage" not in metadata_df.columns and "Group" in metadata_df.columns:
+        metadata_df["cage"] = get_cage_from_group(metadata_df["Group"])
+    for column in ["date", "subject"]:
+        if column not in metadata_df.columns:
+            metadata_df[column] = metadata_df["file_path"].map(concatted_medpc_df.groupby("file_path", sort=False)[column].first())
+
+    session_df = concatted_medpc_df.copy()
+    session_df["MSN"] = session_df["file_path"].map(metadata_df.set_index("file_path")["MSN"])
+    for column in CATEGORICAL_COLUMNS:
+        session_df[column] = session_df[column].astype(str)
+    session_directory = os.path.join(store_directory, SESSION_DIRECTORY_NAME)
+    for file_path, file_df in session_df.groupby("file_path", sort=False):
+        file_key = get_session_file_key(file_path=file_path)
+        session_file_pattern = os.path.join(session_directory, "*", "*", "*", "{}{}-*.parquet".format(SESSION_FILE_PREFIX, file_key))
+        # The files of the session that were saved before. They are in another directory if the date, subject or MSN has changed.
+        old_session_file_paths = glob.glob(session_file_pattern)
+        # Keeping the row number of each recording, which the CSVs saved as the first column
+        # Only the file with the same name is overwritten, so the other sessions in the same directory are kept
+        ds.write_dataset(pa.Table.from_pandas(file_df, preserve_index=True), session_directory, format="parquet", \
+            partitioning=get_session_partitioning(), basename_template="{}{}-{{i}}.parquet".format(SESSION_FILE_PREFIX, file_key), \
+            existing_data_behavior="overwrite_or_ignore")
+        new_session_file_paths = set(glob.glob(session_file_pattern))
+        for old_session_file_path in old_session_file_paths:
+            if old_session_file_path not in new_session_file_paths:
+                os.remove(old_session_file_path)
+
+    # Replacing the metadata of the sessions that were saved again
+    metadata_file_path = os.path.join(store_directory, METADATA_FILE_NAME)
+    if os.path.exists(metadata_file_path):
+        old_metadata_df = pd.read_parquet(metadata_file_path)
+        metadata_df = pd.concat([old_metadata_df[~old_metadata_df["file_path"].isin(metadata_df["file_path"])], metadata_df], \
+            ignore_index=True)
+    for column in ["file_path", "date", "subject"]:
+        metadata_df[column] = metadata_df[column].astype(str)
+    metadata_df.reset_index(drop=True).to_parquet(metadata_file_path, index=False)
+
+def load_medpc_metadata(store_directory, dates=None, date_range=None, subjects=None, msns=None, cages=None):
+    """
+    Loads the metadata of the files in a store directory. Only the files that match all the chosen filters are kept.
+
+    Args:
+        store_directory: str
+            - The directory that extract.storage.save_medpc_session_store saved to
+        dates: list
+            - The dates of the recordings to keep, formatted as YYYYMMDD. i.e. ["20220504", "20220505"]
+        date_range: tuple
+            - The first and last dates of the recordings to keep, formatted as YYYYMMDD. i.e. ("20220504", "20220510")
+        subjects: list
+            - The subjects to keep. i.e. ["1.1", "4.4"]
+        msns: list
+            - The MED-PC scripts to keep. i.e. ["levelNP_CS_reward_laserepochON1st_noshock"]
+        cages: list
+            - The cages to keep. i.e. ["1", "2"]
+
+    Returns:
+        Pandas DataFrame
+            - The metadata of each file, with the "file_path", "date", "subject" and "cage" columns
+    """
+    metadata_filters = []
+    for column, values in [("date", dates), ("subject", subjects), ("MSN", msns), ("cage", cages)]:
+        if values is not None:
+            metadata_filters.append((column, "in", [str(value) for value in values]))
+    if date_range is not None:
+        metadata_filters += [("date", ">=", str(date_range[0])), ("date", "<=", str(date_range[1]))]
+    return pq.read_table(os.path.join(store_directory, METADATA_FILE_NAME), filters=metadata_filters or None).to_pandas()
+
+def load_medpc_session_store(store_directory, dates=None, date_range=None, subjects=None, msns=None, cages=None, columns=None, \
+        with_metadata=False):
+    """
+    Loads the recordings from a store directory. Only the sessions that match all the chosen filters are read.
+    The filters on the date, subject and MSN skip over the directories of the other sessions without opening them.
+    The cages are looked up in the metadata table first, and then only the sessions of those cages are read.
+
+    Args:
+        store_directory: str
+            - The directory that extract.storage.save_medpc_session_store saved to
+        dates: list
+            - The dates of the recordings to keep, formatted as YYYYMMDD. i.e. ["20220504", "20220505"]
+        date_range: tuple
+            - The first and last dates of the recordings to keep, formatted as YYYYMMDD. i.e. ("20220504", "20220510")
+        subjects: list
+            - The subjects to keep. i.e. ["1.1", "4.4"]
+        msns: list
+            - The MED-PC scripts to keep. i.e. ["levelNP_CS_reward_laserepochON1st_noshock"]
+        cages: list
+            - The cages to keep. i.e. ["1", "2"]
+        columns: list
+            - The recording columns to load. i.e. ["(P)Portentry", "(N)Portexit"]. None loads all of them.
+            - The "file_path", "date", "subject" and "MSN" columns are always loaded.
+        with_metadata: bool
+            - Whether or not to add the metadata of each file as columns. The same as recording_and_metadata_df of notebook 01.
+
+    Returns:
+        Pandas DataFrame
+            - The same columns as extract.dataframe.get_medpc_dataframe_from_list_of_files, with an "MSN" column.
+            - "file_path", "date", "subject" and "MSN" are categoricals
+    """
+    session_filter = None
+    for column, values in [("date", dates), ("subject", subjects), ("MSN", msns)]:
+        if values is not None:
+            session_filter = combine_filters(session_filter, ds.field(column).isin([str(value) for value in values]))
+    if date_range is not None:
+        session_filter = combine_filters(session_filter, (ds.field("date") >= str(date_range[0])) & (ds.field("date") <= str(date_range[1])))
+    if cages is not None:
+        metadata_df = load_medpc_metadata(store_directory=store_directory, dates=dates, date_range=date_range, subjects=subjects, \
+            msns=msns, cages=cages)
+        # Narrowing down the directories to read, and then only keeping the rows of the files of the cages
+        for column in ["date", "subject", "MSN"]:
+            session_filter = combine_filters(session_filter, ds.field(column).isin(pd.unique(metadata_df[column].astype(str)).tolist()))
+        session_filter = combine_filters(session_filter, ds.field("file_path").isin(metadata_df["file_path"].tolist()))
+
+    session_dataset = ds.dataset(os.path.join(store_directory, SESSION_DIRECTORY_NAME), format="parquet", \
+        partitioning=get_session_partitioning())
+    if columns is not None:
+        index_columns = [name for name in session_dataset.schema.names if name.startswith("__index_level_")]
+        columns = list(columns) + [column for column in CATEGORICAL_COLUMNS + index_columns if column not in columns]
+    session_df = session_dataset.to_table(columns=columns, filter=session_filter).to_pandas()
+    for column in CATEGORICAL_COLUMNS:
+        session_df[column] = session_df[column].astype("category")
+
+    if with_metadata:
+        metadata_df = load_medpc_metadata(store_directory=store_directory).drop(columns=["date", "subject"])
+        metadata_df = metadata_df.drop(columns=[column for column in metadata_df.columns if column in session_df.columns and column != "file_path"])
+        session_index = session_df.index
+        session_df = session_df.merge(metadata_df, on="file_path", how="left")
+        session_df.index = session_index
+    return session_df
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Functions for finding how much intervals(i.e. port visits) overlap with windows(i.e. the tones or laser epochs) for a whole cohort at once.
+Instead of looping through the sessions, the times of each session are shifted by a session key,
+so that the sessions are one after the other on one time line and never overlap each other:
+    keyed time = time + session index * session span
+Then the intervals are sorted once, and every window is binary searched in the sorted starts and stops.
+This takes O((intervals + windows) log intervals) time, and finds every interval that overlaps with a window,
+not only the last port visit before the tone like notebook 02.
+"""
+import numpy as np
+from extract.events import DEFAULT_TICKS_PER_SECOND, get_session_event_times
+from processing.port import get_port_visit_intervals
+from processing.tone import get_valid_tone_offsets
+
+# The number of seconds that the tone plays for in levelNP_CS_reward_laserepochON1st_noshock
+DEFAULT_TONE_DURATION = 10
+
+def get_session_indexes(offsets):
+    """
+    Gets the session index of every item, from the offsets of each session.
+
+    Args:
+        offsets: Numpy Array
+            - The offsets of each session. Has one more item than the number of sessions.
+
+    Returns:
+        Numpy Array
+            - The index of the session of each item
+    """
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def get_session_interval_pairs(interval_starts, start_offsets, interval_stops, stop_offsets):
+    """
+    Pairs up the starts and stops of the intervals of each session by their position in the session. i.e. The 1st entry with the 1st exit.
+    The same as zip for each session, so sessions with more starts than stops only keep as many pairs as there are stops.
+    Pairs with a NaN, or a stop before the start, are removed.
+
+    Args:
+        interval_starts: Numpy Array
+            - The start times of all the sessions. i.e. The port entries
+        start_offsets: Numpy Array
+            - The offsets of each session in interval_starts
+        interval_stops: Numpy Array
+            - The stop times of all the sessions. i.e. The port exits
+        stop_offsets: Numpy Array
+            - The offsets of each session in interval_stops
+
+    Returns:
+        Numpy Array, Numpy Array, Numpy Array
+            - The start of each interval
+            - The stop of each interval
+            - The session index of each interval
+    """
+    start_offsets = np.asarray(start_offsets, dtype=np.int64)
+    stop_offsets = np.asarray(stop_offsets, dtype=np.int64)
+    number_of_pairs = np.minimum(np.diff(start_offsets), np.diff(stop_offsets))
+    pair_offsets = np.concatenate([[0], np.cumsum(number_of_pairs)])
+    session_indexes = get_session_indexes(pair_offsets)
+    # The position of each pair in its session
+    pair_positions = np.arange(pair_offsets[-1]) - pair_offsets[session_indexes]
+    starts = np.asarray(interval_starts, dtype=np.float64)[start_offsets[session_indexes] + pair_positions]
+    stops = np.asarray(interval_stops, dtype=np.float64)[stop_offsets[session_indexes] + pair_positions]
+    is_valid = ~np.isnan(starts) & ~np.isnan(stops) & (stops >= starts)
+    return starts[is_valid], stops[is_valid], session_indexes[is_valid]
+
+def get_session_span(*all_times):
+    """
+    Gets a length of time that is longer than any session, so that sessions shifted by it don't overlap each other.
+
+    Args:
+        *all_times: Numpy Array
+            - All the times of all the sessions, including the starts and stops of the windows
+
+    Returns:
+        float
+            - A whole number that is larger than the largest time, and more than twice the most negative time
+    """
+    largest_time = max([np.nanmax(np.abs(times), initial=0) for times in all_times])
+    return float(np.ceil(2 * largest_time) + 1)
+
+def count_overlapping_intervals(sorted_starts, sorted_stops, window_starts, window_stops):
+    """
+    Counts the intervals that overlap with each window. Intervals that only touch the window at one time are counted.
+    Every interval that starts before the window ends has either stopped before the window starts, or overlaps with it.
+    So the count is the number of starts up to the window stop minus the number of stops before the window start.
+    The starts and stops are sorted separately, so the intervals can overlap each other.
+
+    Args:
+        sorted_starts: Numpy Array
+            - The start of every interval, sorted from smallest to largest
+        sorted_stops: Numpy Array
+            - The stop of every interval, sorted from smallest to largest
+        window_starts: Numpy Array
+            - The start of each window
+        window_stops: Numpy Array
+            - The stop of each window
+
+    Returns:
+        Numpy Array
+            - The number of intervals that overlap with each window
+    """
+    return np.searchsorted(sorted_starts, window_stops, side="right") - np.searchsorted(sorted_stops, window_starts, side="left")
+
+def get_overlap_durations(merged_starts, merged_stops, window_starts, window_stops):
+    """
+    Gets the total time that the intervals overlap with each window, with a cumulative sum of the interval durations.
+    The intervals must not overlap each other(i.e. from processing.port.get_port_visit_intervals), so no time is counted twice.
+
+    Args:
+        merged_starts: Numpy Array
+            - The sorted start of each interval
+        merged_stops: Numpy Array
+            - The stop of each interval, which are also sorted because the intervals don't overlap
+        window_starts: Numpy Array
+            - The start of each window
+        window_stops: Numpy Array
+            - The stop of each window
+
+    Returns:
+        Numpy Array
+            - The time that each window overlaps with the intervals
+    """
+    if len(merged_starts) == 0:
+        return np.zeros(len(window_starts))
+    cumulative_durations = np.concatenate([[0], np.cumsum(merged_stops - merged_starts)])
+    # The first interval that stops after the window starts, and the one after the last interval that starts before the window stops
+    first_indexes = np.searchsorted(merged_stops, window_starts, side="right")
+    stop_indexes = np.searchsorted(merged_starts, window_stops, side="left")
+    has_overlap = stop_indexes > first_indexes
+    first_indexes = np.where(has_overlap, first_indexes, 0)
+    last_indexes = np.where(has_overlap, stop_indexes - 1, 0)
+    # Removing the parts of the first and last intervals that are outside of the window
+    overlap_durations = cumulative_durations[stop_indexes] - cumulative_durations[first_indexes] \
+        - np.maximum(window_starts - merged_starts[first_indexes], 0) - np.maximum(merged_stops[last_indexes] - window_stops, 0)
+    return np.where(has_overlap, overlap_durations, 0)
+
+def get_session_window_overlaps(window_starts, window_stops, window_offsets, interval_starts, start_offsets, interval_stops, stop_offsets):
+    """
+    Finds the overlap of the intervals with the windows of the same session, for every session at once.
+    The times of each session are shifted by a session key, so all the sessions are sorted and searched together.
+
+    Args:
+        window_starts: Numpy Array
+            - The start of each window of all the sessions. i.e. The tone onsets
+        window_stops: Numpy Array
+            - The stop of each window of all the sessions
+        window_offsets: Numpy Array
+            - The offsets of each session in the windows. Has one more item than the number of sessions.
+        interval_starts: Numpy Array
+            - The start times of the intervals of all the sessions. i.e. The port entries
+        start_offsets: Numpy Array
+            - The offsets of each session in interval_starts
+        interval_stops: Numpy Array
+            - The stop times of the intervals of all the sessions. i.e. The port exits
+        stop_offsets: Numpy Array
+            - The offsets of each session in interval_stops
+
+    Returns:
+        dict
+            - The column name as the key, and a Numpy Array with a value for each window as the value:
+            - "number_of_overlapping_intervals": The number of intervals that overlap with the window
+            - "overlap_duration": The time in the window that is inside of at least one interval
+            - "is_inside_at_window_start": Whether or not an interval started at or before and stopped at or after the window start
+    """
+    window_starts = np.asarray(window_starts, dtype=np.float64)
+    window_stops = np.asarray(window_stops, dtype=np.float64)
+    starts, stops, interval_session_indexes = get_session_interval_pairs(interval_starts=interval_starts, start_offsets=start_offsets, \
+        interval_stops=interval_stops, stop_offsets=stop_offsets)
+    session_span = get_session_span(window_starts, window_stops, starts, stops)
+    interval_keys = interval_session_indexes * session_span
+    window_keys = get_session_indexes(window_offsets) * session_span
+    keyed_window_starts = window_starts + window_keys
+    keyed_window_stops = window_stops + window_keys
+
+    sorted_starts = np.sort(starts + interval_keys)
+    sorted_stops = np.sort(stops + interval_keys)
+    # Merging the intervals that overlap each other, which never merges intervals of different sessions
+    merged_starts, merged_stops = get_port_visit_intervals(port_entry_scaled=starts + interval_keys, port_exit_scaled=stops + interval_keys)
+    return {
+        "number_of_overlapping_intervals": count_overlapping_intervals(sorted_starts=sorted_starts, sorted_stops=sorted_stops, \
+            window_starts=keyed_window_starts, window_stops=keyed_window_stops),
+        "overlap_duration": get_overlap_durations(merged_starts=merged_starts, merged_stops=merged_stops, \
+            window_starts=keyed_window_starts, window_stops=keyed_window_stops),
+        "is_inside_at_window_start": count_overlapping_intervals(sorted_starts=sorted_starts, sorted_stops=sorted_stops, \
+            window_starts=keyed_window_starts, window_stops=keyed_window_starts) > 0
+        }
+
+def get_tone_overlaps_from_session_times(session_df, tone_times, tone_offsets, port_entries, port_entry_offsets, port_exits, \
+        port_exit_offsets, seconds_before_tone=0, seconds_after_tone=DEFAULT_TONE_DURATION):
+    """
+    Finds how much the port visits overlap with the window around every valid tone of every session.
+    The times of all the sessions are in one array for each event, with the offsets of each session.
+    i.e. The tone times of the i-th session are tone_times[tone_offsets[i]:tone_offsets[i + 1]]
+
+    Args:
+        session_df: Pandas DataFrame
+            - A row for each session, with the file path and any other columns(i.e. date and subject) to add to every tone of the session
+        tone_times: Numpy Array
+            - The tone times of all the sessions. The valid tones of each session are found with processing.tone.get_valid_tone_offsets.
+        tone_offsets: Numpy Array
+            - The offsets of each session in tone_times. Has one more item than the number of sessions.
+        port_entries: Numpy Array
+            - The port entry times of all the sessions
+        port_entry_offsets: Numpy Array
+            - The offsets of each session in port_entries
+        port_exits: Numpy Array
+            - The port exit times of all the sessions
+        port_exit_offsets: Numpy Array
+            - The offsets of each session in port_exits
+        seconds_before_tone: float
+            - The number of seconds before the tone that the window starts
+        seconds_after_tone: float
+            - The number of seconds after the tone that the window stops. Defaults to the length of the tone.
+
+    Returns:
+        Pandas DataFrame
+            - A row for each valid tone of each session, with the columns of session_df, the "current_tone_time",
+            the "number_of_overlapping_port_visits", the "port_visit_overlap_duration" in seconds,
+            and whether or not the subject was in the port when the window started("is_in_port_at_window_start")
+    """
+    valid_tone_times, valid_tone_offsets = get_valid_tone_offsets(tone_times=tone_times, offsets=tone_offsets)
+    window_overlaps = get_session_window_overlaps(window_starts=valid_tone_times - seconds_before_tone, \
+        window_stops=valid_tone_times + seconds_after_tone, window_offsets=valid_tone_offsets, interval_starts=port_entries, \
+        start_offsets=port_entry_offsets, interval_stops=port_exits, stop_offsets=port_exit_offsets)
+
+    tone_overlap_df = session_df.iloc[get_session_indexes(valid_tone_offsets)].reset_index(drop=True)
+    tone_overlap_df["current_tone_time"] = valid_tone_times
+    tone_overlap_df["number_of_overlapping_port_visits"] = window_overlaps["number_of_overlapping_intervals"]
+    tone_overlap_df["port_visit_overlap_duration"] = window_overlaps["overlap_duration"]
+    tone_overlap_df["is_in_port_at_window_start"] = window_overlaps["is_inside_at_window_start"]
+    return tone_overlap_df
+
+def get_tone_overlaps_from_event_table(event_df, session_df, tone_variable="(S)CSpresentation", port_entry_variable="(P)Portentry", \
+        port_exit_variable="(N)Portexit", ticks_per_second=DEFAULT_TICKS_PER_SECOND, seconds_before_tone=0, \
+        seconds_after_tone=DEFAULT_TONE_DURATION):
+    """
+    Same as get_tone_overlaps_from_session_times, but with the event table of extract.events.
+
+    Args:
+        event_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        session_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        tone_variable: str
+            - Name of the variable of the tone times. Can also be the onsets of other windows, like laser epochs.
+        port_entry_variable: str
+            - Name of the variable of the port entry times
+        port_exit_variable: str
+            - Name of the variable of the port exit times
+        ticks_per_second: int or None
+            - The ticks per second that the event table was made with. None if the times are in seconds.
+        seconds_before_tone: float
+            - The number of seconds before the tone that the window starts
+        seconds_after_tone: float
+            - The number of seconds after the tone that the window stops. Defaults to the length of the tone.
+
+    Returns:
+        Pandas DataFrame
+            - A row for each valid tone of each session. Same as get_tone_overlaps_from_session_times.
+    """
+    variable_to_times_and_offsets = {variable: get_session_event_times(event_df=event_df, variable=variable, \
+        number_of_sessions=len(session_df), ticks_per_second=ticks_per_second) \
+        for variable in [tone_variable, port_entry_variable, port_exit_variable]}
+    tone_times, tone_offsets = variable_to_times_and_offsets[tone_variable]
+    port_entries, port_entry_offsets = variable_to_times_and_offsets[port_entry_variable]
+    port_exits, port_exit_offsets = variable_to_times_and_offsets[port_exit_variable]
+    return get_tone_overlaps_from_session_times(session_df=session_df.reset_index(drop=True), tone_times=tone_times, \
+        tone_offsets=tone_offsets, port_entries=port_entries, port_entry_offsets=port_entry_offsets, port_exits=port_exits, \
+        port_exit_offsets=port_exit_offsets, seconds_before_tone=seconds_before_tone, seconds_after_tone=seconds_after_tone)
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+
+if __name__ == '__main__':
+    main()
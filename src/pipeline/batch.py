@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Functions for running the whole analysis on a directory of MED-PC files without a notebook,
+i.e. reading the files, getting the valid tones, the latencies to the first port entry and the port occupancy around the tones.
+
+Every MED-PC file is its own task, and the tasks are run on worker processes. The results of each task are saved
+as a checkpoint file as soon as the task is done. So a run that is stopped part of the way through, i.e. an overnight
+run over a large archive, skips all the tasks that already have a checkpoint when it is started again.
+The name of each checkpoint is a hash of the file signature and the settings, so files that have changed are run again.
+
+The output directory looks something like:
+    output_directory/
+        checkpoints/
+            3f2a...9c1e.pkl
+            8b0d...27aa.pkl
+        latencies.csv
+        peri_tone_occupancy.csv
+        peri_tone_occupancy_by_subject.csv
+        errors.txt
+
+Run from the src directory:
+    python -m pipeline.batch ../jupyter_notebooks/example_recordings ./proc/batch_run --number_of_workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import traceback
+from functools import partial
+import numpy as np
+import pandas as pd
+from extract.cache import get_file_signature
+from extract.dataframe import get_medpc_dataframe_with_traceback
+from extract.metadata import get_list_of_medpc_files
+from extract.parallel import map_in_order
+from processing.port import get_bin_seconds, get_binned_sums, get_cohort_peri_tone_inside_port_tensor
+from processing.tone import get_concatted_port_entries_and_latencies_dataframe
+
+# Name of the directory in the output directory that has the checkpoint of every task
+CHECKPOINT_DIRECTORY_NAME = "checkpoints"
+# The only columns that the analysis uses, so the other arrays of the files aren't parsed
+ANALYSIS_COLUMNS = ["(S)CSpresentation", "(P)Portentry", "(N)Portexit"]
+# Changing this makes all the old checkpoints be ignored. i.e. when the results of a task are calculated differently.
+CHECKPOINT_VERSION = 1
+
+def get_checkpoint_file_path(file_path, checkpoint_directory, task_settings):
+    """
+    Gets the path of the checkpoint file for the task of a MED-PC file.
+    The name of the checkpoint file is a hash of the file signature, the settings of the task and the checkpoint version.
+
+    Args:
+        file_path: str
+            - The path to the MED-PC data file
+        checkpoint_directory: str
+            - The directory that has all the checkpoint files
+        task_settings: dict
+            - The settings that change the results of the task, i.e. the tone durations and the MSN directory
+
+    Returns:
+        str
+            - The path to the .pkl checkpoint file. The file might not exist yet.
+    """
+    checkpoint_key_values = get_file_signature(file_path=file_path)
+    checkpoint_key_values["task_settings"] = task_settings
+    checkpoint_key_values["checkpoint_version"] = CHECKPOINT_VERSION
+    checkpoint_key = hashlib.sha1(json.dumps(checkpoint_key_values, sort_keys=True).encode()).hexdigest()
+    return os.path.join(checkpoint_directory, "{}.pkl".format(checkpoint_key))
+
+def save_checkpoint(session_results, checkpoint_file_path):
+    """
+    Saves the results of a task.
+    The file is written under a temporary name first, so that a task that is stopped part of the way through
+    never leaves a checkpoint that looks finished.
+
+    Args:
+        session_results: dict
+            - Output of pipeline.batch.get_session_results
+        checkpoint_file_path: str
+            - Output of pipeline.batch.get_checkpoint_file_path
+    """
+    temporary_file_path = "{}.{}.tmp".format(checkpoint_file_path, os.getpid())
+    with open(temporary_file_path, "wb") as file:
+        pickle.dump(session_results, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_file_path, checkpoint_file_path)
+
+def load_checkpoint(checkpoint_file_path):
+    """
+    Loads the results of a task.
+
+    Args:
+        checkpoint_file_path: str
+            - Output of pipeline.batch.get_checkpoint_file_path
+
+    Returns:
+        dict
+            - The same as the output of pipeline.batch.get_session_results
+    """
+    with open(checkpoint_file_path, "rb") as file:
+        return pickle.load(file)
+
+def get_session_results(medpc_df, before_tone_duration=2000, after_tone_duration=2000):
+    """
+    Gets the latencies and the port occupancy around the tones of one MED-PC file.
+    The occupancy is kept as the sum and the count over the tones for each increment,
+    so that the sessions can be added together into averages without keeping every tone.
+
+    Args:
+        medpc_df: Pandas DataFrame
+            - Output of extract.dataframe.get_medpc_dataframe_with_traceback
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+
+    Returns:
+        dict
+            - "file_path", "date", "subject" and "number_of_tones" of the session
+            - "latency_df": the output of processing.tone.get_concatted_port_entries_and_latencies_dataframe
+            - "inside_port_sums": the number of tones that the subject is in the port for each increment
+            - "valid_counts": the number of tones that each increment is valid for
+    """
+    latency_df = get_concatted_port_entries_and_latencies_dataframe(concatted_medpc_df=medpc_df, stop_with_error=True)
+    peri_tone_tensor, is_valid, session_df = get_cohort_peri_tone_inside_port_tensor(concatted_medpc_df=medpc_df, \
+        before_tone_duration=before_tone_duration, after_tone_duration=after_tone_duration, dtype=bool)
+    session_row = session_df.iloc[0]
+    return {"file_path": session_row["file_path"], "date": session_row["date"], "subject": session_row["subject"], \
+        "number_of_tones": int(session_row["number_of_tones"]), "latency_df": latency_df, \
+        "inside_port_sums": peri_tone_tensor[0].sum(axis=0, dtype=np.int64), "valid_counts": is_valid[0].sum(axis=0, dtype=np.int64)}
+
+def run_session_task(file_path, checkpoint_directory, msn_directory=None, cache_directory=None, before_tone_duration=2000, \
+        after_tone_duration=2000):
+    """
+    Runs the whole analysis for one MED-PC file and saves the results as a checkpoint.
+    Tasks that already have a checkpoint are skipped. Only the path of the checkpoint is returned,
+    so the results aren't sent back to the main process. This is what each worker process runs in pipeline.batch.run_batch.
+
+    Args:
+        file_path: str
+            - The path to the MED-PC data file
+        checkpoint_directory: str
+            - The directory to save the checkpoint files to
+        msn_directory: str
+            - The directory that has the MED-PC scripts(.MPC files) that are used to name the columns
+        cache_directory: str
+            - The directory to cache the parsed file in with extract.cache. None doesn't use a cache.
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+
+    Returns:
+        str or None, bool, str or None
+            - The path to the checkpoint file. None if there was an error.
+            - Whether or not the task was skipped because it already had a checkpoint
+            - The formatted traceback of the error. None if there was no error.
+    """
+    # The MSN directory changes which scripts name the columns, so it is part of the settings
+    task_settings = {"before_tone_duration": before_tone_duration, "after_tone_duration": after_tone_duration, \
+        "msn_directory": None if msn_directory is None else os.path.abspath(msn_directory)}
+    checkpoint_file_path = get_checkpoint_file_path(file_path=file_path, checkpoint_directory=checkpoint_directory, \
+        task_settings=task_settings)
+    if os.path.exists(checkpoint_file_path):
+        return checkpoint_file_path, True, None
+
+    medpc_df, error_traceback = get_medpc_dataframe_with_traceback(file_path=file_path, msn_directory=msn_directory, \
+        cache_directory=cache_directory, columns=ANALYSIS_COLUMNS)
+    if error_traceback is not None:
+        return None, False, error_traceback
+    try:
+        session_results = get_session_results(medpc_df=medpc_df, before_tone_duration=before_tone_duration, \
+            after_tone_duration=after_tone_duration)
+    except Exception:
+        return None, False, traceback.format_exc()
+    save_checkpoint(session_results=session_results, checkpoint_file_path=checkpoint_file_path)
+    return checkpoint_file_path, False, None
+
+def save_combined_results(checkpoint_file_paths, output_directory, bin_size=10, before_tone_duration=2000, group_by="subject"):
+    """
+    Combines the checkpoints of all the tasks into the output files of a run.
+    The checkpoints are loaded one at a time, and the rows of each session are added to the CSV files as they are loaded.
+    So only the averages of each group are kept in memory, no matter how many sessions there are.
+
+    Args:
+        checkpoint_file_paths: list
+            - The paths of the checkpoint files, in the order that the sessions should be in
+        output_directory: str
+            - The directory to save latencies.csv, peri_tone_occupancy.csv and peri_tone_occupancy_by_<group_by>.csv to
+        bin_size: int
+            - The number of increments in each bin of the occupancy files. 10 makes each bin 100ms.
+        before_tone_duration: int
+            - The number of increments before the tone. Used to label the bins with the seconds from the tone onset.
+        group_by: str
+            - The session value that the occupancy is averaged over, i.e. "subject" or "date"
+
+    Returns:
+        Pandas DataFrame
+            - The probability that the subject is in the port for each group and bin
+    """
+    latency_file_path = os.path.join(output_directory, "latencies.csv")
+    occupancy_file_path = os.path.join(output_directory, "peri_tone_occupancy.csv")
+    group_to_sums = {}
+    group_to_counts = {}
+    bin_columns = None
+    for session_number, checkpoint_file_path in enumerate(checkpoint_file_paths):
+        session_results = load_checkpoint(checkpoint_file_path=checkpoint_file_path)
+        # Writing the header with the first session, and adding to the end of the files for the rest
+        file_mode = "w" if session_number == 0 else "a"
+        session_results["latency_df"].to_csv(latency_file_path, mode=file_mode, header=(session_number == 0), index=False)
+
+        binned_sums = get_binned_sums(session_results["inside_port_sums"], bin_size=bin_size)
+        binned_counts = get_binned_sums(session_results["valid_counts"], bin_size=bin_size)
+        if bin_columns is None:
+            bin_seconds = get_bin_seconds(number_of_bins=len(binned_sums), bin_size=bin_size, before_tone_duration=before_tone_duration)
+            bin_columns = ["{:.2f}".format(seconds) for seconds in bin_seconds]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            session_occupancy = binned_sums / binned_counts
+        occupancy_df = pd.DataFrame([session_occupancy], columns=bin_columns)
+        occupancy_df.insert(0, "number_of_tones", session_results["number_of_tones"])
+        for column in ["subject", "date", "file_path"]:
+            occupancy_df.insert(0, column, session_results[column])
+        occupancy_df.to_csv(occupancy_file_path, mode=file_mode, header=(session_number == 0), index=False)
+
+        group = session_results[group_by]
+        group_to_sums[group] = group_to_sums.get(group, 0) + binned_sums
+        group_to_counts[group] = group_to_counts.get(group, 0) + binned_counts
+
+    groups = sorted(group_to_sums)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        group_occupancy = [group_to_sums[group] / group_to_counts[group] for group in groups]
+    group_occupancy_df = pd.DataFrame(group_occupancy, index=pd.Index(groups, name=group_by), columns=bin_columns)
+    group_occupancy_df.to_csv(os.path.join(output_directory, "peri_tone_occupancy_by_{}.csv".format(group_by)))
+    return group_occupancy_df
+
+def run_batch(medpc_files, output_directory, file_pattern="*.txt", msn_directory=None, cache_directory=None, before_tone_duration=2000, \
+        after_tone_duration=2000, bin_size=10, group_by="subject", number_of_workers=1, chunk_size=1):
+    """
+    Runs the whole analysis on every MED-PC file, and saves the latencies and the port occupancy around the tones.
+    Files that can't be read or analyzed are listed in errors.txt with their tracebacks, and the rest of the files are still run.
+    Running it again with the same output directory only runs the files that don't have a checkpoint yet.
+
+    Args:
+        medpc_files: str or list
+            - A directory with the MED-PC files, a glob pattern(i.e. "./data/*/*.txt") or a list of file paths
+        output_directory: str
+            - The directory to save the checkpoints and the results to. It is created if it doesn't exist.
+        file_pattern: str
+            - The glob pattern of the MED-PC files in the directory. Only used when medpc_files is a directory.
+        msn_directory: str
+            - The directory that has the MED-PC scripts(.MPC files) that are used to name the columns
+            - Defaults to the directory of each MED-PC file
+        cache_directory: str
+            - The directory to cache the parsed files in with extract.cache. None doesn't use a cache.
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+        bin_size: int
+            - The number of increments in each bin of the occupancy files
+        group_by: str
+            - The session value that the occupancy is averaged over, i.e. "subject" or "date"
+        number_of_workers: int or None
+            - The number of processes that run the tasks at the same time. None uses the number of CPUs on the computer.
+        chunk_size: int
+            - The number of files that are sent to a worker process at a time. Only used with more than one worker.
+
+    Returns:
+        dict
+            - "finished": the number of tasks that were run
+            - "skipped": the number of tasks that already had a checkpoint
+            - "failed": the paths of the files that could not be run
+    """
+    medpc_files = get_list_of_medpc_files(medpc_files=medpc_files, file_pattern=file_pattern)
+    checkpoint_directory = os.path.join(output_directory, CHECKPOINT_DIRECTORY_NAME)
+    os.makedirs(checkpoint_directory, exist_ok=True)
+    run_task = partial(run_session_task, checkpoint_directory=checkpoint_directory, msn_directory=msn_directory, \
+        cache_directory=cache_directory, before_tone_duration=before_tone_duration, after_tone_duration=after_tone_duration)
+
+    checkpoint_file_paths = []
+    failed_files = []
+    number_skipped = 0
+    with open(os.path.join(output_directory, "errors.txt"), "w") as error_file:
+        for file_path, (checkpoint_file_path, is_skipped, error_traceback) in zip(medpc_files, \
+                map_in_order(run_task, medpc_files, number_of_workers=number_of_workers, chunk_size=chunk_size)):
+            if error_traceback is None:
+                checkpoint_file_paths.append(checkpoint_file_path)
+                number_skipped += is_skipped
+            else:
+                print("Could not run file: {}".format(file_path))
+                error_file.write("{}\n{}\n".format(file_path, error_traceback))
+                failed_files.append(file_path)
+
+    if checkpoint_file_paths:
+        save_combined_results(checkpoint_file_paths=checkpoint_file_paths, output_directory=output_directory, bin_size=bin_size, \
+            before_tone_duration=before_tone_duration, group_by=group_by)
+    return {"finished": len(checkpoint_file_paths) - number_skipped, "skipped": number_skipped, "failed": failed_files}
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+    parser = argparse.ArgumentParser(description="Get the latencies and the port occupancy around the tones of a directory of MED-PC files")
+    parser.add_argument("medpc_directory", help="Directory with the MED-PC files")
+    parser.add_argument("output_directory", help="Directory to save the checkpoints and the results to")
+    parser.add_argument("--file_pattern", default="*.txt", help="Glob pattern of the MED-PC files")
+    parser.add_argument("--msn_directory", default=None, help="Directory with the .MPC scripts. Defaults to the directory of each file")
+    parser.add_argument("--cache_directory", default=None, help="Directory to cache the parsed files in")
+    parser.add_argument("--before_tone_duration", type=int, default=2000, help="Number of increments(10ms) before the tone")
+    parser.add_argument("--after_tone_duration", type=int, default=2000, help="Number of increments(10ms) after the tone")
+    parser.add_argument("--bin_size", type=int, default=10, help="Number of increments in each bin of the occupancy files")
+    parser.add_argument("--group_by", default="subject", help="Session value that the occupancy is averaged over")
+    parser.add_argument("--number_of_workers", type=int, default=1, help="Number of processes that run the tasks")
+    parser.add_argument("--chunk_size", type=int, default=1, help="Number of files sent to a worker process at a time")
+    args = parser.parse_args()
+    run_summary = run_batch(medpc_files=args.medpc_directory, output_directory=args.output_directory, file_pattern=args.file_pattern, \
+        msn_directory=args.msn_directory, cache_directory=args.cache_directory, before_tone_duration=args.before_tone_duration, \
+        after_tone_duration=args.after_tone_duration, bin_size=args.bin_size, group_by=args.group_by, \
+        number_of_workers=args.number_of_workers, chunk_size=args.chunk_size)
+    print("Finished: {}, Skipped: {}, Failed: {}".format(run_summary["finished"], run_summary["skipped"], len(run_summary["failed"])))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Functions for plotting the port occupancy around the tones and the latencies of a whole cohort.
+The increments around the tone(10ms each) are binned before plotting, i.e. 4000 increments become 400 bins of 100ms,
+so each figure only has as many points as can be seen.
+
+The figures are made with matplotlib's Figure and the Agg canvas instead of pyplot. So they are drawn without a display,
+aren't kept open by pyplot, and are freed as soon as they are saved. Many figures can be saved at once on worker processes.
+
+The report is made from the (session, increment) sums and counts over the tones of each session instead of the (session, tone, increment) arrays.
+So the memory grows with the number of sessions, and not with the number of tones of the whole cohort.
+
+Usage:
+    session_sums, session_counts, session_df = processing.port.get_cohort_peri_tone_session_sums_and_counts(concatted_medpc_df)
+    latency_df = processing.tone.get_concatted_port_entries_and_latencies_dataframe(concatted_medpc_df)
+    save_cohort_report(session_sums=session_sums, session_counts=session_counts, session_df=session_df, latency_df=latency_df, \
+        output_directory="./proc/plots/cohort_report", number_of_workers=4)
+The sums and counts can also come from processing.port.get_memory_mapped_peri_tone_session_sums_and_counts,
+or from stacking the "inside_port_sums" and "valid_counts" of each session of pipeline.batch.
+"""
+import os
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from extract.parallel import map_in_order
+from processing.port import get_bin_seconds, get_binned_averages, get_binned_sums
+
+# The latencies above this are shown as this many seconds, the same as latency_adjusted_greater_than_30 of notebook 02
+MAX_LATENCY = 30
+
+def get_session_peri_tone_occupancy(session_sums, session_counts, bin_size=10):
+    """
+    Gets the probability that the subject is in the port around the tones for each session, averaged over the tones of the session and binned.
+
+    Args:
+        session_sums: Numpy Array
+            - 2D array of the number of tones that the subject is in the port for, for each session and increment.
+            From processing.port.get_cohort_peri_tone_session_sums_and_counts
+        session_counts: Numpy Array
+            - 2D array of the number of tones that each increment is valid for, for each session and increment
+        bin_size: int
+            - The number of increments in each bin
+
+    Returns:
+        Numpy Array
+            - 2D array of the probability for each session and bin. NaN for bins without any valid increments.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return get_binned_sums(session_sums, bin_size=bin_size, axis=1) / get_binned_sums(session_counts, bin_size=bin_size, axis=1)
+
+def save_figure(figure, file_path, dpi=100):
+    """
+    Saves a figure that was made with matplotlib.figure.Figure with the Agg canvas, which doesn't need a display.
+
+    Args:
+        figure: matplotlib.figure.Figure
+            - The figure to save
+        file_path: str
+            - The path of the image. The extension decides the format(i.e. ".png" or ".pdf")
+        dpi: int
+            - The dots per inch of the image
+
+    Returns:
+        str
+            - The path of the image
+    """
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    FigureCanvasAgg(figure)
+    figure.savefig(file_path, dpi=dpi)
+    return file_path
+
+def plot_peri_tone_heatmap(session_occupancy, file_path, row_labels=None, bin_seconds=None, title="Probability Inside Port Around Tone", \
+        max_rows=1000, figure_size=(10, 8), dpi=100):
+    """
+    Plots the binned probability of being inside the port of each session as one row of a heatmap.
+    Cohorts with more sessions than max_rows have every few rows averaged together, because a figure can't show more rows than it has pixels.
+
+    Args:
+        session_occupancy: Numpy Array
+            - 2D array of the probability for each session and bin. From get_session_peri_tone_occupancy
+        file_path: str
+            - The path to save the figure to
+        row_labels: list
+            - The label of each session. i.e. "1.1 20220504". Only shown when there are 50 rows or less.
+        bin_seconds: Numpy Array
+            - The seconds from the start of the tone of each bin. From get_bin_seconds
+        title: str
+            - The title of the figure
+        max_rows: int
+            - The largest number of rows to draw
+        figure_size: tuple
+            - The width and height of the figure in inches
+        dpi: int
+            - The dots per inch of the image
+
+    Returns:
+        str
+            - The path of the image
+    """
+    rows_per_bin = int(np.ceil(len(session_occupancy) / max_rows)) if len(session_occupancy) > max_rows else 1
+    if rows_per_bin > 1:
+        session_occupancy = get_binned_averages(session_occupancy, bin_size=rows_per_bin, axis=0)
+        row_labels = None
+    if bin_seconds is None:
+        bin_seconds = np.arange(session_occupancy.shape[1])
+
+    figure = Figure(figsize=figure_size)
+    ax = figure.add_subplot()
+    image = ax.imshow(session_occupancy, aspect="auto", interpolation="nearest", cmap="viridis", vmin=0, vmax=1, \
+        extent=(bin_seconds[0], bin_seconds[-1] + (bin_seconds[-1] - bin_seconds[0]) / max(len(bin_seconds) - 1, 1), len(session_occupancy), 0))
+    ax.axvline(0, color="w", linestyle="--", linewidth=1)
+    if row_labels is not None and len(row_labels) <= 50:
+        ax.set_yticks(np.arange(len(row_labels)) + 0.5)
+        ax.set_yticklabels(row_labels, fontsize=6)
+    ax.set_xlabel("Seconds from the start of the tone")
+    ax.set_ylabel("Session" if rows_per_bin == 1 else "Session(average of every {} sessions)".format(rows_per_bin))
+    ax.set_title(title)
+    figure.colorbar(image, ax=ax, label="Probability Inside Port")
+    return save_figure(figure=figure, file_path=file_path, dpi=dpi)
+
+def plot_latency_raster(latency_matrix, file_path, row_labels=None, title="Latency of First Port Entry After Each Tone", \
+        max_latency=MAX_LATENCY, figure_size=(10, 8), dpi=100):
+    """
+    Plots the latency to the first port entry after each tone as a raster, with a row for each session and a column for each tone.
+
+    Args:
+        latency_matrix: Numpy Array
+            - 2D array of the latency of each session and tone number. From get_latency_matrix
+        file_path: str
+            - The path to save the figure to
+        row_labels: list
+            - The label of each session. Only shown when there are 50 rows or less.
+        title: str
+            - The title of the figure
+        max_latency: float
+            - The latencies above this are shown with the same color as this
+        figure_size: tuple
+            - The width and height of the figure in inches
+        dpi: int
+            - The dots per inch of the image
+
+    Returns:
+        str
+            - The path of the image
+    """
+    figure = Figure(figsize=figure_size)
+    ax = figure.add_subplot()
+    image = ax.imshow(np.minimum(latency_matrix, max_latency), aspect="auto", interpolation="nearest", cmap="magma_r", \
+        vmin=0, vmax=max_latency, extent=(0.5, latency_matrix.shape[1] + 0.5, len(latency_matrix), 0))
+    if row_labels is not None and len(row_labels) <= 50:
+        ax.set_yticks(np.arange(len(row_labels)) + 0.5)
+        ax.set_yticklabels(row_labels, fontsize=6)
+    ax.set_xlabel("Tone Number")
+    ax.set_ylabel("Session")
+    ax.set_title(title)
+    figure.colorbar(image, ax=ax, label="Latency(s), capped at {}".format(max_latency))
+    return save_figure(figure=figure, file_path=file_path, dpi=dpi)
+
+def plot_average_curves(curves, file_path, bin_seconds=None, labels=None, title="Probability Inside Port Before/After Tone", \
+        figure_size=(10, 6), dpi=100):
+    """
+    Plots a line for each binned average probability curve. i.e. One line for each date of a subject, like notebook 03.
+
+    Args:
+        curves: Numpy Array
+            - 2D array with a row for each line and a column for each bin
+        file_path: str
+            - The path to save the figure to
+        bin_seconds: Numpy Array
+            - The seconds from the start of the tone of each bin. From get_bin_seconds
+        labels: list
+            - The label of each line for the legend
+        title: str
+            - The title of the figure
+        figure_size: tuple
+            - The width and height of the figure in inches
+        dpi: int
+            - The dots per inch of the image
+
+    Returns:
+        str
+            - The path of the image
+    """
+    if bin_seconds is None:
+        bin_seconds = np.arange(curves.shape[1])
+    figure = Figure(figsize=figure_size)
+    ax = figure.add_subplot()
+    for curve_index, curve in enumerate(curves):
+        ax.plot(bin_seconds, curve, label=None if labels is None else labels[curve_index])
+    ax.set_ylim(0, 1)
+    ax.set_xlabel("Seconds from the start of the tone")
+    ax.set_ylabel("Probability Inside Port")
+    ax.set_title(title)
+    if labels is not None:
+        ax.legend(fontsize=8)
+    return save_figure(figure=figure, file_path=file_path, dpi=dpi)
+
+def get_latency_matrix(latency_df, session_df, file_path_column="file_path"):
+    """
+    Gets the latency of every tone as a (session, tone number) array, in the order of the sessions of session_df.
+
+    Args:
+        latency_df: Pandas DataFrame
+            - Output of processing.tone.get_concatted_port_entries_and_latencies_dataframe, with the tones of each session in order
+        session_df: Pandas DataFrame
+            - A row for each session, with the file path of the session
+        file_path_column: str
+            - Name of the column that has the path of the file of each session
+
+    Returns:
+        Numpy Array
+            - The latency of each session and tone. NaN for sessions with fewer tones.
+    """
+    session_indexes = pd.Index(session_df[file_path_column]).get_indexer(latency_df[file_path_column])
+    is_session = session_indexes >= 0
+    session_indexes = session_indexes[is_session]
+    tone_numbers = latency_df[is_session].groupby(file_path_column, sort=False).cumcount().to_numpy()
+    latency_matrix = np.full((len(session_df), tone_numbers.max(initial=-1) + 1), np.nan)
+    latency_matrix[session_indexes, tone_numbers] = latency_df["latency"].to_numpy(dtype=np.float64)[is_session]
+    return latency_matrix
+
+def render_figure(figure_job):
+    """
+    Makes one figure from a plotting function and its keyword arguments, so that the figures can be mapped on a pool.
+
+    Args:
+        figure_job: tuple
+            - The name of a plotting function of this module(i.e. "plot_peri_tone_heatmap"), and the keyword arguments for it
+
+    Returns:
+        str
+            - The path of the image
+    """
+    function_name, kwargs = figure_job
+    return globals()[function_name](**kwargs)
+
+def render_figures(figure_jobs, number_of_workers=1):
+    """
+    Makes many figures, either in this process or on a pool of worker processes.
+    Each figure is freed after it is saved, so the memory doesn't grow with the number of figures.
+
+    Args:
+        figure_jobs: list
+            - The name of the plotting function and the keyword arguments of each figure
+        number_of_workers: int or None
+            - The number of figures that are made at the same time. None uses the number of CPUs on the computer.
+
+    Returns:
+        list
+            - The path of the image of each figure
+    """
+    return list(map_in_order(render_figure, figure_jobs, number_of_workers=number_of_workers))
+
+def save_cohort_report(session_sums, session_counts, session_df, output_directory, latency_df=None, bin_size=10, before_tone_duration=2000, \
+        group_by="subject", file_path_column="file_path", number_of_workers=1, dpi=100):
+    """
+    Saves the figures of a whole cohort:
+    - A heatmap of the binned port occupancy around the tone of every session, sorted by subject and date
+    - A raster of the latency of every tone of every session
+    - A figure for each subject(or other group), with the average occupancy curve of each date
+
+    Args:
+        session_sums: Numpy Array
+            - 2D array of the number of tones that the subject is in the port for, for each session and increment.
+            From processing.port.get_cohort_peri_tone_session_sums_and_counts
+        session_counts: Numpy Array
+            - 2D array of the number of tones that each increment is valid for, for each session and increment
+        session_df: Pandas DataFrame
+            - A row for each session of session_sums, in the same order, with the file path, date and subject
+        output_directory: str
+            - The directory to save the figures to
+        latency_df: Pandas DataFrame
+            - Output of processing.tone.get_concatted_port_entries_and_latencies_dataframe. None skips the latency raster.
+        bin_size: int
+            - The number of increments in each bin
+        before_tone_duration: int
+            - The number of increments before the tone in session_sums
+        group_by: str
+            - The column of session_df to make a figure of the average curves for
+        file_path_column: str
+            - Name of the column that has the path of the file of each session
+        number_of_workers: int or None
+            - The number of figures that are made at the same time
+        dpi: int
+            - The dots per inch of the images
+
+    Returns:
+        list
+            - The paths of all the images
+    """
+    session_df = session_df.reset_index(drop=True)
+    session_occupancy = get_session_peri_tone_occupancy(session_sums=session_sums, session_counts=session_counts, bin_size=bin_size)
+    bin_seconds = get_bin_seconds(number_of_bins=session_occupancy.shape[1], bin_size=bin_size, before_tone_duration=before_tone_duration)
+    sort_columns = [column for column in [group_by, "date"] if column in session_df.columns]
+    session_order = session_df.sort_values(sort_columns, kind="stable").index.to_numpy() if sort_columns else np.arange(len(session_df))
+    row_labels = session_df[sort_columns].astype(str).agg(" ".join, axis=1).to_numpy()[session_order] if sort_columns else None
+
+    figure_jobs = [("plot_peri_tone_heatmap", {"session_occupancy": session_occupancy[session_order], "row_labels": row_labels, \
+        "bin_seconds": bin_seconds, "file_path": os.path.join(output_directory, "peri_tone_occupancy_heatmap.png"), "dpi": dpi})]
+    if latency_df is not None:
+        latency_matrix = get_latency_matrix(latency_df=latency_df, session_df=session_df, file_path_column=file_path_column)
+        figure_jobs.append(("plot_latency_raster", {"latency_matrix": latency_matrix[session_order], "row_labels": row_labels, \
+            "file_path": os.path.join(output_directory, "latency_raster.png"), "dpi": dpi}))
+    if group_by in session_df.columns:
+        for group, group_df in session_df.groupby(group_by, sort=True):
+            group_df = group_df.sort_values("date", kind="stable") if "date" in group_df.columns else group_df
+            figure_jobs.append(("plot_average_curves", {"curves": session_occupancy[group_df.index.to_numpy()], \
+                "bin_seconds": bin_seconds, "labels": list(group_df["date"].astype(str)) if "date" in group_df.columns else None, \
+                "title": "Probability Inside Port Before/After Tone for {}: {}".format(group_by.capitalize(), group), \
+                "file_path": os.path.join(output_directory, group_by, "probability_inside_port_{}_{}.png".format(group_by, group)), \
+                "dpi": dpi}))
+    return render_figures(figure_jobs=figure_jobs, number_of_workers=number_of_workers)
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Functions for the confidence intervals and the significance of the port occupancy around the tones and the latencies.
+The tones are nested in sessions, and the sessions are nested in subjects. So the tones of one subject aren't independent,
+and resampling the tones alone gives confidence intervals that are too narrow.
+The hierarchical bootstrap resamples the subjects, then the sessions of each picked subject, then the tones of each picked session.
+The permutation test shuffles the conditions between whole subjects(or sessions), instead of between tones.
+
+The resampling isn't done with a loop over the resamples. Each resample is turned into the number of times that each tone was picked,
+so the means of a whole chunk of resamples are one matrix multiplication of the (resample, tone) counts with the (tone, increment) values.
+The chunks are kept under a maximum number of elements, and can be run on worker processes.
+Every chunk gets its own seed from numpy.random.SeedSequence, so the same seed gives the same results with any number of workers.
+
+Usage:
+    peri_tone_tensor, is_valid, session_df = processing.port.get_cohort_peri_tone_inside_port_tensor(concatted_medpc_df)
+    confidence_interval_df = get_peri_tone_confidence_intervals(peri_tone_tensor, is_valid, session_df, seed=42)
+    latency_df = processing.tone.get_concatted_port_entries_and_latencies_dataframe(concatted_medpc_df)
+    latency_confidence_interval = get_latency_confidence_intervals(latency_df, seed=42)
+"""
+import warnings
+from functools import partial
+import numpy as np
+import pandas as pd
+from extract.parallel import map_in_order
+
+# The maximum number of elements of the arrays that are made for each chunk of resamples. 2**24 float64s is 128MB.
+DEFAULT_MAX_ELEMENTS_PER_CHUNK = 2 ** 24
+# Permutation differences that are within this many machine epsilons(times the largest value) of the observed difference are counted as ties.
+# The means are added up in a different order for each permutation, so equal differences can be off by a few rounding errors.
+PERMUTATION_TIE_EPSILONS = 1000
+
+def get_resampling_hierarchy(group_labels):
+    """
+    Gets the nesting of the values in the groups, i.e. which tones are in each session and which sessions are in each subject.
+    The values are sorted so that the units of every level are next to each other. The children of each unit at a level
+    are then the units from start to start + count at the next level. The last level is the values themselves.
+
+    Args:
+        group_labels: list
+            - The label of each value for each level, from the top level down. i.e. [subjects, file_paths] for the tones
+            - Labels only need to be unique within the level above, but can be unique across all of them too
+
+    Returns:
+        Numpy Array, list, list
+            - The order that sorts the values into the hierarchy
+            - The start of the children of each unit, for each level from the top. The first level has a single unit for all the values.
+            - The number of children of each unit, for each level from the top
+    """
+    label_codes = [pd.factorize(np.asarray(labels), sort=True)[0] for labels in group_labels]
+    number_of_values = len(label_codes[0])
+    # np.lexsort sorts by the last key first
+    order = np.lexsort(label_codes[::-1])
+    # Whether or not each sorted value starts a new unit of the level above. All the values are one unit at the top.
+    is_parent_start = np.zeros(number_of_values, dtype=bool)
+    is_parent_start[0] = True
+    level_starts = []
+    level_counts = []
+    for codes in [codes[order] for codes in label_codes] + [None]:
+        # Every value is its own unit at the last level
+        if codes is None:
+            is_start = np.ones(number_of_values, dtype=bool)
+        else:
+            is_start = is_parent_start.copy()
+            is_start[1:] |= codes[1:] != codes[:-1]
+        parent_of_each_unit = np.cumsum(is_parent_start)[is_start] - 1
+        counts = np.bincount(parent_of_each_unit)
+        level_starts.append(np.cumsum(counts) - counts)
+        level_counts.append(counts)
+        is_parent_start = is_start
+    return order, level_starts, level_counts
+
+def get_padded_resample_size(level_counts):
+    """
+    Gets the number of picks that are made for each resample by get_hierarchical_resample_counts.
+    Every unit is padded to the largest number of children at its level, so that all the picks of a level are one array.
+
+    Args:
+        level_counts: list
+            - Output of get_resampling_hierarchy
+
+    Returns:
+        int
+            - The number of picks at the last level, including the padding
+    """
+    return int(np.prod([counts.max() for counts in level_counts], dtype=np.int64))
+
+def get_hierarchical_resample_counts(level_starts, level_counts, number_of_resamples, random_generator):
+    """
+    Gets the number of times that each value is picked for a batch of hierarchical bootstrap resamples.
+    At each level, every picked unit picks as many of its children as it has, with replacement.
+    i.e. 16 subjects are picked out of 16, then each picked subject picks its number of sessions out of its sessions.
+    A unit that is picked twice picks its children twice, independently.
+
+    Args:
+        level_starts: list
+            - Output of get_resampling_hierarchy
+        level_counts: list
+            - Output of get_resampling_hierarchy
+        number_of_resamples: int
+            - The number of resamples to make
+        random_generator: numpy.random.Generator
+            - The generator for all the random picks
+
+    Returns:
+        Numpy Array
+            - 2D array of the number of times each sorted value is picked, for each resample and value
+    """
+    picked_units = np.zeros((number_of_resamples, 1), dtype=np.int64)
+    is_picked = np.ones((number_of_resamples, 1), dtype=bool)
+    for starts, counts in zip(level_starts, level_counts):
+        # The padding slots don't pick any children
+        number_of_children = np.where(is_picked, counts[picked_units], 0)
+        max_number_of_children = counts.max()
+        child_positions = (random_generator.random((number_of_resamples, picked_units.shape[1], max_number_of_children)) \
+            * number_of_children[..., np.newaxis]).astype(np.int64)
+        is_picked = (np.arange(max_number_of_children) < number_of_children[..., np.newaxis]).reshape(number_of_resamples, -1)
+        picked_units = (starts[picked_units][..., np.newaxis] + child_positions).reshape(number_of_resamples, -1)
+
+    number_of_values = level_counts[-1].sum()
+    # Counting the picks of all the resamples at once by giving each resample its own range of values
+    picked_values = (picked_units + np.arange(number_of_resamples)[:, np.newaxis] * number_of_values)[is_picked]
+    return np.bincount(picked_values, minlength=number_of_resamples * number_of_values).reshape(number_of_resamples, number_of_values)
+
+def get_filled_values(values, dtype=np.float64):
+    """
+    Splits values with NaNs into the values with the NaNs as 0 and whether or not each value is valid.
+    So that the sums and the counts of the valid values can both be made with matrix multiplication.
+
+    Args:
+        values: Numpy Array
+            - 1D array of a value for each tone(i.e. the latencies), or 2D array of the values of each tone(i.e. the increments around the tone)
+        dtype: Numpy dtype
+            - The dtype of the outputs. np.float32 uses half the memory, and is exact for the 0 or 1 values of the port occupancy.
+
+    Returns:
+        Numpy Array, Numpy Array
+            - 2D array of the values, with 0 for the NaNs
+            - 2D array of 1 for the valid values, and 0 for the NaNs
+    """
+    values = np.asarray(values, dtype=dtype)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    is_valid = ~np.isnan(values)
+    return np.where(is_valid, values, 0).astype(dtype), is_valid.astype(dtype)
+
+def get_means_from_sums_and_counts(sums, counts):
+    """
+    Divides the sums by the counts, with NaN where there aren't any values.
+
+    Args:
+        sums: Numpy Array
+            - The sums of the valid values
+        counts: Numpy Array
+            - The number of valid values in each sum
+
+    Returns:
+        Numpy Array
+            - The means. NaN where the count is 0.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+def get_chunk_bootstrap_means(chunk, level_starts, level_counts, filled_values, valid_values):
+    """
+    Gets the means of the values for one chunk of hierarchical bootstrap resamples.
+    This is what each worker process runs in get_bootstrap_means_from_filled_values.
+
+    Args:
+        chunk: tuple
+            - The numpy.random.SeedSequence of the chunk, and the number of resamples in the chunk
+        level_starts: list
+            - Output of get_resampling_hierarchy
+        level_counts: list
+            - Output of get_resampling_hierarchy
+        filled_values: Numpy Array
+            - 2D array of the values with 0 for the NaNs, sorted by the order of get_resampling_hierarchy
+        valid_values: Numpy Array
+            - 2D array of whether or not each value is valid, in the same order
+
+    Returns:
+        Numpy Array
+            - 2D array of the mean for each resample and column of the values
+    """
+    seed_sequence, number_of_resamples = chunk
+    resample_counts = get_hierarchical_resample_counts(level_starts=level_starts, level_counts=level_counts, \
+        number_of_resamples=number_of_resamples, random_generator=np.random.default_rng(seed_sequence)).astype(filled_values.dtype)
+    return get_means_from_sums_and_counts(sums=resample_counts @ filled_values, counts=resample_counts @ valid_values)
+
+def get_chunks(number_of_items, items_per_chunk, seed=None):
+    """
+    Splits the resamples or the permutations into chunks, and gives each chunk its own seed.
+
+    Args:
+        number_of_items: int
+            - The total number of resamples or permutations
+        items_per_chunk: int
+            - The largest number of items in a chunk
+        seed: int or None
+            - The seed of numpy.random.SeedSequence. None uses a different seed every time.
+
+    Returns:
+        list
+            - A tuple of the numpy.random.SeedSequence and the number of items for each chunk
+    """
+    chunk_sizes = [min(items_per_chunk, number_of_items - chunk_start) for chunk_start in range(0, number_of_items, items_per_chunk)]
+    return list(zip(np.random.SeedSequence(seed).spawn(len(chunk_sizes)), chunk_sizes))
+
+def get_bootstrap_means_from_filled_values(filled_values, valid_values, group_labels, number_of_resamples=1000, \
+        max_elements_per_chunk=DEFAULT_MAX_ELEMENTS_PER_CHUNK, number_of_workers=1, seed=None):
+    """
+    Gets the means of the values for every hierarchical bootstrap resample, from the output of get_filled_values.
+    The number of resamples in each chunk is picked so that no array of the chunk has more than max_elements_per_chunk elements.
+
+    Args:
+        filled_values: Numpy Array
+            - 2D array of the values with 0 for the NaNs. From get_filled_values.
+        valid_values: Numpy Array
+            - 2D array of whether or not each value is valid. From get_filled_values.
+        group_labels: list
+            - The label of each row for each level, from the top level down. i.e. [subjects, file_paths] for the tones
+        number_of_resamples: int
+            - The number of bootstrap resamples
+        max_elements_per_chunk: int
+            - The maximum number of elements of the arrays that are made for each chunk of resamples
+        number_of_workers: int or None
+            - The number of processes that run the chunks at the same time. None uses the number of CPUs on the computer.
+        seed: int or None
+            - The seed of the resampling. The same seed and max_elements_per_chunk give the same results with any number of workers.
+
+    Returns:
+        Numpy Array
+            - 2D array of the mean for each resample and column of the values
+    """
+    order, level_starts, level_counts = get_resampling_hierarchy(group_labels=group_labels)
+    largest_resample_size = max(get_padded_resample_size(level_counts=level_counts), filled_values.shape[0], filled_values.shape[1])
+    chunks = get_chunks(number_of_items=number_of_resamples, items_per_chunk=max(1, max_elements_per_chunk // largest_resample_size), \
+        seed=seed)
+    get_means_of_chunk = partial(get_chunk_bootstrap_means, level_starts=level_starts, level_counts=level_counts, \
+        filled_values=filled_values[order], valid_values=valid_values[order])
+    return np.concatenate(list(map_in_order(get_means_of_chunk, chunks, number_of_workers=number_of_workers)))
+
+def get_percentile_intervals(resample_means, confidence_level=0.95):
+    """
+    Gets the percentile confidence interval of each column from the bootstrap means.
+
+    Args:
+        resample_means: Numpy Array
+            - 2D array of the mean for each resample and column
+        confidence_level: float
+            - The fraction of the resample means that are inside the interval. i.e. 0.95 for a 95% confidence interval.
+
+    Returns:
+        Numpy Array, Numpy Array
+            - The lower bound of each column. NaN for columns without any valid values.
+            - The upper bound of each column
+    """
+    tail_percentage = (1 - confidence_level) / 2 * 100
+    # Columns that don't have any valid values are NaN for every resample
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        lower_bounds, upper_bounds = np.nanpercentile(resample_means, [tail_percentage, 100 - tail_percentage], axis=0)
+    return lower_bounds, upper_bounds
+
+def get_hierarchical_bootstrap_confidence_intervals(values, group_labels, confidence_level=0.95, number_of_resamples=1000, \
+        max_elements_per_chunk=DEFAULT_MAX_ELEMENTS_PER_CHUNK, number_of_workers=1, seed=None, dtype=np.float64):
+    """
+    Gets the mean and the hierarchical bootstrap confidence interval of values that are nested in groups.
+    The mean is of all the valid values together, the same as averaging all the tones of a cohort.
+
+    Args:
+        values: Numpy Array
+            - 1D array of a value for each tone(i.e. the latencies), or 2D array of the values of each tone(i.e. the increments around the tone)
+            - NaNs are left out
+        group_labels: list
+            - The label of each tone for each level, from the top level down. i.e. [subjects, file_paths]
+        confidence_level: float
+            - The fraction of the resample means that are inside the interval. i.e. 0.95 for a 95% confidence interval.
+        number_of_resamples: int
+            - The number of bootstrap resamples
+        max_elements_per_chunk: int
+            - The maximum number of elements of the arrays that are made for each chunk of resamples
+        number_of_workers: int or None
+            - The number of processes that run the chunks at the same time
+        seed: int or None
+            - The seed of the resampling
+        dtype: Numpy dtype
+            - The dtype that the means are calculated with. np.float32 uses half the memory.
+
+    Returns:
+        Numpy Array, Numpy Array, Numpy Array
+            - The mean of each column. Single values instead of arrays if values is 1D.
+            - The lower bound of each column
+            - The upper bound of each column
+    """
+    filled_values, valid_values = get_filled_values(values=values, dtype=dtype)
+    resample_means = get_bootstrap_means_from_filled_values(filled_values=filled_values, valid_values=valid_values, \
+        group_labels=group_labels, number_of_resamples=number_of_resamples, max_elements_per_chunk=max_elements_per_chunk, \
+        number_of_workers=number_of_workers, seed=seed)
+    means = get_means_from_sums_and_counts(sums=filled_values.sum(axis=0, dtype=np.float64), counts=valid_values.sum(axis=0, dtype=np.float64))
+    lower_bounds, upper_bounds = get_percentile_intervals(resample_means=resample_means, confidence_level=confidence_level)
+    if np.ndim(values) == 1:
+        return means[0], lower_bounds[0], upper_bounds[0]
+    return means, lower_bounds, upper_bounds
+
+def get_peri_tone_confidence_intervals(peri_tone_tensor, is_valid, session_df, subject_column="subject", session_column="file_path", \
+        confidence_level=0.95, number_of_resamples=1000, before_tone_duration=2000, max_elements_per_chunk=DEFAULT_MAX_ELEMENTS_PER_CHUNK, \
+        number_of_workers=1, seed=None):
+    """
+    Gets the probability that the subjects are in the port at each increment around the tone, with hierarchical bootstrap confidence intervals.
+    The tones are resampled within the sessions, and the sessions within the subjects.
+    The means are calculated with float32, which is exact for the counts of the tones that the subject is in the port for.
+
+    Args:
+        peri_tone_tensor: Numpy Array
+            - 3D array of whether or not the subject is in the port for each session, tone and increment.
+            From processing.port.get_cohort_peri_tone_inside_port_tensor
+        is_valid: Numpy Array
+            - 3D boolean array of whether or not each session, tone and increment is valid
+        session_df: Pandas DataFrame
+            - A row for each session of peri_tone_tensor, in the same order
+        subject_column: str
+            - Name of the column of session_df that has the subject's ID
+        session_column: str
+            - Name of the column of session_df that is different for every session
+        confidence_level: float
+            - The fraction of the resample means that are inside the interval. i.e. 0.95 for a 95% confidence interval.
+        number_of_resamples: int
+            - The number of bootstrap resamples
+        before_tone_duration: int
+            - The number of increments before the tone in peri_tone_tensor. Used to label the increments.
+        max_elements_per_chunk: int
+            - The maximum number of elements of the arrays that are made for each chunk of resamples
+        number_of_workers: int or None
+            - The number of processes that run the chunks at the same time
+        seed: int or None
+            - The seed of the resampling
+
+    Returns:
+        Pandas DataFrame
+            - A row for each increment from the start of the tone, with the "mean", "lower" and "upper" columns
+    """
+    # Leaving out the padded tones of the sessions with fewer tones
+    session_indexes, tone_indexes = np.nonzero(is_valid.any(axis=2))
+    filled_values = np.where(is_valid[session_indexes, tone_indexes], peri_tone_tensor[session_indexes, tone_indexes], 0).astype(np.float32)
+    valid_values = is_valid[session_indexes, tone_indexes].astype(np.float32)
+    group_labels = [session_df[subject_column].to_numpy()[session_indexes], session_df[session_column].to_numpy()[session_indexes]]
+    resample_means = get_bootstrap_means_from_filled_values(filled_values=filled_values, valid_values=valid_values, \
+        group_labels=group_labels, number_of_resamples=number_of_resamples, max_elements_per_chunk=max_elements_per_chunk, \
+        number_of_workers=number_of_workers, seed=seed)
+    lower_bounds, upper_bounds = get_percentile_intervals(resample_means=resample_means, confidence_level=confidence_level)
+    means = get_means_from_sums_and_counts(sums=filled_values.sum(axis=0, dtype=np.float64), counts=valid_values.sum(axis=0, dtype=np.float64))
+    increments = pd.Index(np.arange(peri_tone_tensor.shape[2]) - before_tone_duration, name="increment")
+    return pd.DataFrame({"mean": means, "lower": lower_bounds, "upper": upper_bounds}, index=increments)
+
+def get_latency_confidence_intervals(latency_df, latency_column="latency", group_columns=("subject", "file_path"), confidence_level=0.95, \
+        number_of_resamples=10000, max_elements_per_chunk=DEFAULT_MAX_ELEMENTS_PER_CHUNK, number_of_workers=1, seed=None):
+    """
+    Gets the mean latency of all the tones, with a hierarchical bootstrap confidence interval.
+    The tones without a port entry after them(NaN latencies) are left out.
+
+    Args:
+        latency_df: Pandas DataFrame
+            - Output of processing.tone.get_concatted_port_entries_and_latencies_dataframe
+        latency_column: str
+            - Name of the column of latency_df to get the confidence interval of. i.e. "latency" or "latency_adjusted_greater_than_30"
+        group_columns: tuple
+            - The columns of latency_df that the tones are nested in, from the top level down
+        confidence_level: float
+            - The fraction of the resample means that are inside the interval. i.e. 0.95 for a 95% confidence interval.
+        number_of_resamples: int
+            - The number of bootstrap resamples
+        max_elements_per_chunk: int
+            - The maximum number of elements of the arrays that are made for each chunk of resamples
+        number_of_workers: int or None
+            - The number of processes that run the chunks at the same time
+        seed: int or None
+            - The seed of the resampling
+
+    Returns:
+        Pandas Series
+            - The "mean", "lower" and "upper" latency
+    """
+    mean, lower_bound, upper_bound = get_hierarchical_bootstrap_confidence_intervals(values=latency_df[latency_column].to_numpy(), \
+        group_labels=[latency_df[column].to_numpy() for column in group_columns], confidence_level=confidence_level, \
+        number_of_resamples=number_of_resamples, max_elements_per_chunk=max_elements_per_chunk, number_of_workers=number_of_workers, \
+        seed=seed)
+    return pd.Series({"mean": mean, "lower": lower_bound, "upper": upper_bound}, name=latency_column)
+
+def get_chunk_permutation_differences(chunk, unit_sums, unit_counts, number_of_first_units):
+    """
+    Gets the difference between the means of the two conditions for one chunk of permutations.
+    This is what each worker process runs in get_hierarchical_permutation_test.
+
+    Args:
+        chunk: tuple
+            - The numpy.random.SeedSequence of the chunk, and the number of permutations in the chunk
+        unit_sums: Numpy Array
+            - 2D array of the sum of the valid values of each unit that is shuffled, for each column
+        unit_counts: Numpy Array
+            - 2D array of the number of valid values of each unit, for each column
+        number_of_first_units: int
+            - The number of units that have the first condition
+
+    Returns:
+        Numpy Array
+            - 2D array of the mean of the first condition minus the mean of the second condition, for each permutation and column
+    """
+    seed_sequence, number_of_permutations = chunk
+    random_generator = np.random.default_rng(seed_sequence)
+    # Giving the first condition to a random set of units for each permutation
+    shuffled_units = random_generator.random((number_of_permutations, len(unit_sums))).argsort(axis=1)
+    is_first = np.zeros((number_of_permutations, len(unit_sums)), dtype=unit_sums.dtype)
+    np.put_along_axis(is_first, shuffled_units[:, :number_of_first_units], 1, axis=1)
+    first_sums = is_first @ unit_sums
+    first_counts = is_first @ unit_counts
+    return get_means_from_sums_and_counts(sums=first_sums, counts=first_counts) \
+        - get_means_from_sums_and_counts(sums=unit_sums.sum(axis=0) - first_sums, counts=unit_counts.sum(axis=0) - first_counts)
+
+def get_hierarchical_permutation_test(values, group_labels, condition_labels, permutation_level=0, number_of_permutations=10000, \
+        max_elements_per_chunk=DEFAULT_MAX_ELEMENTS_PER_CHUNK, number_of_workers=1, seed=None, dtype=np.float64):
+    """
+    Tests whether the mean of the values is different between two conditions, by shuffling the conditions between whole units.
+    i.e. with permutation_level=0 and group_labels=[subjects, file_paths], the subjects swap conditions but keep all of their tones.
+    So every unit must only have one condition. The p-value is two-sided.
+
+    Args:
+        values: Numpy Array
+            - 1D array of a value for each tone(i.e. the latencies), or 2D array of the values of each tone(i.e. the increments around the tone)
+            - NaNs are left out
+        group_labels: list
+            - The label of each tone for each level, from the top level down. i.e. [subjects, file_paths]
+        condition_labels: Numpy Array
+            - The condition of each tone. Must have exactly two different conditions. i.e. the group of the subject
+        permutation_level: int
+            - The level of group_labels that the conditions are shuffled between. 0 shuffles the units of the top level.
+        number_of_permutations: int
+            - The number of random permutations
+            - Differences that are the same as the observed difference up to rounding errors count as being as extreme
+        max_elements_per_chunk: int
+            - The maximum number of elements of the arrays that are made for each chunk of permutations
+        number_of_workers: int or None
+            - The number of processes that run the chunks at the same time
+        seed: int or None
+            - The seed of the permutations. The same seed and max_elements_per_chunk give the same results with any number of workers.
+        dtype: Numpy dtype
+            - The dtype that the means are calculated with
+
+    Returns:
+        Numpy Array, Numpy Array
+            - The mean of the first condition(in sorted order) minus the mean of the second condition, for each column.
+            Single values instead of arrays if values is 1D.
+            - The p-value of each column. NaN for columns without any valid values in one of the conditions.
+    """
+    order, _, level_counts = get_resampling_hierarchy(group_labels=group_labels[:permutation_level + 1])
+    filled_values, valid_values = get_filled_values(values=values, dtype=dtype)
+    # The units of the permutation level are the children of the units of the level above it
+    unit_starts = np.concatenate([[0], np.cumsum(level_counts[-1])[:-1]])
+    unit_sums = np.add.reduceat(filled_values[order], unit_starts, axis=0)
+    unit_counts = np.add.reduceat(valid_values[order], unit_starts, axis=0)
+
+    condition_codes, conditions = pd.factorize(np.asarray(condition_labels)[order], sort=True)
+    if len(conditions) != 2:
+        raise ValueError("Need exactly two conditions, but got {}".format(list(conditions)))
+    unit_conditions = condition_codes[unit_starts]
+    if (np.repeat(unit_conditions, level_counts[-1]) != condition_codes).any():
+        raise ValueError("Every unit of level {} must only have one condition".format(permutation_level))
+
+    is_first = (unit_conditions == 0).astype(dtype)
+    first_sums = is_first @ unit_sums
+    first_counts = is_first @ unit_counts
+    differences = get_means_from_sums_and_counts(sums=first_sums, counts=first_counts) \
+        - get_means_from_sums_and_counts(sums=unit_sums.sum(axis=0) - first_sums, counts=unit_counts.sum(axis=0) - first_counts)
+
+    chunks = get_chunks(number_of_items=number_of_permutations, \
+        items_per_chunk=max(1, max_elements_per_chunk // max(len(unit_sums), unit_sums.shape[1])), seed=seed)
+    get_differences_of_chunk = partial(get_chunk_permutation_differences, unit_sums=unit_sums, unit_counts=unit_counts, \
+        number_of_first_units=int(is_first.sum()))
+    number_as_extreme = np.zeros(unit_sums.shape[1], dtype=np.int64)
+    # Lowering the observed difference by the rounding errors, so that the permutations that tie with it are counted
+    tie_tolerance = PERMUTATION_TIE_EPSILONS * np.finfo(dtype).eps * np.maximum(np.abs(filled_values).max(axis=0, initial=0), 1)
+    smallest_as_extreme = np.abs(differences) - tie_tolerance
+    for permutation_differences in map_in_order(get_differences_of_chunk, chunks, number_of_workers=number_of_workers):
+        # NaN differences are never as extreme as the observed difference
+        with np.errstate(invalid="ignore"):
+            number_as_extreme += (np.abs(permutation_differences) >= smallest_as_extreme).sum(axis=0)
+    p_values = np.where(np.isnan(differences), np.nan, (number_as_extreme + 1) / (number_of_permutations + 1))
+    if np.ndim(values) == 1:
+        return differences[0], p_values[0]
+    return differences, p_values
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+
+if __name__ == '__main__':
+    main()
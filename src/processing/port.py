@@ -6,6 +6,15 @@ For more information on the MED-PC's programming language, Trans:
 - https://www.med-associates.com/wp-content/uploads/2017/01/DOC-003-R3.4-SOF-735-MED-PC-IV-PROGRAMMER%E2%80%99S-MANUAL.pdf
 """
 import numpy as np
+import pandas as pd
+from extract.events import DEFAULT_TICKS_PER_SECOND, get_session_event_times
+from extract.memory_map import append_session_arrays, get_memory_mapped_session_times, get_session_slice, load_memory_map_index, \
+    load_memory_mapped_arrays, remove_memory_mapped_array, save_memory_map_index
+from processing.tone import get_file_path_partitions, get_valid_tone_offsets
+from profiling.stages import profile_stage
+
+# The number of increments per second of the peri-tone arrays, i.e. 100 for the increments of 10ms
+DEFAULT_INCREMENTS_PER_SECOND = 100
 
 def scale_time_to_whole_number(time, multiplier=100):
     """
@@ -27,6 +36,49 @@ def scale_time_to_whole_number(time, multiplier=100):
     except:
         return 0
 
+# The ways that the scaled times can be turned into whole numbers
+ROUNDING_FUNCTIONS = {"round": np.rint, "truncate": np.trunc, "floor": np.floor, "ceil": np.ceil}
+
+def scale_times_to_whole_numbers(times, multiplier=100, rounding="round", nan_value=0, dtype=np.int64):
+    """
+    Converts whole columns of times that are floats into whole numbers by scaling them, in one NumPy operation.
+    This is the vectorized version of scale_time_to_whole_number, without a function call for every row.
+    Floats like 71.36 are stored as 71.3599..., so truncating like int() does turns them into 7135. Rounding turns them into 7136.
+
+    Args:
+        times: Pandas DataFrame, Pandas Series, Numpy Array or list
+            - The times in seconds. i.e. concatted_medpc_df[["(P)Portentry", "(N)Portexit", "(S)CSpresentation"]]
+            - Values that are not numbers are treated like NaNs
+        multiplier: int
+            - The number that the times are multiplied by. 100 makes each increment 10ms.
+        rounding: str
+            - How the scaled times are turned into whole numbers. One of "round", "truncate", "floor" or "ceil".
+            - "truncate" gives the same numbers as scale_time_to_whole_number
+            - "round" rounds halves to the nearest even number, like np.rint
+        nan_value: int
+            - The number to use for NaNs, infinite values and values that are not numbers. 
+            - scale_time_to_whole_number uses 0
+        dtype: Numpy dtype
+            - The integer type of the scaled times
+    Returns: 
+        Pandas DataFrame, Pandas Series or Numpy Array:
+            - The scaled whole number times. DataFrames and Series keep their index and column names.
+    """
+    if rounding not in ROUNDING_FUNCTIONS:
+        raise ValueError("rounding must be one of {}, not {}".format(list(ROUNDING_FUNCTIONS), rounding))
+    if isinstance(times, pd.DataFrame):
+        return times.apply(scale_times_to_whole_numbers, multiplier=multiplier, rounding=rounding, nan_value=nan_value, dtype=dtype)
+    if isinstance(times, pd.Series):
+        return pd.Series(scale_times_to_whole_numbers(times.to_numpy(), multiplier=multiplier, rounding=rounding, \
+            nan_value=nan_value, dtype=dtype), index=times.index, name=times.name)
+
+    times = np.asarray(times)
+    if not np.issubdtype(times.dtype, np.number):
+        times = pd.to_numeric(pd.Series(times.ravel()), errors="coerce").to_numpy(dtype=np.float64).reshape(times.shape)
+    scaled_times = ROUNDING_FUNCTIONS[rounding](times.astype(np.float64) * multiplier)
+    scaled_times[~np.isfinite(scaled_times)] = nan_value
+    return scaled_times.astype(dtype)
+
 def get_all_port_entry_increments(port_entry_scaled, port_exit_scaled):
     """
     Gets all the numbers that are in the duration of the port entry and port exit times. 
@@ -44,8 +96,12 @@ def get_all_port_entry_increments(port_entry_scaled, port_exit_scaled):
         Numpy array:
             - 1D Numpy Array of all the numbers that are in the duration of all the port entry and port exit times
     """
-    all_port_entry_ranges = [np.arange(port_entry, port_exit+1) for port_entry, port_exit in zip(port_entry_scaled, port_exit_scaled)]
-    return np.concatenate(all_port_entry_ranges)
+    with profile_stage("processing.port.all_port_entry_increments") as stage_record:
+        all_port_entry_ranges = [np.arange(port_entry, port_exit+1) for port_entry, port_exit in zip(port_entry_scaled, port_exit_scaled)]
+        all_port_entry_increments = np.concatenate(all_port_entry_ranges)
+        stage_record["rows"] = len(all_port_entry_ranges)
+        stage_record["events"] = len(all_port_entry_increments)
+    return all_port_entry_increments
 
 def get_inside_port_mask(inside_port_numbers, max_time):
     """
@@ -70,10 +126,107 @@ def get_inside_port_mask(inside_port_numbers, max_time):
     """
     if max_time is None:
         max_time = inside_port_numbers.max()
-    session_time_increments = np.arange(1, max_time+1)
-    inside_port_mask = np.isin(session_time_increments, inside_port_numbers)
+    with profile_stage("processing.port.inside_port_mask") as stage_record:
+        session_time_increments = np.arange(1, max_time+1)
+        inside_port_mask = np.isin(session_time_increments, inside_port_numbers)
+        stage_record["rows"] = len(session_time_increments)
+        stage_record["events"] = len(inside_port_numbers)
     return session_time_increments, inside_port_mask
 
+def get_port_visit_intervals(port_entry_scaled, port_exit_scaled):
+    """
+    Gets the port visits as sorted (entry, exit) intervals, instead of every number that is in the duration of each visit.
+    Visits that overlap each other are merged into one, so that the intervals can be binary searched.
+    Pairs with a NaN, or an exit before the entry, are removed because they have no time inside the port.
+    i.e. entries of [7136, 7140, 8000] and exits of [7142, 7150, 8003] become [7136, 8000] and [7150, 8003]
+
+    Args:
+        port_entry_scaled: Pandas Series or Numpy Array
+            - A column from a MED-PC Dataframe that has all the port entry times. Usually scaled with scale_time_to_whole_number
+        port_exit_scaled: Pandas Series or Numpy Array
+            - A column from a MED-PC Dataframe that has all the port exit times. Usually scaled with scale_time_to_whole_number
+    Returns: 
+        Numpy Array, Numpy Array
+            - The entry time of each visit, sorted from smallest to largest
+            - The exit time of each visit. The subject is inside the port from the entry to the exit, including both.
+    """
+    port_entries = np.asarray(port_entry_scaled, dtype=np.float64)
+    port_exits = np.asarray(port_exit_scaled, dtype=np.float64)
+    # zip only goes through the pairs up to the shorter of the two, so the same is done here
+    number_of_pairs = min(len(port_entries), len(port_exits))
+    port_entries, port_exits = port_entries[:number_of_pairs], port_exits[:number_of_pairs]
+    is_valid_visit = ~np.isnan(port_entries) & ~np.isnan(port_exits) & (port_exits >= port_entries)
+    port_entries, port_exits = port_entries[is_valid_visit], port_exits[is_valid_visit]
+    if len(port_entries) == 0:
+        return port_entries, port_exits
+
+    visit_order = np.argsort(port_entries, kind="stable")
+    port_entries, port_exits = port_entries[visit_order], port_exits[visit_order]
+    # A visit starts a new interval when it enters after every earlier visit has exited
+    latest_exits = np.maximum.accumulate(port_exits)
+    is_new_interval = np.concatenate([[True], port_entries[1:] > latest_exits[:-1]])
+    interval_last_visits = np.concatenate([np.flatnonzero(is_new_interval)[1:] - 1, [len(port_entries) - 1]])
+    return port_entries[is_new_interval], latest_exits[interval_last_visits]
+
+def is_inside_port(visit_entries, visit_exits, times):
+    """
+    Checks whether or not the subject is inside the port at each time, with a binary search of the port visit intervals.
+    The time and memory used depend on the number of times and visits, not on the length of the session.
+
+    Args:
+        visit_entries: Numpy Array
+            - The sorted entry time of each visit. From get_port_visit_intervals
+        visit_exits: Numpy Array
+            - The exit time of each visit. From get_port_visit_intervals
+        times: int, float or Numpy Array
+            - The times to check. Must be on the same scale as the visits.
+    Returns: 
+        bool or Numpy Array
+            - True if the subject is inside the port at the time, False if not
+    """
+    times = np.asarray(times)
+    if len(visit_entries) == 0:
+        return np.zeros(times.shape, dtype=bool)
+    # The last visit that was entered at or before each time
+    visit_indexes = np.searchsorted(visit_entries, times, side="right") - 1
+    has_entered = visit_indexes >= 0
+    return has_entered & (times <= visit_exits[np.where(has_entered, visit_indexes, 0)])
+
+def get_inside_port_mask_from_intervals(visit_entries, visit_exits, max_time=None):
+    """
+    Gets the same mask as get_inside_port_mask, but from the port visit intervals instead of every number inside the port.
+    Each visit adds 1 at its entry and subtracts 1 after its exit in a difference array, 
+    and the cumulative sum of that is above 0 for all the times that are inside the port. 
+    So there is no array of all the numbers inside the port, and no sorting like with np.isin.
+
+    Args:
+        visit_entries: Numpy Array
+            - The entry time of each visit as whole numbers. From get_port_visit_intervals
+        visit_exits: Numpy Array
+            - The exit time of each visit as whole numbers. From get_port_visit_intervals
+        max_time: int
+            - The number that represents the largest number for the time. 
+            - Defaults to the last port exit
+    Returns: 
+        session_time_increments: Numpy Array
+            - Range of number from 1 to max time 
+        inside_port_mask: Numpy Array
+            - The mask of True or False if the subject is in the port during the time of that index
+    """
+    visit_entries = np.asarray(visit_entries, dtype=np.int64)
+    visit_exits = np.asarray(visit_exits, dtype=np.int64)
+    if max_time is None:
+        max_time = int(visit_exits.max()) if len(visit_exits) else 0
+    max_time = int(max_time)
+    # Index 0 of the mask is for the time of 1. So a visit covers the indexes from entry - 1 up to(but not including) exit
+    start_indexes = np.clip(visit_entries - 1, 0, max_time)
+    stop_indexes = np.clip(visit_exits, 0, max_time)
+    has_time_in_session = start_indexes < stop_indexes
+    time_changes = np.bincount(start_indexes[has_time_in_session], minlength=max_time + 1) \
+        - np.bincount(stop_indexes[has_time_in_session], minlength=max_time + 1)
+    inside_port_mask = np.cumsum(time_changes[:max_time]) > 0
+    return np.arange(1, max_time + 1), inside_port_mask
+
 def get_inside_port_probability_averages_for_all_increments(tone_times, inside_port_mask, before_tone_duration=2000, after_tone_duration=2000):
     """
     Calculates the average probability that a subject is in the port between sessions. 
@@ -100,6 +253,626 @@ def get_inside_port_probability_averages_for_all_increments(tone_times, inside_p
         result.append(inside_port_mask[tone_start_int - before_tone_duration: tone_start_int + after_tone_duration])
     return np.stack(result).mean(axis=0)
 
+def get_peri_tone_inside_port_windows(tone_times, inside_port_mask, before_tone_duration=2000, after_tone_duration=2000):
+    """
+    Gets the part of the inside port mask around every tone, as one row per tone.
+    The mask is padded on both sides, and the rows are taken from a strided view of the padded mask, so nothing is copied until the rows are picked.
+    Unlike slicing the mask for each tone, tones that are too close to the start or end of the mask still get a full row.
+    The increments of the row that are outside of the mask are marked as not valid.
+
+    Args:
+        tone_times: list, Numpy Array or Pandas Series
+            - The times that the tone has played, on the same scale as the mask
+        inside_port_mask: Numpy Array
+            - The mask where the subject is in the port based on the index being the time increment
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+    Returns: 
+        Numpy Array, Numpy Array
+            - 2D boolean array of whether or not the subject is in the port, with a row for each tone and a column for each increment
+            - 2D boolean array of whether or not each increment is inside of the mask
+    """
+    tone_times = np.asarray(tone_times).astype(np.int64)
+    inside_port_mask = np.asarray(inside_port_mask, dtype=bool)
+    window_size = before_tone_duration + after_tone_duration
+    # Padding by the full window on both sides, so that any window that overlaps with the mask fits inside the padded mask
+    padding_size = window_size
+    padded_mask = np.pad(inside_port_mask, padding_size, mode="constant", constant_values=False)
+    all_windows = np.lib.stride_tricks.sliding_window_view(padded_mask, window_size)
+
+    window_starts = tone_times - before_tone_duration
+    increment_times = window_starts[:, np.newaxis] + np.arange(window_size)
+    is_valid = (increment_times >= 0) & (increment_times < len(inside_port_mask))
+    # Windows that don't overlap with the mask at all are not valid anyways, so any row can be used for them
+    window_indexes = np.clip(window_starts + padding_size, 0, len(all_windows) - 1)
+    return all_windows[window_indexes] & is_valid, is_valid
+
+def get_peri_tone_inside_port_tensor_from_session_times(tone_times, tone_offsets, port_entries, port_entry_offsets, port_exits, \
+        port_exit_offsets, before_tone_duration=2000, after_tone_duration=2000, multiplier=100, rounding="truncate", dtype=np.float32):
+    """
+    Gets whether or not the subject is in the port around every tone of every session, as a (session, tone, increment) array.
+    The times of all the sessions are in one array for each event, with the offsets of each session.
+    i.e. The tone times of the i-th session are tone_times[tone_offsets[i]:tone_offsets[i + 1]]
+    The inside port masks are made from the port visit intervals, and only one session's mask is kept in memory at a time.
+    Sessions have different numbers of tones, so the tone axis is as long as the session with the most tones.
+
+    Args:
+        tone_times: Numpy Array
+            - The tone times of all the sessions in seconds. The valid tones of each session are found with get_valid_tone_offsets.
+        tone_offsets: Numpy Array
+            - The offsets of each session in tone_times. Has one more item than the number of sessions.
+        port_entries: Numpy Array
+            - The port entry times of all the sessions in seconds
+        port_entry_offsets: Numpy Array
+            - The offsets of each session in port_entries
+        port_exits: Numpy Array
+            - The port exit times of all the sessions in seconds
+        port_exit_offsets: Numpy Array
+            - The offsets of each session in port_exits
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+        multiplier: int
+            - The number that the times are multiplied by to make them whole numbers. 100 makes each increment 10ms.
+        rounding: str
+            - How the scaled times are turned into whole numbers. See scale_times_to_whole_numbers.
+            - "truncate" is the same as scale_time_to_whole_number, which the notebooks use
+        dtype: Numpy dtype
+            - np.float32 stores the increments that are not valid as NaN. 
+            - bool uses a quarter of the memory, and the increments that are not valid are False
+    Returns: 
+        Numpy Array, Numpy Array, Numpy Array
+            - 3D array of whether or not the subject is in the port for each session, tone and increment
+            - 3D boolean array of whether or not each session, tone and increment is valid. 
+            Padded tones, and increments outside of the session are not valid.
+            - The number of valid tones of each session
+    """
+    number_of_sessions = len(tone_offsets) - 1
+    valid_tone_times, valid_tone_offsets = get_valid_tone_offsets(tone_times=tone_times, offsets=tone_offsets)
+    valid_tone_times = scale_times_to_whole_numbers(valid_tone_times, multiplier=multiplier, rounding=rounding)
+    number_of_tones = np.diff(valid_tone_offsets)
+
+    window_size = before_tone_duration + after_tone_duration
+    tensor_shape = (number_of_sessions, number_of_tones.max(initial=0), window_size)
+    peri_tone_tensor = np.zeros(tensor_shape, dtype=dtype)
+    is_valid = np.zeros(tensor_shape, dtype=bool)
+    with profile_stage("processing.port.peri_tone_tensor") as stage_record:
+        for session_index in range(number_of_sessions):
+            valid_tones = valid_tone_times[valid_tone_offsets[session_index]:valid_tone_offsets[session_index + 1]]
+            if len(valid_tones) == 0:
+                continue
+            visit_entries, visit_exits = get_port_visit_intervals( \
+                port_entry_scaled=scale_times_to_whole_numbers(port_entries[port_entry_offsets[session_index]:port_entry_offsets[session_index + 1]], \
+                    multiplier=multiplier, rounding=rounding), \
+                port_exit_scaled=scale_times_to_whole_numbers(port_exits[port_exit_offsets[session_index]:port_exit_offsets[session_index + 1]], \
+                    multiplier=multiplier, rounding=rounding))
+            _, inside_port_mask = get_inside_port_mask_from_intervals(visit_entries=visit_entries, visit_exits=visit_exits, \
+                max_time=valid_tones.max() + after_tone_duration + 1)
+            session_windows, session_is_valid = get_peri_tone_inside_port_windows(tone_times=valid_tones, inside_port_mask=inside_port_mask, \
+                before_tone_duration=before_tone_duration, after_tone_duration=after_tone_duration)
+            peri_tone_tensor[session_index, :len(valid_tones)] = session_windows
+            is_valid[session_index, :len(valid_tones)] = session_is_valid
+        stage_record["rows"] = number_of_sessions
+        stage_record["events"] = len(valid_tone_times)
+    if np.issubdtype(dtype, np.floating):
+        peri_tone_tensor[~is_valid] = np.nan
+    return peri_tone_tensor, is_valid, number_of_tones
+
+def get_cohort_peri_tone_inside_port_tensor(concatted_medpc_df, tone_time_column="(S)CSpresentation", port_entry_column="(P)Portentry", \
+        port_exit_column="(N)Portexit", subject_column="subject", date_column="date", before_tone_duration=2000, after_tone_duration=2000, \
+        multiplier=100, rounding="truncate", dtype=np.float32):
+    """
+    Gets whether or not the subject is in the port around every tone of every session, as a (session, tone, increment) array.
+    This does the scaling, valid tones, inside port mask and windows of notebook 03 for all the sessions of a cohort.
+    The inside port masks are made from the port visit intervals, and only one session's mask is kept in memory at a time.
+    Sessions have different numbers of tones, so the tone axis is as long as the session with the most tones.
+
+    Args:
+        concatted_medpc_df: Pandas Dataframe 
+            - Output of extract.dataframe.get_medpc_dataframe_from_list_of_files
+        tone_time_column: str
+            - Name of the column of concatted_medpc_df that has the array of tone times
+        port_entry_column: str
+            - Name of the column of concatted_medpc_df that has the array port entry times
+        port_exit_column: str
+            - Name of the column of concatted_medpc_df that has the array port exit times
+        subject_column: str
+            - Name of the column of concatted_medpc_df that has the subject's ID
+        date_column: str
+            - Name of the column of concatted_medpc_df that has the date of the recording
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+        multiplier: int
+            - The number that the times are multiplied by to make them whole numbers. 100 makes each increment 10ms.
+        rounding: str
+            - How the scaled times are turned into whole numbers. See scale_times_to_whole_numbers.
+            - "truncate" is the same as scale_time_to_whole_number, which the notebooks use
+        dtype: Numpy dtype
+            - np.float32 stores the increments that are not valid as NaN. 
+            - bool uses a quarter of the memory, and the increments that are not valid are False
+    Returns: 
+        Numpy Array, Numpy Array, Pandas DataFrame
+            - 3D array of whether or not the subject is in the port for each session, tone and increment
+            - 3D boolean array of whether or not each session, tone and increment is valid. 
+            Padded tones, and increments outside of the session are not valid.
+            - A row for each session with the file path, date, subject and number of tones
+    """
+    file_paths, row_order, offsets = get_file_path_partitions(concatted_medpc_df=concatted_medpc_df)
+    dates = concatted_medpc_df[date_column].to_numpy()[row_order]
+    subjects = concatted_medpc_df[subject_column].to_numpy()[row_order]
+    peri_tone_tensor, is_valid, number_of_tones = get_peri_tone_inside_port_tensor_from_session_times( \
+        tone_times=concatted_medpc_df[tone_time_column].to_numpy(dtype=np.float64)[row_order], tone_offsets=offsets, \
+        port_entries=concatted_medpc_df[port_entry_column].to_numpy(dtype=np.float64)[row_order], port_entry_offsets=offsets, \
+        port_exits=concatted_medpc_df[port_exit_column].to_numpy(dtype=np.float64)[row_order], port_exit_offsets=offsets, \
+        before_tone_duration=before_tone_duration, after_tone_duration=after_tone_duration, multiplier=multiplier, \
+        rounding=rounding, dtype=dtype)
+
+    session_df = pd.DataFrame({"file_path": file_paths, date_column: dates[offsets[:-1]] if len(dates) else [], \
+        subject_column: subjects[offsets[:-1]] if len(subjects) else [], "number_of_tones": number_of_tones})
+    return peri_tone_tensor, is_valid, session_df
+
+def get_peri_tone_session_sums_and_counts_from_session_times(tone_times, tone_offsets, port_entries, port_entry_offsets, port_exits, \
+        port_exit_offsets, before_tone_duration=2000, after_tone_duration=2000, multiplier=100, rounding="truncate", chunk_size=100):
+    """
+    Gets the number of tones that the subject is in the port for, and the number of valid tones, at each increment around the tone of each session.
+    This is the (session, tone, increment) array of get_peri_tone_inside_port_tensor_from_session_times added up over the tones.
+    The array is only made for chunk_size sessions at a time, so the memory doesn't grow with the number of tones of the cohort.
+
+    Args:
+        tone_times: Numpy Array
+            - The tone times of all the sessions in seconds
+        tone_offsets: Numpy Array
+            - The offsets of each session in tone_times. Has one more item than the number of sessions.
+        port_entries: Numpy Array
+            - The port entry times of all the sessions in seconds
+        port_entry_offsets: Numpy Array
+            - The offsets of each session in port_entries
+        port_exits: Numpy Array
+            - The port exit times of all the sessions in seconds
+        port_exit_offsets: Numpy Array
+            - The offsets of each session in port_exits
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+        multiplier: int
+            - The number that the times are multiplied by to make them whole numbers. 100 makes each increment 10ms.
+        rounding: str
+            - How the scaled times are turned into whole numbers. See scale_times_to_whole_numbers.
+        chunk_size: int
+            - The number of sessions that the (session, tone, increment) array is made for at a time
+    Returns: 
+        Numpy Array, Numpy Array, Numpy Array
+            - 2D array of the number of tones that the subject is in the port for, for each session and increment
+            - 2D array of the number of tones that each increment is valid for, for each session and increment
+            - The number of valid tones of each session
+    """
+    number_of_sessions = len(tone_offsets) - 1
+    window_size = before_tone_duration + after_tone_duration
+    session_sums = np.zeros((number_of_sessions, window_size), dtype=np.int64)
+    session_counts = np.zeros((number_of_sessions, window_size), dtype=np.int64)
+    number_of_tones = np.zeros(number_of_sessions, dtype=np.int64)
+    for chunk_start in range(0, number_of_sessions, chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, number_of_sessions)
+        chunk_tone_times, chunk_tone_offsets = get_session_slice(values=tone_times, offsets=tone_offsets, first_session=chunk_start, \
+            last_session=chunk_stop)
+        chunk_port_entries, chunk_port_entry_offsets = get_session_slice(values=port_entries, offsets=port_entry_offsets, \
+            first_session=chunk_start, last_session=chunk_stop)
+        chunk_port_exits, chunk_port_exit_offsets = get_session_slice(values=port_exits, offsets=port_exit_offsets, \
+            first_session=chunk_start, last_session=chunk_stop)
+        peri_tone_tensor, is_valid, number_of_tones[chunk_start:chunk_stop] = get_peri_tone_inside_port_tensor_from_session_times( \
+            tone_times=chunk_tone_times, tone_offsets=chunk_tone_offsets, port_entries=chunk_port_entries, \
+            port_entry_offsets=chunk_port_entry_offsets, port_exits=chunk_port_exits, port_exit_offsets=chunk_port_exit_offsets, \
+            before_tone_duration=before_tone_duration, after_tone_duration=after_tone_duration, multiplier=multiplier, \
+            rounding=rounding, dtype=bool)
+        session_sums[chunk_start:chunk_stop] = peri_tone_tensor.sum(axis=1)
+        session_counts[chunk_start:chunk_stop] = is_valid.sum(axis=1)
+    return session_sums, session_counts, number_of_tones
+
+def get_cohort_peri_tone_session_sums_and_counts(concatted_medpc_df, tone_time_column="(S)CSpresentation", port_entry_column="(P)Portentry", \
+        port_exit_column="(N)Portexit", subject_column="subject", date_column="date", before_tone_duration=2000, after_tone_duration=2000, \
+        multiplier=100, rounding="truncate", chunk_size=100):
+    """
+    Same as get_cohort_peri_tone_inside_port_tensor, but added up over the tones of each session as (session, increment) arrays.
+    So the memory grows with the number of sessions instead of the number of sessions times the most tones of any session.
+
+    Args:
+        concatted_medpc_df: Pandas Dataframe 
+            - Output of extract.dataframe.get_medpc_dataframe_from_list_of_files
+        tone_time_column: str
+            - Name of the column of concatted_medpc_df that has the array of tone times
+        port_entry_column: str
+            - Name of the column of concatted_medpc_df that has the array port entry times
+        port_exit_column: str
+            - Name of the column of concatted_medpc_df that has the array port exit times
+        subject_column: str
+            - Name of the column of concatted_medpc_df that has the subject's ID
+        date_column: str
+            - Name of the column of concatted_medpc_df that has the date of the recording
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+        multiplier: int
+            - The number that the times are multiplied by to make them whole numbers. 100 makes each increment 10ms.
+        rounding: str
+            - How the scaled times are turned into whole numbers. See scale_times_to_whole_numbers.
+        chunk_size: int
+            - The number of sessions that the (session, tone, increment) array is made for at a time
+    Returns: 
+        Numpy Array, Numpy Array, Pandas DataFrame
+            - 2D array of the number of tones that the subject is in the port for, for each session and increment
+            - 2D array of the number of tones that each increment is valid for, for each session and increment
+            - A row for each session with the file path, date, subject and number of tones
+    """
+    file_paths, row_order, offsets = get_file_path_partitions(concatted_medpc_df=concatted_medpc_df)
+    dates = concatted_medpc_df[date_column].to_numpy()[row_order]
+    subjects = concatted_medpc_df[subject_column].to_numpy()[row_order]
+    session_sums, session_counts, number_of_tones = get_peri_tone_session_sums_and_counts_from_session_times( \
+        tone_times=concatted_medpc_df[tone_time_column].to_numpy(dtype=np.float64)[row_order], tone_offsets=offsets, \
+        port_entries=concatted_medpc_df[port_entry_column].to_numpy(dtype=np.float64)[row_order], port_entry_offsets=offsets, \
+        port_exits=concatted_medpc_df[port_exit_column].to_numpy(dtype=np.float64)[row_order], port_exit_offsets=offsets, \
+        before_tone_duration=before_tone_duration, after_tone_duration=after_tone_duration, multiplier=multiplier, \
+        rounding=rounding, chunk_size=chunk_size)
+
+    session_df = pd.DataFrame({"file_path": file_paths, date_column: dates[offsets[:-1]] if len(dates) else [], \
+        subject_column: subjects[offsets[:-1]] if len(subjects) else [], "number_of_tones": number_of_tones})
+    return session_sums, session_counts, session_df
+
+def get_peri_tone_inside_port_tensor_from_event_table(event_df, session_df, tone_variable="(S)CSpresentation", \
+        port_entry_variable="(P)Portentry", port_exit_variable="(N)Portexit", ticks_per_second=DEFAULT_TICKS_PER_SECOND, \
+        before_tone_duration=2000, after_tone_duration=2000, multiplier=100, rounding="truncate", dtype=np.float32):
+    """
+    Same as get_cohort_peri_tone_inside_port_tensor, but with the event table of extract.events instead of the wide dataframe.
+
+    Args:
+        event_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        session_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        tone_variable: str
+            - Name of the variable of the tone times
+        port_entry_variable: str
+            - Name of the variable of the port entry times
+        port_exit_variable: str
+            - Name of the variable of the port exit times
+        ticks_per_second: int or None
+            - The ticks per second that the event table was made with. None if the times are in seconds.
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+        multiplier: int
+            - The number that the times are multiplied by to make them whole numbers. 100 makes each increment 10ms.
+        rounding: str
+            - How the scaled times are turned into whole numbers. See scale_times_to_whole_numbers.
+        dtype: Numpy dtype
+            - np.float32 stores the increments that are not valid as NaN. bool uses a quarter of the memory.
+    Returns: 
+        Numpy Array, Numpy Array, Pandas DataFrame
+            - 3D array of whether or not the subject is in the port for each session, tone and increment
+            - 3D boolean array of whether or not each session, tone and increment is valid
+            - session_df with the number of tones of each session
+    """
+    variable_to_times_and_offsets = {variable: get_session_event_times(event_df=event_df, variable=variable, \
+        number_of_sessions=len(session_df), ticks_per_second=ticks_per_second) \
+        for variable in [tone_variable, port_entry_variable, port_exit_variable]}
+    tone_times, tone_offsets = variable_to_times_and_offsets[tone_variable]
+    port_entries, port_entry_offsets = variable_to_times_and_offsets[port_entry_variable]
+    port_exits, port_exit_offsets = variable_to_times_and_offsets[port_exit_variable]
+    peri_tone_tensor, is_valid, number_of_tones = get_peri_tone_inside_port_tensor_from_session_times(tone_times=tone_times, \
+        tone_offsets=tone_offsets, port_entries=port_entries, port_entry_offsets=port_entry_offsets, port_exits=port_exits, \
+        port_exit_offsets=port_exit_offsets, before_tone_duration=before_tone_duration, after_tone_duration=after_tone_duration, \
+        multiplier=multiplier, rounding=rounding, dtype=dtype)
+    session_df = session_df.reset_index(drop=True)
+    session_df["number_of_tones"] = number_of_tones
+    return peri_tone_tensor, is_valid, session_df
+
+def get_peri_tone_inside_port_averages(peri_tone_tensor, is_valid, session_df, group_by="subject", before_tone_duration=2000):
+    """
+    Calculates the average probability that a subject is in the port at each increment around the tone, for groups of sessions.
+    All the valid tones of all the sessions in a group are averaged together. 
+    This uses the output of get_cohort_peri_tone_inside_port_tensor, so the masks don't have to be made again for each grouping.
+
+    Args:
+        peri_tone_tensor: Numpy Array
+            - 3D array of whether or not the subject is in the port for each session, tone and increment
+        is_valid: Numpy Array
+            - 3D boolean array of whether or not each session, tone and increment is valid
+        session_df: Pandas DataFrame
+            - A row for each session of peri_tone_tensor, in the same order
+        group_by: str or list
+            - The column(s) of session_df to group the sessions by. i.e. "subject", "date" or ["subject", "date"]
+        before_tone_duration: int
+            - The number of increments before the tone in peri_tone_tensor. Used to label the increments.
+    Returns: 
+        Pandas DataFrame
+            - A row for each group, and a column for each increment from the start of the tone. 
+            NaN for increments that no session of the group has a valid value for.
+    """
+    # Summing up the tones of each session first, so that only a (session, increment) array is grouped
+    session_sums = np.where(is_valid, peri_tone_tensor, 0).sum(axis=1, dtype=np.float64)
+    session_counts = is_valid.sum(axis=1)
+    increments = np.arange(peri_tone_tensor.shape[2]) - before_tone_duration
+    group_keys = [session_df[column].to_numpy() for column in ([group_by] if isinstance(group_by, str) else group_by)]
+    group_sums = pd.DataFrame(session_sums, columns=increments).groupby(group_keys).sum()
+    group_counts = pd.DataFrame(session_counts, columns=increments).groupby(group_keys).sum()
+    group_averages = group_sums / group_counts.where(group_counts > 0)
+    group_averages.index.names = [group_by] if isinstance(group_by, str) else group_by
+    return group_averages
+
+def save_memory_mapped_inside_port_masks(memory_map_directory, tone_variable="(S)CSpresentation", port_entry_variable="(P)Portentry", \
+        port_exit_variable="(N)Portexit", mask_name="inside_port_mask", after_tone_duration=2000, multiplier=100, rounding="truncate", \
+        chunk_size=1000):
+    """
+    Makes the inside port mask of every session in a memory map directory, and saves them as another memory-mapped array.
+    The masks are made from the port visit intervals for a chunk of sessions at a time, so only one chunk of masks is in memory.
+    Each mask goes up to after_tone_duration increments after the last tone or port exit of the session,
+    so that the window after every tone fits inside the mask.
+
+    Args:
+        memory_map_directory: str
+            - The directory that extract.memory_map.save_memory_mapped_medpc_files saved to
+        tone_variable: str
+            - Name of the variable of the tone times
+        port_entry_variable: str
+            - Name of the variable of the port entry times
+        port_exit_variable: str
+            - Name of the variable of the port exit times
+        mask_name: str
+            - The name to save the masks as. Masks that were saved with this name before are replaced.
+        after_tone_duration: int
+            - The number of increments after the tone that will be analyzed
+        multiplier: int
+            - The number that the times are multiplied by to make them whole numbers. 100 makes each increment 10ms.
+        rounding: str
+            - How the scaled times are turned into whole numbers. See scale_times_to_whole_numbers.
+    """
+    session_df, name_to_arrays, ticks_per_second = load_memory_mapped_arrays(memory_map_directory=memory_map_directory)
+    memory_map_index = load_memory_map_index(memory_map_directory)
+    if mask_name in memory_map_index["arrays"]:
+        remove_memory_mapped_array(memory_map_directory=memory_map_directory, memory_map_index=memory_map_index, name=mask_name)
+
+    for chunk_start in range(0, len(session_df), chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, len(session_df))
+        variable_to_times_and_offsets = {variable: get_memory_mapped_session_times(name_to_arrays=name_to_arrays, name=variable, \
+            first_session=chunk_start, last_session=chunk_stop, ticks_per_second=ticks_per_second) \
+            for variable in [tone_variable, port_entry_variable, port_exit_variable]}
+        tone_times, tone_offsets = variable_to_times_and_offsets[tone_variable]
+        port_entries, port_entry_offsets = variable_to_times_and_offsets[port_entry_variable]
+        port_exits, port_exit_offsets = variable_to_times_and_offsets[port_exit_variable]
+        all_masks = []
+        for session_index in range(chunk_stop - chunk_start):
+            session_tones = scale_times_to_whole_numbers(tone_times[tone_offsets[session_index]:tone_offsets[session_index + 1]], \
+                multiplier=multiplier, rounding=rounding)
+            visit_entries, visit_exits = get_port_visit_intervals( \
+                port_entry_scaled=scale_times_to_whole_numbers(port_entries[port_entry_offsets[session_index]:port_entry_offsets[session_index + 1]], \
+                    multiplier=multiplier, rounding=rounding), \
+                port_exit_scaled=scale_times_to_whole_numbers(port_exits[port_exit_offsets[session_index]:port_exit_offsets[session_index + 1]], \
+                    multiplier=multiplier, rounding=rounding))
+            max_time = max(session_tones.max(initial=0), visit_exits.max(initial=0)) + after_tone_duration
+            all_masks.append(get_inside_port_mask_from_intervals(visit_entries=visit_entries, visit_exits=visit_exits, max_time=max_time)[1])
+        mask_offsets = np.concatenate([[0], np.cumsum([len(inside_port_mask) for inside_port_mask in all_masks])])
+        append_session_arrays(memory_map_directory=memory_map_directory, memory_map_index=memory_map_index, name=mask_name, \
+            values=np.concatenate(all_masks) if all_masks else np.zeros(0, dtype=bool), offsets=mask_offsets)
+    save_memory_map_index(memory_map_index=memory_map_index, memory_map_directory=memory_map_directory)
+
+def iterate_memory_mapped_peri_tone_windows(name_to_arrays, number_of_sessions, ticks_per_second, tone_variable="(S)CSpresentation", \
+        mask_name="inside_port_mask", before_tone_duration=2000, after_tone_duration=2000, multiplier=100, rounding="truncate", \
+        chunk_size=1000):
+    """
+    Goes through the windows around the valid tones of each session, from the memory-mapped masks of save_memory_mapped_inside_port_masks.
+    Only the mask of one session, and the tone times of one chunk of sessions, are read from the files at a time.
+
+    Args:
+        name_to_arrays: dict
+            - Output of extract.memory_map.load_memory_mapped_arrays
+        number_of_sessions: int
+            - The number of sessions in the memory-mapped arrays
+        ticks_per_second: int or None
+            - Output of extract.memory_map.load_memory_mapped_arrays
+        tone_variable: str
+            - Name of the variable of the tone times
+        mask_name: str
+            - The name that the masks were saved as
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+        multiplier: int
+            - The multiplier that the masks were made with
+        rounding: str
+            - The rounding that the masks were made with
+        chunk_size: int
+            - The number of sessions that the tone times are read for at a time
+
+    Yields:
+        int, Numpy Array, Numpy Array
+            - The index of the session. Sessions without any valid tones are skipped.
+            - 2D array of whether or not the subject is in the port for each valid tone and increment of the session
+            - 2D boolean array of whether or not each tone and increment is valid
+    """
+    masks, mask_offsets = name_to_arrays[mask_name]
+    for chunk_start in range(0, number_of_sessions, chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, number_of_sessions)
+        tone_times, tone_offsets = get_memory_mapped_session_times(name_to_arrays=name_to_arrays, name=tone_variable, \
+            first_session=chunk_start, last_session=chunk_stop, ticks_per_second=ticks_per_second)
+        valid_tone_times, valid_tone_offsets = get_valid_tone_offsets(tone_times=tone_times, offsets=tone_offsets)
+        valid_tone_times = scale_times_to_whole_numbers(valid_tone_times, multiplier=multiplier, rounding=rounding)
+        for session_index in range(chunk_start, chunk_stop):
+            valid_tones = valid_tone_times[valid_tone_offsets[session_index - chunk_start]:valid_tone_offsets[session_index - chunk_start + 1]]
+            if len(valid_tones) == 0:
+                continue
+            # Only the mask of this session is read from the file
+            inside_port_mask, _ = get_session_slice(values=masks, offsets=mask_offsets, first_session=session_index, \
+                last_session=session_index + 1)
+            session_windows, session_is_valid = get_peri_tone_inside_port_windows(tone_times=valid_tones, inside_port_mask=inside_port_mask, \
+                before_tone_duration=before_tone_duration, after_tone_duration=after_tone_duration)
+            yield session_index, session_windows, session_is_valid
+
+def get_memory_mapped_peri_tone_session_sums_and_counts(memory_map_directory, tone_variable="(S)CSpresentation", mask_name="inside_port_mask", \
+        before_tone_duration=2000, after_tone_duration=2000, multiplier=100, rounding="truncate", chunk_size=1000):
+    """
+    Same as get_cohort_peri_tone_session_sums_and_counts, but with the memory-mapped masks of save_memory_mapped_inside_port_masks.
+    Only the (session, increment) sums and counts are kept in memory.
+
+    Args:
+        memory_map_directory: str
+            - The directory that the masks were saved to with save_memory_mapped_inside_port_masks
+        tone_variable: str
+            - Name of the variable of the tone times
+        mask_name: str
+            - The name that the masks were saved as
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+        multiplier: int
+            - The multiplier that the masks were made with
+        rounding: str
+            - The rounding that the masks were made with
+        chunk_size: int
+            - The number of sessions that the tone times are read for at a time
+    Returns: 
+        Numpy Array, Numpy Array, Pandas DataFrame
+            - 2D array of the number of tones that the subject is in the port for, for each session and increment
+            - 2D array of the number of tones that each increment is valid for, for each session and increment
+            - The session dataframe of the memory-mapped arrays, with the number of tones of each session
+    """
+    session_df, name_to_arrays, ticks_per_second = load_memory_mapped_arrays(memory_map_directory=memory_map_directory)
+    window_size = before_tone_duration + after_tone_duration
+    session_sums = np.zeros((len(session_df), window_size), dtype=np.int64)
+    session_counts = np.zeros((len(session_df), window_size), dtype=np.int64)
+    number_of_tones = np.zeros(len(session_df), dtype=np.int64)
+    for session_index, session_windows, session_is_valid in iterate_memory_mapped_peri_tone_windows(name_to_arrays=name_to_arrays, \
+            number_of_sessions=len(session_df), ticks_per_second=ticks_per_second, tone_variable=tone_variable, mask_name=mask_name, \
+            before_tone_duration=before_tone_duration, after_tone_duration=after_tone_duration, multiplier=multiplier, \
+            rounding=rounding, chunk_size=chunk_size):
+        session_sums[session_index] = session_windows.sum(axis=0)
+        session_counts[session_index] = session_is_valid.sum(axis=0)
+        number_of_tones[session_index] = len(session_windows)
+    session_df = session_df.reset_index(drop=True)
+    session_df["number_of_tones"] = number_of_tones
+    return session_sums, session_counts, session_df
+
+def get_memory_mapped_inside_port_probability_averages(memory_map_directory, group_by="subject", tone_variable="(S)CSpresentation", \
+        mask_name="inside_port_mask", before_tone_duration=2000, after_tone_duration=2000, multiplier=100, rounding="truncate", \
+        chunk_size=1000):
+    """
+    Same as get_peri_tone_inside_port_averages, but with the memory-mapped masks of save_memory_mapped_inside_port_masks
+    instead of a (session, tone, increment) array of the whole cohort.
+    The windows around the tones are taken from the mask of one session at a time, 
+    and added to the sums of the group of the session. So only the sums of each group are kept in memory.
+
+    Args:
+        memory_map_directory: str
+            - The directory that the masks were saved to with save_memory_mapped_inside_port_masks
+        group_by: str or list
+            - The column(s) of the session dataframe to group the sessions by. i.e. "subject", "date" or "file_path" for each session
+        tone_variable: str
+            - Name of the variable of the tone times
+        mask_name: str
+            - The name that the masks were saved as
+        before_tone_duration: int
+            - The number of increments before the tone to be analyzed
+        after_tone_duration: int
+            - The number of increments after the tone to be analyzed
+        multiplier: int
+            - The multiplier that the masks were made with
+        rounding: str
+            - The rounding that the masks were made with
+        chunk_size: int
+            - The number of sessions that the tone times are read for at a time
+    Returns: 
+        Pandas DataFrame
+            - A row for each group, and a column for each increment from the start of the tone. 
+            NaN for increments that no session of the group has a valid value for.
+    """
+    session_df, name_to_arrays, ticks_per_second = load_memory_mapped_arrays(memory_map_directory=memory_map_directory)
+    group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+    group_codes, groups = pd.MultiIndex.from_frame(session_df[group_by]).factorize(sort=True)
+    window_size = before_tone_duration + after_tone_duration
+    group_sums = np.zeros((len(groups), window_size))
+    group_counts = np.zeros((len(groups), window_size), dtype=np.int64)
+
+    for session_index, session_windows, session_is_valid in iterate_memory_mapped_peri_tone_windows(name_to_arrays=name_to_arrays, \
+            number_of_sessions=len(session_df), ticks_per_second=ticks_per_second, tone_variable=tone_variable, mask_name=mask_name, \
+            before_tone_duration=before_tone_duration, after_tone_duration=after_tone_duration, multiplier=multiplier, \
+            rounding=rounding, chunk_size=chunk_size):
+        group_sums[group_codes[session_index]] += session_windows.sum(axis=0)
+        group_counts[group_codes[session_index]] += session_is_valid.sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        group_averages = pd.DataFrame(group_sums / group_counts, columns=np.arange(window_size) - before_tone_duration)
+    group_averages.index = groups.set_names(group_by) if len(group_by) > 1 else pd.Index(groups.get_level_values(0), name=group_by[0])
+    return group_averages
+
+def get_binned_sums(values, bin_size, axis=-1):
+    """
+    Adds up every bin_size values along an axis. The last bin has the leftover values if the length isn't divisible by bin_size.
+
+    Args:
+        values: Numpy Array
+            - The values to bin
+        bin_size: int
+            - The number of values in each bin
+        axis: int
+            - The axis to bin
+
+    Returns:
+        Numpy Array
+            - The sum of each bin
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return np.add.reduceat(values, np.arange(0, values.shape[axis], bin_size), axis=axis)
+
+def get_binned_averages(values, bin_size, axis=-1):
+    """
+    Averages every bin_size values along an axis, leaving out the NaNs.
+
+    Args:
+        values: Numpy Array
+            - The values to bin
+        bin_size: int
+            - The number of values in each bin
+        axis: int
+            - The axis to bin
+
+    Returns:
+        Numpy Array
+            - The average of each bin. NaN for bins that only have NaNs.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    is_value = ~np.isnan(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return get_binned_sums(np.where(is_value, values, 0), bin_size=bin_size, axis=axis) \
+            / get_binned_sums(is_value, bin_size=bin_size, axis=axis)
+
+def get_bin_seconds(number_of_bins, bin_size, before_tone_duration=2000, increments_per_second=DEFAULT_INCREMENTS_PER_SECOND):
+    """
+    Gets the seconds from the start of the tone of the start of each bin.
+
+    Args:
+        number_of_bins: int
+            - The number of bins
+        bin_size: int
+            - The number of increments in each bin
+        before_tone_duration: int
+            - The number of increments before the tone
+        increments_per_second: int
+            - The number of increments in a second
+
+    Returns:
+        Numpy Array
+            - The seconds of the start of each bin
+    """
+    return (np.arange(number_of_bins) * bin_size - before_tone_duration) / increments_per_second
+
 def main():
     """
     Main function that runs when the script is run
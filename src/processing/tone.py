@@ -6,7 +6,11 @@ For more information on the MED-PC's programming language, Trans:
 - https://www.med-associates.com/wp-content/uploads/2017/01/DOC-003-R3.4-SOF-735-MED-PC-IV-PROGRAMMER%E2%80%99S-MANUAL.pdf
 """
 from collections import defaultdict
+import numpy as np
 import pandas as pd
+from extract.events import DEFAULT_TICKS_PER_SECOND, get_session_event_times
+from extract.memory_map import get_memory_mapped_session_times, load_memory_mapped_arrays
+from profiling.stages import profile_stage
 
 def get_max_tone_number(tone_pd_series):
     """
@@ -22,11 +26,16 @@ def get_max_tone_number(tone_pd_series):
         int, float
             - The index of the max tone number. This number can be used to index the tone_pd_series to remove unnecessary numbers.
             - The max tone number. This number can be used to verify whether or not the tone_pd_series had unnecessary numbers.
+            - If there are no unnecessary numbers(i.e. from extract.parser, which doesn't add them),
+            the length of tone_pd_series and NaN are returned so that indexing keeps every tone.
     """
-    for index, num in enumerate(tone_pd_series):
-        if num % 1000 == 0:
-            return index, num
-    return index, num
+    tone_times = np.asarray(tone_pd_series, dtype=np.float64)
+    # NaNs are never divisible by 1000
+    is_max_tone = np.fmod(tone_times, 1000) == 0
+    if is_max_tone.any():
+        max_tone_index = int(np.argmax(is_max_tone))
+        return max_tone_index, tone_times[max_tone_index]
+    return len(tone_times), np.nan
 
 def get_valid_tones(tone_pd_series, drop_1000s=True, dropna=True):
     """
@@ -53,6 +62,47 @@ def get_valid_tones(tone_pd_series, drop_1000s=True, dropna=True):
     # Removing all numbers that are after the max tone
     return tone_pd_series
 
+def get_valid_tone_offsets(tone_times, offsets):
+    """
+    Gets the valid tones of every session at once, the same as running get_valid_tones on each session.
+    The tone times of all the sessions are in one array, with the offsets of each session.
+    i.e. The tone times of the i-th session are tone_times[offsets[i]:offsets[i + 1]]
+    The first multiple of 1000 of each session is found with one binary search of all the multiples of 1000,
+    instead of looping through the tones of each session.
+
+    Args:
+        tone_times: Numpy Array
+            - The tone times of all the sessions. i.e. concatted_medpc_df["(S)CSpresentation"] sorted by file
+        offsets: Numpy Array
+            - The offsets of each session in tone_times. Has one more item than the number of sessions.
+            - Usually from get_file_path_partitions
+
+    Returns:
+        Numpy Array, Numpy Array
+            - The valid tone times of all the sessions, without NaNs and the multiples of 1000 with everything after them
+            - The offsets of each session in the valid tone times. The valid tones of the i-th session are 
+            valid_tone_times[valid_offsets[i]:valid_offsets[i + 1]]
+    """
+    tone_times = np.asarray(tone_times, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    session_starts, session_stops = offsets[:-1], offsets[1:]
+    # Only looking at the tones that are not NaN, which are usually a small part of the column
+    tone_positions = np.flatnonzero(~np.isnan(tone_times))
+    tone_positions = tone_positions[(tone_positions >= offsets[0]) & (tone_positions < offsets[-1])] if len(offsets) else tone_positions[:0]
+
+    # The cutoff of each session is the first multiple of 1000 in the session, or the end of the session
+    # np.fmod is much faster than % and gives the same zeros
+    max_tone_positions = tone_positions[np.fmod(tone_times[tone_positions], 1000) == 0]
+    next_max_tone_indexes = np.searchsorted(max_tone_positions, session_starts)
+    has_max_tone = next_max_tone_indexes < len(max_tone_positions)
+    cutoffs = session_stops.copy()
+    cutoffs[has_max_tone] = np.minimum(session_stops[has_max_tone], max_tone_positions[next_max_tone_indexes[has_max_tone]])
+
+    session_ids = np.searchsorted(offsets, tone_positions, side="right") - 1
+    valid_tone_positions = tone_positions[tone_positions < cutoffs[session_ids]]
+    valid_offsets = np.searchsorted(valid_tone_positions, offsets)
+    return tone_times[valid_tone_positions], valid_offsets
+
 def get_first_port_entries_after_tone(tone_pd_series, port_entries_pd_series, port_exits_pd_series):
     """
     From an array of times of tones being played and subject's entries to a port, 
@@ -119,6 +169,122 @@ def get_last_port_entries_before_tone(tone_pd_series, port_entries_pd_series, po
             print("Look over value {} at index {}".format(current_tone_time, index))
     return pd.DataFrame.from_dict(last_port_entry_dict, orient="index")
 
+def get_sorted_times(times):
+    """
+    Gets the times without NaNs and sorted from smallest to largest, so that they can be binary searched.
+
+    Args:
+        times: list, Numpy Array or Pandas Series
+            - Times of an event. i.e. port entries
+
+    Returns:
+        Numpy Array
+            - The sorted times without NaNs
+    """
+    times = np.asarray(times, dtype=np.float64)
+    return np.sort(times[~np.isnan(times)])
+
+def get_next_times(sorted_times, query_times, inclusive=True):
+    """
+    Gets the first time that is after each query time with a binary search.
+    This is the same as sorted_times[sorted_times >= query_time].min() for every query time, but without a loop.
+
+    Args:
+        sorted_times: Numpy Array
+            - Times sorted from smallest to largest without NaNs. Usually from get_sorted_times
+        query_times: Numpy Array
+            - The times to find the next time after
+        inclusive: bool
+            - Whether or not a time that is equal to the query time counts as the next time
+
+    Returns:
+        Numpy Array
+            - The next time for each query time. NaN if there is no next time or the query time is NaN.
+    """
+    query_times = np.asarray(query_times, dtype=np.float64)
+    next_indexes = np.searchsorted(sorted_times, query_times, side="left" if inclusive else "right")
+    has_next_time = (next_indexes < len(sorted_times)) & ~np.isnan(query_times)
+    next_times = np.full(len(query_times), np.nan)
+    next_times[has_next_time] = sorted_times[next_indexes[has_next_time]]
+    return next_times
+
+def get_previous_times(sorted_times, query_times, inclusive=True):
+    """
+    Gets the last time that is before each query time with a binary search.
+    This is the same as sorted_times[sorted_times <= query_time].max() for every query time, but without a loop.
+
+    Args:
+        sorted_times: Numpy Array
+            - Times sorted from smallest to largest without NaNs. Usually from get_sorted_times
+        query_times: Numpy Array
+            - The times to find the previous time before
+        inclusive: bool
+            - Whether or not a time that is equal to the query time counts as the previous time
+
+    Returns:
+        Numpy Array
+            - The previous time for each query time. NaN if there is no previous time or the query time is NaN.
+    """
+    query_times = np.asarray(query_times, dtype=np.float64)
+    previous_indexes = np.searchsorted(sorted_times, query_times, side="right" if inclusive else "left") - 1
+    has_previous_time = (previous_indexes >= 0) & ~np.isnan(query_times)
+    previous_times = np.full(len(query_times), np.nan)
+    previous_times[has_previous_time] = sorted_times[previous_indexes[has_previous_time]]
+    return previous_times
+
+def get_port_entry_times_around_tones(tone_times, port_entries, port_exits):
+    """
+    Finds the first port entry after, and the last port entry before every tone. Along with the port exit after each of those entries.
+    This is done for all the tones at once with binary searches of the sorted port entry and exit times.
+
+    Args:
+        tone_times: list, Numpy Array or Pandas Series
+            - All the times the tone is being played
+        port_entries: list, Numpy Array or Pandas Series
+            - All the times that the port is being entered
+        port_exits: list, Numpy Array or Pandas Series
+            - All the times that the port is being exited
+    Returns: 
+        dict
+            - The column name as the key, and a Numpy Array with a value for each tone as the value.
+            The columns are the same as get_first_port_entries_after_tone and get_last_port_entries_before_tone
+    """
+    sorted_port_entries = get_sorted_times(times=port_entries)
+    sorted_port_exits = get_sorted_times(times=port_exits)
+    tone_times = np.asarray(tone_times, dtype=np.float64)
+
+    first_port_entry_after_tone = get_next_times(sorted_times=sorted_port_entries, query_times=tone_times, inclusive=True)
+    last_port_entry_before_tone = get_previous_times(sorted_times=sorted_port_entries, query_times=tone_times, inclusive=True)
+    return {
+        "current_tone_time": tone_times, 
+        "first_port_entry_after_tone": first_port_entry_after_tone,
+        "port_exit_after_first_port_entry_after_tone": get_next_times(sorted_times=sorted_port_exits, \
+            query_times=first_port_entry_after_tone, inclusive=False),
+        "last_port_entry_before_tone": last_port_entry_before_tone,
+        "port_exit_after_last_port_entry_before_tone": get_next_times(sorted_times=sorted_port_exits, \
+            query_times=last_port_entry_before_tone, inclusive=False)
+        }
+
+def get_port_entries_around_tones(tone_pd_series, port_entries_pd_series, port_exits_pd_series):
+    """
+    Finds the first port entry after, and the last port entry before every tone. Along with the port exit after each of those entries.
+    This gives the same columns as get_first_port_entries_after_tone and get_last_port_entries_before_tone,
+    but does it for all the tones at once with binary searches of the sorted port entry and exit times.
+
+    Args:
+        tone_pd_series: Pandas Series
+            - All the times the tone is being played
+        port_entries_pd_series: Pandas Series
+            - All the times that the port is being entered
+        port_exits_pd_series: Pandas Series
+            - All the times that the port is being exited
+    Returns: 
+        Pandas DataFrame
+            - A dataframe of tone times to the first port entry after and the last port entry before, with the same index as tone_pd_series
+    """
+    return pd.DataFrame(get_port_entry_times_around_tones(tone_times=tone_pd_series, port_entries=port_entries_pd_series, \
+        port_exits=port_exits_pd_series), index=tone_pd_series.index)
+
 def get_concatted_first_porty_entry_after_tone_dataframe(concatted_medpc_df, tone_time_column="(S)CSpresentation", \
         port_entry_column="(P)Portentry", port_exit_column="(N)Portexit", subject_column="subject", date_column="date", \
         stop_with_error=False):
@@ -150,14 +316,17 @@ def get_concatted_first_porty_entry_after_tone_dataframe(concatted_medpc_df, ton
     """
     # List to combine all the Data Frames at the end
     all_first_port_entry_df = []
-    for file_path in concatted_medpc_df["file_path"].unique():
-        current_file_df = concatted_medpc_df[concatted_medpc_df["file_path"] == file_path]
+    # Splitting up the dataframe by file once, instead of filtering the whole dataframe for each file
+    for file_path, current_file_df in concatted_medpc_df.groupby("file_path", sort=False):
         valid_tones = get_valid_tones(tone_pd_series=current_file_df[tone_time_column])
         # Sometimes the valid tones do not exist because it was a test recording
         if not valid_tones.empty:
             # All the first port entries for each tone            
-            first_port_entry_df = get_first_port_entries_after_tone(tone_pd_series=valid_tones, \
-                port_entries_pd_series=current_file_df[port_entry_column], port_exits_pd_series=current_file_df[port_exit_column])
+            with profile_stage("processing.tone.first_port_entries_after_tone", file_path=file_path) as stage_record:
+                first_port_entry_df = get_first_port_entries_after_tone(tone_pd_series=valid_tones, \
+                    port_entries_pd_series=current_file_df[port_entry_column], port_exits_pd_series=current_file_df[port_exit_column])
+                stage_record["rows"] = len(current_file_df)
+                stage_record["events"] = len(valid_tones)
             # Adding the metadata as columns
             first_port_entry_df["file_path"] = file_path
             # Making sure that there is only one date and subject for all the rows
@@ -208,14 +377,17 @@ def get_concatted_last_porty_entry_before_tone_dataframe(concatted_medpc_df, ton
     """
     # List to combine all the Data Frames at the end
     all_last_port_entry_df = []
-    for file_path in concatted_medpc_df["file_path"].unique():
-        current_file_df = concatted_medpc_df[concatted_medpc_df["file_path"] == file_path]
+    # Splitting up the dataframe by file once, instead of filtering the whole dataframe for each file
+    for file_path, current_file_df in concatted_medpc_df.groupby("file_path", sort=False):
         valid_tones = get_valid_tones(tone_pd_series=current_file_df[tone_time_column])
         # Sometimes the valid tones do not exist because it was a test recording
         if not valid_tones.empty:
             # All the first port entries for each tone            
-            last_port_entry_df = get_last_port_entries_before_tone(tone_pd_series=valid_tones, \
-                port_entries_pd_series=current_file_df[port_entry_column], port_exits_pd_series=current_file_df[port_exit_column])
+            with profile_stage("processing.tone.last_port_entries_before_tone", file_path=file_path) as stage_record:
+                last_port_entry_df = get_last_port_entries_before_tone(tone_pd_series=valid_tones, \
+                    port_entries_pd_series=current_file_df[port_entry_column], port_exits_pd_series=current_file_df[port_exit_column])
+                stage_record["rows"] = len(current_file_df)
+                stage_record["events"] = len(valid_tones)
             # Adding the metadata as columns
             last_port_entry_df["file_path"] = file_path
             # Making sure that there is only one date and subject for all the rows
@@ -235,6 +407,273 @@ def get_concatted_last_porty_entry_before_tone_dataframe(concatted_medpc_df, ton
     # Index repeats itself because it is concatenated with multiple dataframes
     return pd.concat(all_last_port_entry_df).reset_index(drop="True")
 
+def get_file_path_partitions(concatted_medpc_df, file_path_column="file_path"):
+    """
+    Groups the rows of a concatenated dataframe by file path with one sort, instead of filtering the whole dataframe for each file.
+    The rows of the i-th file are at the positions row_order[offsets[i]:offsets[i + 1]].
+
+    Args:
+        concatted_medpc_df: Pandas Dataframe 
+            - Output of extract.dataframe.get_medpc_dataframe_from_list_of_files
+        file_path_column: str
+            - Name of the column of concatted_medpc_df that has the path of the file of each row
+
+    Returns:
+        Numpy Array, Numpy Array, Numpy Array
+            - The unique file paths in the order that they first appear
+            - The positions of the rows sorted by file, keeping the original order within each file
+            - The offsets of each file in the row positions. Has one more item than the number of files.
+    """
+    file_path_codes, file_paths = pd.factorize(concatted_medpc_df[file_path_column])
+    row_order = np.argsort(file_path_codes, kind="stable")
+    # Rows without a file path have a code of -1, so they are sorted before the first offset and left out
+    offsets = np.searchsorted(file_path_codes[row_order], np.arange(len(file_paths) + 1))
+    return np.asarray(file_paths), row_order, offsets
+
+def get_port_entries_and_latencies_from_session_times(session_df, tone_times, tone_offsets, port_entries, port_entry_offsets, \
+        port_exits, port_exit_offsets, file_path_column="file_path", stop_with_error=False):
+    """
+    Creates one dataframe with the first port entry after and the last port entry before every tone, and the latency to the first entry.
+    The times of all the sessions are in one array for each event, with the offsets of each session.
+    i.e. The tone times of the i-th session are tone_times[tone_offsets[i]:tone_offsets[i + 1]]
+
+    Args:
+        session_df: Pandas DataFrame
+            - A row for each session, with the file path and any other columns(i.e. date and subject) to add to every tone of the session
+        tone_times: Numpy Array
+            - The tone times of all the sessions. The valid tones of each session are found with get_valid_tone_offsets.
+        tone_offsets: Numpy Array
+            - The offsets of each session in tone_times. Has one more item than the number of sessions.
+        port_entries: Numpy Array
+            - The port entry times of all the sessions
+        port_entry_offsets: Numpy Array
+            - The offsets of each session in port_entries
+        port_exits: Numpy Array
+            - The port exit times of all the sessions
+        port_exit_offsets: Numpy Array
+            - The offsets of each session in port_exits
+        file_path_column: str
+            - Name of the column of session_df that has the path of the file of each session
+        stop_with_error: bool
+            - Flag to terminate the program when an error is raised.
+            - Sometimes recordings can be for testing and don't include any valid tone times
+
+    Returns: 
+        Pandas Dataframe
+            - A row for each valid tone of each session. With the columns of get_port_entries_around_tones, 
+            the columns of session_df and the latency from the tone to the first port entry after it.
+    """
+    with profile_stage("processing.tone.valid_tone_offsets") as stage_record:
+        valid_tone_times, valid_tone_offsets = get_valid_tone_offsets(tone_times=tone_times, offsets=tone_offsets)
+        stage_record["rows"] = len(tone_times)
+        stage_record["events"] = len(valid_tone_times)
+    # Lists of the column arrays of each session to combine them all at the end
+    column_to_all_arrays = defaultdict(list)
+    with profile_stage("processing.tone.port_entries_around_tones") as stage_record:
+        for session_index, file_path in enumerate(session_df[file_path_column].to_numpy()):
+            valid_tones = valid_tone_times[valid_tone_offsets[session_index]:valid_tone_offsets[session_index + 1]]
+            # Sometimes the valid tones do not exist because it was a test recording
+            if len(valid_tones) == 0:
+                if stop_with_error:
+                    raise ValueError("No valid tones for {}".format(file_path))
+                print("No valid tones for {}".format(file_path))
+                continue
+
+            for column, values in get_port_entry_times_around_tones(tone_times=valid_tones, \
+                    port_entries=port_entries[port_entry_offsets[session_index]:port_entry_offsets[session_index + 1]], \
+                    port_exits=port_exits[port_exit_offsets[session_index]:port_exit_offsets[session_index + 1]]).items():
+                column_to_all_arrays[column].append(values)
+            for column in session_df.columns:
+                column_to_all_arrays[column].append(np.repeat(session_df[column].iloc[session_index], len(valid_tones)))
+        stage_record["rows"] = len(port_entries) + len(port_exits)
+        stage_record["events"] = len(valid_tone_times)
+
+    if not column_to_all_arrays:
+        raise ValueError("No valid tones for any of the files")
+    port_entries_and_latencies_df = pd.DataFrame({column: np.concatenate(all_arrays) for column, all_arrays in column_to_all_arrays.items()})
+    port_entries_and_latencies_df["latency"] = port_entries_and_latencies_df["first_port_entry_after_tone"] - port_entries_and_latencies_df["current_tone_time"]
+    return port_entries_and_latencies_df
+
+def get_single_value_of_each_session(values, row_order, offsets):
+    """
+    Gets the value of a column that should be the same for every row of a session. i.e. The date or the subject.
+    This is checked for all the sessions at once by comparing the smallest and largest code of the values of each session.
+
+    Args:
+        values: Pandas Series
+            - The column of the concatenated dataframe
+        row_order: Numpy Array
+            - The positions of the rows sorted by session. Usually from get_file_path_partitions
+        offsets: Numpy Array
+            - The offsets of each session in the row positions. Usually from get_file_path_partitions
+
+    Returns:
+        Numpy Array, Numpy Array
+            - The value of each session. NaN if the session has more than one value.
+            - Whether or not each session has only one value
+    """
+    number_of_sessions = len(offsets) - 1
+    session_values = np.full(number_of_sessions, np.nan, dtype=object)
+    if number_of_sessions == 0:
+        return session_values, np.zeros(0, dtype=bool)
+    # NaNs have a code of -1
+    value_codes, unique_values = pd.factorize(values)
+    value_codes = value_codes[row_order]
+    smallest_codes = np.minimum.reduceat(value_codes, offsets[:-1])
+    has_single_value = smallest_codes == np.maximum.reduceat(value_codes, offsets[:-1])
+    has_value = has_single_value & (smallest_codes >= 0)
+    session_values[has_value] = np.asarray(unique_values, dtype=object)[smallest_codes[has_value]]
+    return session_values, has_single_value
+
+def get_concatted_port_entries_and_latencies_dataframe(concatted_medpc_df, tone_time_column="(S)CSpresentation", \
+        port_entry_column="(P)Portentry", port_exit_column="(N)Portexit", subject_column="subject", date_column="date", \
+        stop_with_error=False):
+    """
+    Creates one dataframe with the first port entry after and the last port entry before every tone, and the latency to the first entry.
+    Along with the corresponding metadata of the path of the file, the date, and the subject.
+    This combines get_concatted_first_porty_entry_after_tone_dataframe and get_concatted_last_porty_entry_before_tone_dataframe,
+    and the latency that is calculated after merging them. But the dataframe is only split up by file once, 
+    and each file is processed with NumPy arrays. So the run time grows linearly with the number of files.
+
+    Args:
+        concatted_medpc_df: Pandas Dataframe 
+            - Output of extract.dataframe.get_medpc_dataframe_from_list_of_files
+            - Includes tone playing time, port entry time, subject, and date for each recording session
+        tone_time_column: str
+            - Name of the column of concatted_medpc_df that has the array of tone times
+        port_entry_column: str
+            - Name of the column of concatted_medpc_df that has the array port entry times
+        port_exit_column: str
+            - Name of the column of concatted_medpc_df that has the array port exit times
+        subject_column: str
+            - Name of the column of concatted_medpc_df that has the subject's ID
+        date_column: str
+            - Name of the column of concatted_medpc_df that has the date of the recording
+        stop_with_error: bool
+            - Flag to terminate the program when an error is raised.
+            - Sometimes recordings can be for testing and don't include any valid tone times
+    
+    Returns: 
+        Pandas Dataframe
+            - A row for each valid tone of each file. With the columns of get_port_entries_around_tones, 
+            the file path, date, subject and the latency from the tone to the first port entry after it.
+    """
+    with profile_stage("processing.tone.file_path_partitions") as stage_record:
+        file_paths, row_order, offsets = get_file_path_partitions(concatted_medpc_df=concatted_medpc_df)
+        stage_record["rows"] = len(concatted_medpc_df)
+    session_dates, has_single_date = get_single_value_of_each_session(values=concatted_medpc_df[date_column], row_order=row_order, offsets=offsets)
+    session_subjects, has_single_subject = get_single_value_of_each_session(values=concatted_medpc_df[subject_column], \
+        row_order=row_order, offsets=offsets)
+    # Making sure that there is only one date and subject for all the rows
+    for file_path in file_paths[~(has_single_date & has_single_subject)]:
+        if stop_with_error:
+            raise ValueError("More then one date or subject in {}".format(file_path))
+        print("More then one date or subject in {}".format(file_path))
+    session_dates[~(has_single_date & has_single_subject)] = np.nan
+    session_subjects[~(has_single_date & has_single_subject)] = np.nan
+    session_df = pd.DataFrame({"file_path": file_paths, date_column: pd.Series(session_dates, dtype=object), \
+        subject_column: pd.Series(session_subjects, dtype=object)})
+
+    return get_port_entries_and_latencies_from_session_times(session_df=session_df, \
+        tone_times=concatted_medpc_df[tone_time_column].to_numpy(dtype=np.float64)[row_order], tone_offsets=offsets, \
+        port_entries=concatted_medpc_df[port_entry_column].to_numpy(dtype=np.float64)[row_order], port_entry_offsets=offsets, \
+        port_exits=concatted_medpc_df[port_exit_column].to_numpy(dtype=np.float64)[row_order], port_exit_offsets=offsets, \
+        stop_with_error=stop_with_error)
+
+def get_port_entries_and_latencies_from_event_table(event_df, session_df, tone_variable="(S)CSpresentation", \
+        port_entry_variable="(P)Portentry", port_exit_variable="(N)Portexit", ticks_per_second=DEFAULT_TICKS_PER_SECOND, \
+        file_path_column="file_path", stop_with_error=False):
+    """
+    Same as get_concatted_port_entries_and_latencies_dataframe, but with the event table of extract.events instead of the wide dataframe.
+
+    Args:
+        event_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        session_df: Pandas DataFrame
+            - Output of extract.events.get_event_table_from_medpc_dataframe
+        tone_variable: str
+            - Name of the variable of the tone times
+        port_entry_variable: str
+            - Name of the variable of the port entry times
+        port_exit_variable: str
+            - Name of the variable of the port exit times
+        ticks_per_second: int or None
+            - The ticks per second that the event table was made with. None if the times are in seconds.
+        file_path_column: str
+            - Name of the column of session_df that has the path of the file of each session
+        stop_with_error: bool
+            - Flag to terminate the program when an error is raised.
+
+    Returns: 
+        Pandas Dataframe
+            - A row for each valid tone of each session. With the columns of get_port_entries_around_tones, 
+            the columns of session_df and the latency from the tone to the first port entry after it.
+    """
+    variable_to_times_and_offsets = {variable: get_session_event_times(event_df=event_df, variable=variable, \
+        number_of_sessions=len(session_df), ticks_per_second=ticks_per_second) \
+        for variable in [tone_variable, port_entry_variable, port_exit_variable]}
+    tone_times, tone_offsets = variable_to_times_and_offsets[tone_variable]
+    port_entries, port_entry_offsets = variable_to_times_and_offsets[port_entry_variable]
+    port_exits, port_exit_offsets = variable_to_times_and_offsets[port_exit_variable]
+    return get_port_entries_and_latencies_from_session_times(session_df=session_df.reset_index(drop=True), tone_times=tone_times, \
+        tone_offsets=tone_offsets, port_entries=port_entries, port_entry_offsets=port_entry_offsets, port_exits=port_exits, \
+        port_exit_offsets=port_exit_offsets, file_path_column=file_path_column, stop_with_error=stop_with_error)
+
+def get_port_entries_and_latencies_from_memory_map(memory_map_directory, tone_variable="(S)CSpresentation", \
+        port_entry_variable="(P)Portentry", port_exit_variable="(N)Portexit", chunk_size=1000, file_path_column="file_path", \
+        stop_with_error=False):
+    """
+    Same as get_concatted_port_entries_and_latencies_dataframe, but with the memory-mapped arrays of extract.memory_map.
+    The times are read for a chunk of sessions at a time, so only the output dataframe grows with the number of sessions.
+
+    Args:
+        memory_map_directory: str
+            - The directory that extract.memory_map.save_memory_mapped_medpc_files saved to
+        tone_variable: str
+            - Name of the variable of the tone times
+        port_entry_variable: str
+            - Name of the variable of the port entry times
+        port_exit_variable: str
+            - Name of the variable of the port exit times
+        chunk_size: int
+            - The number of sessions that are read at a time
+        file_path_column: str
+            - Name of the column of the session dataframe that has the path of the file of each session
+        stop_with_error: bool
+            - Flag to terminate the program when an error is raised.
+
+    Returns: 
+        Pandas Dataframe
+            - A row for each valid tone of each session. With the columns of get_port_entries_around_tones, 
+            the columns of the session dataframe and the latency from the tone to the first port entry after it.
+    """
+    session_df, name_to_arrays, ticks_per_second = load_memory_mapped_arrays(memory_map_directory=memory_map_directory)
+    session_df = session_df.reset_index(drop=True)
+    all_port_entries_and_latencies_df = []
+    for chunk_start in range(0, len(session_df), chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, len(session_df))
+        variable_to_times_and_offsets = {variable: get_memory_mapped_session_times(name_to_arrays=name_to_arrays, name=variable, \
+            first_session=chunk_start, last_session=chunk_stop, ticks_per_second=ticks_per_second) \
+            for variable in [tone_variable, port_entry_variable, port_exit_variable]}
+        tone_times, tone_offsets = variable_to_times_and_offsets[tone_variable]
+        port_entries, port_entry_offsets = variable_to_times_and_offsets[port_entry_variable]
+        port_exits, port_exit_offsets = variable_to_times_and_offsets[port_exit_variable]
+        # Chunks of only test recordings are skipped, instead of raising an error for having no valid tones
+        if len(get_valid_tone_offsets(tone_times=tone_times, offsets=tone_offsets)[0]) == 0:
+            for file_path in session_df[file_path_column].iloc[chunk_start:chunk_stop]:
+                if stop_with_error:
+                    raise ValueError("No valid tones for {}".format(file_path))
+                print("No valid tones for {}".format(file_path))
+            continue
+        all_port_entries_and_latencies_df.append(get_port_entries_and_latencies_from_session_times( \
+            session_df=session_df.iloc[chunk_start:chunk_stop], tone_times=tone_times, tone_offsets=tone_offsets, \
+            port_entries=port_entries, port_entry_offsets=port_entry_offsets, port_exits=port_exits, \
+            port_exit_offsets=port_exit_offsets, file_path_column=file_path_column, stop_with_error=stop_with_error))
+
+    if not all_port_entries_and_latencies_df:
+        raise ValueError("No valid tones for any of the files")
+    return pd.concat(all_port_entries_and_latencies_df, ignore_index=True)
+
 def main():
     """
     Main function that runs when the script is run
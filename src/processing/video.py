@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Functions for syncing the MED-PC recordings with the videos of the sessions, and cutting out a clip around each CS.
+The CS times of day are saved by MED-PC in the (G), (H) and (I) arrays, and the time that the video started
+is the first row of the timestamp CSV that is saved with each video. The CS times in the video are the difference between the two.
+
+The clips are cut with ffmpeg. All the clips of a video are cut in one pass over the video,
+and the video is copied instead of re-encoded. With stream copying, a clip can only start on a keyframe,
+so each clip starts at the last keyframe at or before its start time. Different videos are cut on different processes.
+
+Usage:
+    cs_time_df = get_cs_times_of_day(concatted_medpc_df)
+    video_df = pd.DataFrame({"file_path": [...], "video_path": [...], "timestamp_path": [...]})
+    cs_offset_df = get_cs_video_offsets(cs_time_df=cs_time_df, video_df=video_df)
+    clip_df = get_clip_table(cs_offset_df=cs_offset_df, output_directory="./clips")
+    clip_df = extract_all_clips(clip_df=clip_df, number_of_workers=4)
+"""
+from functools import partial
+import os
+import re
+import shutil
+import subprocess
+import numpy as np
+import pandas as pd
+from extract.parallel import map_in_order
+
+# The columns of the hours, minutes and seconds of the time of day of each CS
+CS_TIME_COLUMNS = {"hour": "(I)CS_hourspresentation", "minute": "(H)CS_minutespresentation", "second": "(G)CS_secondspresentation"}
+# The number of seconds in a day, for CS times that are after midnight when the video started before midnight
+SECONDS_PER_DAY = 24 * 60 * 60
+# Pattern of the presentation time of each frame that the showinfo filter of ffmpeg prints
+PTS_TIME_PATTERN = re.compile(r"pts_time:\s*([-\d.]+)")
+
+def get_ffmpeg_executable():
+    """
+    Gets the path of the ffmpeg executable.
+    Uses the ffmpeg on the PATH, and otherwise the one that is installed with moviepy(through imageio-ffmpeg).
+
+    Returns:
+        str
+            - The path of the ffmpeg executable
+    """
+    ffmpeg_executable = shutil.which("ffmpeg")
+    if ffmpeg_executable is not None:
+        return ffmpeg_executable
+    try:
+        import imageio_ffmpeg
+    except ImportError:
+        raise ValueError("ffmpeg was not found. Install ffmpeg or moviepy.")
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+def get_cs_times_of_day(concatted_medpc_df, hour_column=CS_TIME_COLUMNS["hour"], minute_column=CS_TIME_COLUMNS["minute"], \
+        second_column=CS_TIME_COLUMNS["second"], file_path_column="file_path"):
+    """
+    Gets the time of day of every CS of every session from the hours, minutes and seconds arrays.
+    This is done for all the rows at once, instead of joining strings and parsing them with strptime row by row.
+    Rows where the hours, minutes and seconds are all 0 or NaN are removed, because MED-PC fills the unused part of an array with zeros.
+
+    Args:
+        concatted_medpc_df: Pandas Dataframe
+            - Output of extract.dataframe.get_medpc_dataframe_from_list_of_files
+        hour_column: str
+            - Name of the column of the hour of each CS
+        minute_column: str
+            - Name of the column of the minute of each CS
+        second_column: str
+            - Name of the column of the second of each CS
+        file_path_column: str
+            - Name of the column that has the path of the file of each row
+
+    Returns:
+        Pandas DataFrame
+            - A row for each CS, with the file path, date and subject of the session,
+            the number of the CS in its session(starting at 1) and the "cs_time"(Pandas Timedelta since midnight)
+    """
+    hours = concatted_medpc_df[hour_column].to_numpy(dtype=np.float64)
+    minutes = concatted_medpc_df[minute_column].to_numpy(dtype=np.float64)
+    seconds = concatted_medpc_df[second_column].to_numpy(dtype=np.float64)
+    seconds_of_day = hours * 3600 + minutes * 60 + seconds
+    is_cs = ~np.isnan(seconds_of_day) & ((hours != 0) | (minutes != 0) | (seconds != 0))
+
+    session_columns = [column for column in [file_path_column, "date", "subject"] if column in concatted_medpc_df.columns]
+    cs_time_df = concatted_medpc_df.loc[is_cs, session_columns].reset_index(drop=True)
+    cs_time_df["cs_number"] = cs_time_df.groupby(file_path_column, sort=False).cumcount() + 1
+    cs_time_df["cs_time"] = pd.to_timedelta(seconds_of_day[is_cs], unit="s")
+    return cs_time_df
+
+def get_video_start_time_of_day(timestamp_file_path, time_column=1):
+    """
+    Gets the time of day that a video started being recorded, from the first row of its timestamp CSV.
+    i.e. "2022-07-01 12:48:15.1234567" becomes 12:48:15.1234567
+
+    Args:
+        timestamp_file_path: str
+            - The path of the CSV with the timestamp of each frame, without a header
+        time_column: int
+            - The column of the CSV that has the timestamps
+
+    Returns:
+        Pandas Timedelta
+            - The time since midnight that the video started
+    """
+    first_timestamp = pd.read_csv(timestamp_file_path, header=None, nrows=1)[time_column].iloc[0]
+    return pd.to_timedelta(str(first_timestamp).split()[-1])
+
+def get_cs_video_offsets(cs_time_df, video_df, file_path_column="file_path"):
+    """
+    Gets the time in the video of every CS, for all the sessions at once.
+
+    Args:
+        cs_time_df: Pandas DataFrame
+            - Output of processing.video.get_cs_times_of_day
+        video_df: Pandas DataFrame
+            - A row for each video, with the file path of the MED-PC file of the session and the "video_path" column.
+            - Along with either the "video_start_time"(Pandas Timedelta since midnight)
+            or the "timestamp_path" column to read the start time from.
+        file_path_column: str
+            - Name of the column that has the path of the MED-PC file in both dataframes
+
+    Returns:
+        Pandas DataFrame
+            - cs_time_df with the columns of video_df, and the "cs_offset"(seconds from the start of the video) of each CS.
+            Only the CSs of sessions that have a video are kept.
+    """
+    video_df = video_df.copy()
+    if "video_start_time" not in video_df.columns:
+        video_df["video_start_time"] = [get_video_start_time_of_day(timestamp_file_path) for timestamp_file_path in video_df["timestamp_path"]]
+    cs_offset_df = cs_time_df.merge(video_df, on=file_path_column, how="inner")
+    cs_offsets = (cs_offset_df["cs_time"] - pd.to_timedelta(cs_offset_df["video_start_time"])).dt.total_seconds().to_numpy()
+    # CSs after midnight of videos that started before midnight
+    cs_offset_df["cs_offset"] = np.where(cs_offsets < -SECONDS_PER_DAY / 2, cs_offsets + SECONDS_PER_DAY, cs_offsets)
+    return cs_offset_df
+
+def get_clip_table(cs_offset_df, output_directory, seconds_before_cs=0, clip_duration=None, seconds_after_next_cs=20, \
+        video_extension=None):
+    """
+    Gets the start and stop of the clip of each CS in its video, for all the videos at once.
+    By default, the same as notebook 04: each clip goes from its CS to 20 seconds after the next CS, and the last clip goes to the end of the video.
+
+    Args:
+        cs_offset_df: Pandas DataFrame
+            - Output of processing.video.get_cs_video_offsets
+        output_directory: str
+            - The directory that the clips are saved to
+        seconds_before_cs: float
+            - The number of seconds before the CS that the clip starts
+        clip_duration: float
+            - The length of each clip in seconds. None makes each clip go until seconds_after_next_cs after the next CS.
+        seconds_after_next_cs: float
+            - The number of seconds after the next CS that each clip stops, when clip_duration is None
+        video_extension: str
+            - The extension of the clips. i.e. ".mp4". None uses the extension of each video.
+
+    Returns:
+        Pandas DataFrame
+            - cs_offset_df with the "clip_start" and "clip_stop" seconds(NaN for the end of the video) and the "clip_path" of each clip.
+            CSs from before the video started are removed.
+    """
+    clip_df = cs_offset_df.sort_values(["video_path", "cs_offset"], kind="stable").reset_index(drop=True)
+    clip_df["clip_start"] = np.maximum(clip_df["cs_offset"] - seconds_before_cs, 0)
+    if clip_duration is None:
+        clip_df["clip_stop"] = clip_df.groupby("video_path", sort=False)["cs_offset"].shift(-1) + seconds_after_next_cs
+    else:
+        clip_df["clip_stop"] = clip_df["clip_start"] + clip_duration
+    clip_df = clip_df[clip_df["cs_offset"] >= 0].reset_index(drop=True)
+
+    clip_paths = []
+    for video_path, cs_number in zip(clip_df["video_path"], clip_df["cs_number"]):
+        video_name, extension = os.path.splitext(os.path.basename(video_path))
+        clip_paths.append(os.path.join(output_directory, "{}_cs{:02d}{}".format(video_name, cs_number, video_extension or extension)))
+    clip_df["clip_path"] = clip_paths
+    return clip_df
+
+def get_keyframe_times(video_path, ffmpeg_executable=None):
+    """
+    Gets the time of every keyframe of the first video stream. Only the keyframes are decoded, so this is much faster than reading the video.
+
+    Args:
+        video_path: str
+            - The path of the video
+        ffmpeg_executable: str
+            - The path of the ffmpeg executable. None uses processing.video.get_ffmpeg_executable
+
+    Returns:
+        Numpy Array
+            - The sorted time of each keyframe in seconds
+    """
+    ffmpeg_executable = ffmpeg_executable or get_ffmpeg_executable()
+    ffmpeg_output = subprocess.run([ffmpeg_executable, "-hide_banner", "-nostdin", "-skip_frame", "nokey", "-i", video_path, \
+        "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"], capture_output=True, text=True, check=True).stderr
+    return np.sort(np.array(PTS_TIME_PATTERN.findall(ffmpeg_output), dtype=np.float64))
+
+def get_clip_command(video_path, clip_df, ffmpeg_executable, keyframe_times=None, stream_copy=True):
+    """
+    Gets the ffmpeg command that cuts all the clips of a video in one pass over the video.
+    The video is read once, and each clip is a separate output of the same command.
+
+    Args:
+        video_path: str
+            - The path of the video
+        clip_df: Pandas DataFrame
+            - The rows of the output of processing.video.get_clip_table for this video
+        ffmpeg_executable: str
+            - The path of the ffmpeg executable
+        keyframe_times: Numpy Array
+            - Output of processing.video.get_keyframe_times. Each clip starts at the last keyframe at or before its start.
+            - None starts the clips at the exact start times, which can make the first frames of a stream copied clip unreadable.
+        stream_copy: bool
+            - Whether to copy the video and audio instead of re-encoding them. Re-encoding cuts exactly, but takes much longer.
+
+    Returns:
+        list
+            - The ffmpeg command
+    """
+    clip_starts = clip_df["clip_start"].to_numpy(dtype=np.float64)
+    if keyframe_times is not None and len(keyframe_times):
+        keyframe_indexes = np.searchsorted(keyframe_times, clip_starts + 1e-6, side="right") - 1
+        clip_starts = np.where(keyframe_indexes >= 0, keyframe_times[np.maximum(keyframe_indexes, 0)], clip_starts)
+    clip_durations = clip_df["clip_stop"].to_numpy(dtype=np.float64) - clip_starts
+
+    command = [ffmpeg_executable, "-hide_banner", "-nostdin", "-loglevel", "error", "-y", "-i", video_path]
+    for clip_start, clip_duration, clip_path in zip(clip_starts, clip_durations, clip_df["clip_path"]):
+        # Starting a little before the keyframe, so that rounding doesn't drop the keyframe
+        command += ["-map", "0", "-ss", "{:.3f}".format(max(clip_start - 0.001, 0))]
+        if not np.isnan(clip_duration):
+            command += ["-t", "{:.3f}".format(clip_duration + 0.001)]
+        if stream_copy:
+            command += ["-c", "copy", "-avoid_negative_ts", "make_zero"]
+        command.append(clip_path)
+    return command
+
+def extract_clips_from_video(video_path, clip_df, stream_copy=True, ffmpeg_executable=None):
+    """
+    Cuts all the clips of one video in one pass over the video.
+
+    Args:
+        video_path: str
+            - The path of the video
+        clip_df: Pandas DataFrame
+            - The rows of the output of processing.video.get_clip_table for this video
+        stream_copy: bool
+            - Whether to copy the video and audio instead of re-encoding them
+        ffmpeg_executable: str
+            - The path of the ffmpeg executable. None uses processing.video.get_ffmpeg_executable
+
+    Returns:
+        str or None
+            - The error message of ffmpeg. None if all the clips were cut.
+    """
+    ffmpeg_executable = ffmpeg_executable or get_ffmpeg_executable()
+    try:
+        keyframe_times = get_keyframe_times(video_path=video_path, ffmpeg_executable=ffmpeg_executable) if stream_copy else None
+        subprocess.run(get_clip_command(video_path=video_path, clip_df=clip_df, ffmpeg_executable=ffmpeg_executable, \
+            keyframe_times=keyframe_times, stream_copy=stream_copy), capture_output=True, text=True, check=True)
+    except subprocess.CalledProcessError as error:
+        return error.stderr
+    return None
+
+def extract_clips_from_video_group(video_group, stream_copy=True, ffmpeg_executable=None):
+    """
+    Same as extract_clips_from_video, but with the video path and the clips as one item, so that it can be mapped on a pool.
+
+    Args:
+        video_group: tuple
+            - The path of the video, and the rows of the output of processing.video.get_clip_table for the video
+        stream_copy: bool
+            - Whether to copy the video and audio instead of re-encoding them
+        ffmpeg_executable: str
+            - The path of the ffmpeg executable. None uses processing.video.get_ffmpeg_executable
+
+    Returns:
+        str or None
+            - The error message of ffmpeg. None if all the clips were cut.
+    """
+    video_path, clip_df = video_group
+    return extract_clips_from_video(video_path=video_path, clip_df=clip_df, stream_copy=stream_copy, ffmpeg_executable=ffmpeg_executable)
+
+def extract_all_clips(clip_df, stream_copy=True, number_of_workers=1, stop_with_error=False):
+    """
+    Cuts the clips of every video. Each video is read once, and different videos are cut on different processes.
+    Most of the time is spent reading and writing the videos, so more workers than the number of disks doesn't help much.
+
+    Args:
+        clip_df: Pandas DataFrame
+            - Output of processing.video.get_clip_table
+        stream_copy: bool
+            - Whether to copy the video and audio instead of re-encoding them
+        number_of_workers: int or None
+            - The number of videos that are cut at the same time. None uses the number of CPUs on the computer.
+        stop_with_error: bool
+            - Flag to terminate the program when a video can't be cut
+
+    Returns:
+        Pandas DataFrame
+            - clip_df with whether or not the clip was cut in the "is_extracted" column
+    """
+    for output_directory in set([os.path.dirname(clip_path) for clip_path in clip_df["clip_path"]]):
+        os.makedirs(output_directory or ".", exist_ok=True)
+    video_groups = list(clip_df.groupby("video_path", sort=False))
+    extract_video_group = partial(extract_clips_from_video_group, stream_copy=stream_copy, ffmpeg_executable=get_ffmpeg_executable())
+
+    clip_df = clip_df.copy()
+    clip_df["is_extracted"] = True
+    for (video_path, _), error_message in zip(video_groups, map_in_order(extract_video_group, video_groups, \
+            number_of_workers=number_of_workers)):
+        if error_message is None:
+            continue
+        print(error_message)
+        if stop_with_error:
+            raise ValueError("Clips could not be cut from video: {}".format(video_path))
+        print("Clips could not be cut from video: {}".format(video_path))
+        clip_df.loc[clip_df["video_path"] == video_path, "is_extracted"] = False
+    return clip_df
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+
+if __name__ == '__main__':
+    main()
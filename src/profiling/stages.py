@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Functions for recording how long each stage of extracting and processing MED-PC files takes.
+Profiling is off by default, and each stage only checks one flag when it is off, so it can be left in the code.
+When it is on, every stage records its wall time, the number of rows or events that it processed,
+and optionally the memory that it allocated. The records can be saved as a JSON or CSV report.
+
+Usage:
+    profiling.stages.enable_profiling(trace_memory=True)
+    concatted_medpc_df = extract.dataframe.get_medpc_dataframe_from_list_of_files(medpc_files=all_med_pc_file)
+    profiling.stages.save_profiling_report("./profiling_report.csv")
+    profiling.stages.get_stage_summary()
+
+Stages that run in worker processes(i.e. with number_of_workers > 1) are recorded in the worker,
+and extract.parallel.map_in_order sends the records back with the output of each item. So a report has the stages of every file
+no matter how many workers are used. The process ID of each record tells which process ran it.
+"""
+from contextlib import contextmanager
+import json
+import os
+import time
+import tracemalloc
+import pandas as pd
+
+# Whether or not the stages are recorded, and whether or not the memory is traced
+PROFILING_SETTINGS = {"enabled": False, "trace_memory": False}
+# The records of all the stages since profiling was enabled
+STAGE_RECORDS = []
+# The records of the stages that are running right now, from the outermost to the innermost stage
+RUNNING_STAGE_RECORDS = []
+
+def enable_profiling(trace_memory=False, clear_records=True):
+    """
+    Starts recording the stages.
+
+    Args:
+        trace_memory: bool
+            - Whether or not to record the memory that each stage allocates with tracemalloc.
+            - Makes code that creates a lot of Python objects(i.e. parsing) several times slower.
+        clear_records: bool
+            - Whether or not to remove the records of the stages from before
+    """
+    if clear_records:
+        STAGE_RECORDS.clear()
+    PROFILING_SETTINGS["enabled"] = True
+    PROFILING_SETTINGS["trace_memory"] = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable_profiling():
+    """
+    Stops recording the stages. The records are kept until profiling is enabled again.
+    """
+    if PROFILING_SETTINGS["trace_memory"] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    PROFILING_SETTINGS["enabled"] = False
+    PROFILING_SETTINGS["trace_memory"] = False
+
+def is_profiling_enabled():
+    """
+    Checks whether or not the stages are being recorded.
+
+    Returns:
+        bool
+            - True if profiling is enabled
+    """
+    return PROFILING_SETTINGS["enabled"]
+
+@contextmanager
+def profile_stage(stage, file_path=None):
+    """
+    Records the wall time of the code in a with block as a stage.
+    The number of rows or events can be added to the record that is yielded. i.e.:
+        with profile_stage("concat") as stage_record:
+            concatted_medpc_df = pd.concat(all_medpc_df)
+            stage_record["rows"] = len(concatted_medpc_df)
+    Stages can be inside other stages. The time and memory of the inner stages are also counted in the outer stage.
+
+    Args:
+        stage: str
+            - The name of the stage. i.e. "extract.dataframe.concat"
+        file_path: str
+            - The file that the stage processed. None if the stage is for more than one file.
+
+    Yields:
+        dict
+            - The record of the stage. A new dictionary that is thrown away if profiling is disabled.
+    """
+    if not PROFILING_SETTINGS["enabled"]:
+        yield {}
+        return
+
+    stage_record = {"stage": stage, "file_path": file_path, "depth": len(RUNNING_STAGE_RECORDS), "process_id": os.getpid()}
+    trace_memory = PROFILING_SETTINGS["trace_memory"] and tracemalloc.is_tracing()
+    if trace_memory:
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        # Saving the peak of the outer stage so far, before the peak is reset for this stage
+        if RUNNING_STAGE_RECORDS:
+            outer_stage_record = RUNNING_STAGE_RECORDS[-1]
+            outer_stage_record["peak_memory"] = max(outer_stage_record["peak_memory"], peak_memory)
+        tracemalloc.reset_peak()
+        stage_record["start_memory"] = current_memory
+        stage_record["peak_memory"] = current_memory
+    RUNNING_STAGE_RECORDS.append(stage_record)
+    start_time = time.perf_counter()
+    try:
+        yield stage_record
+    finally:
+        stage_record["seconds"] = time.perf_counter() - start_time
+        RUNNING_STAGE_RECORDS.pop()
+        if trace_memory and tracemalloc.is_tracing():
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            peak_memory = max(stage_record.pop("peak_memory"), peak_memory)
+            start_memory = stage_record.pop("start_memory")
+            stage_record["allocated_bytes"] = current_memory - start_memory
+            stage_record["peak_allocated_bytes"] = peak_memory - start_memory
+            if RUNNING_STAGE_RECORDS:
+                RUNNING_STAGE_RECORDS[-1]["peak_memory"] = max(RUNNING_STAGE_RECORDS[-1]["peak_memory"], peak_memory)
+        STAGE_RECORDS.append(stage_record)
+
+def run_with_stage_records(item, function, trace_memory=False):
+    """
+    Runs a function on an item with profiling enabled, and returns the records of the stages along with the output.
+    This is what each worker process runs in extract.parallel.map_in_order when profiling is enabled,
+    because the records that a worker process makes aren't seen by the main process.
+
+    Args:
+        item: any
+            - The item to apply the function to. i.e. a MED-PC file path
+        function: function
+            - The function to apply to the item
+        trace_memory: bool
+            - Whether or not to record the memory that each stage allocates with tracemalloc
+
+    Returns:
+        any, list
+            - The output of the function
+            - The records of the stages that ran in the function
+    """
+    # Worker processes that are forked start with a copy of the records and the running stages of the main process,
+    # which are already recorded in the main process
+    RUNNING_STAGE_RECORDS.clear()
+    enable_profiling(trace_memory=trace_memory, clear_records=True)
+    try:
+        output = function(item)
+        return output, list(STAGE_RECORDS)
+    finally:
+        disable_profiling()
+        STAGE_RECORDS.clear()
+
+def add_stage_records(stage_records):
+    """
+    Adds the records of the stages that ran in a worker process to the records of this process.
+    The depth of each record is increased by the number of stages that are running here, so that they are inside of those stages.
+
+    Args:
+        stage_records: list
+            - The records from profiling.stages.run_with_stage_records
+    """
+    for stage_record in stage_records:
+        stage_record["depth"] += len(RUNNING_STAGE_RECORDS)
+        STAGE_RECORDS.append(stage_record)
+
+def get_profiling_report():
+    """
+    Gets the records of all the stages as a dataframe, in the order that the stages finished.
+
+    Returns:
+        Pandas DataFrame
+            - A row for each stage, with the stage, file path, depth(number of outer stages), process ID and seconds.
+            - Along with the "rows" and "events" that the stage processed, and the allocated bytes if the memory was traced.
+    """
+    report_columns = ["stage", "file_path", "depth", "process_id", "seconds", "rows", "events", "allocated_bytes", "peak_allocated_bytes"]
+    report_df = pd.DataFrame.from_records(STAGE_RECORDS)
+    extra_columns = [column for column in report_df.columns if column not in report_columns]
+    return report_df.reindex(columns=report_columns + extra_columns)
+
+def get_stage_summary(report_df=None):
+    """
+    Adds up the records of each stage. i.e. The total time of reading all the files.
+
+    Args:
+        report_df: Pandas DataFrame
+            - Output of profiling.stages.get_profiling_report. None uses the records so far.
+
+    Returns:
+        Pandas DataFrame
+            - A row for each stage, sorted by the total seconds. With the number of times that the stage ran, 
+            the total, mean and max seconds, the total rows and events, and the rows and events per second.
+    """
+    if report_df is None:
+        report_df = get_profiling_report()
+    summary_df = report_df.groupby("stage").agg(count=("seconds", "size"), total_seconds=("seconds", "sum"), \
+        mean_seconds=("seconds", "mean"), max_seconds=("seconds", "max"), rows=("rows", "sum"), events=("events", "sum"), \
+        peak_allocated_bytes=("peak_allocated_bytes", "max"))
+    summary_df["rows_per_second"] = summary_df["rows"] / summary_df["total_seconds"]
+    summary_df["events_per_second"] = summary_df["events"] / summary_df["total_seconds"]
+    return summary_df.sort_values("total_seconds", ascending=False)
+
+def save_profiling_report(file_path):
+    """
+    Saves the records of all the stages as a JSON or CSV file, depending on the file extension.
+
+    Args:
+        file_path: str
+            - The path to save the report to. Ends with ".json" or ".csv".
+    """
+    report_df = get_profiling_report()
+    if os.path.splitext(file_path)[1].lower() == ".json":
+        with open(file_path, "w") as file:
+            json.dump(json.loads(report_df.to_json(orient="records")), file, indent=1)
+    else:
+        report_df.to_csv(file_path, index=False)
+
+def main():
+    """
+    Main function that runs when the script is run
+    """
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+Puts the src directory on the path, so that the tests import the modules the same way as the notebooks(i.e. "from extract.parser import ...").
+Also has the example recordings that the tests run on, and a parsed cohort of them that is shared by all the tests.
+"""
+import glob
+import os
+import sys
+import pytest
+
+SRC_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIRECTORY not in sys.path:
+    sys.path.insert(0, SRC_DIRECTORY)
+
+from extract.dataframe import get_medpc_dataframe_from_list_of_files
+
+EXAMPLE_RECORDINGS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jupyter_notebooks", \
+    "example_recordings")
+EXAMPLE_RECORDING_FILES = sorted(glob.glob(os.path.join(EXAMPLE_RECORDINGS_DIRECTORY, "*.txt")))
+# The columns of the recordings that the tests of the tones and the port use
+EXAMPLE_RECORDING_COLUMNS = ["(S)CSpresentation", "(P)Portentry", "(N)Portexit"]
+
+@pytest.fixture(scope="session")
+def concatted_medpc_df(request):
+    """
+    The tone, port entry and port exit times of the example recordings, parsed once for all the tests.
+    All the files are parsed by default. Parametrizing the fixture indirectly with a number(i.e. 12) only parses that many of the first files.
+    """
+    number_of_files = getattr(request, "param", None)
+    return get_medpc_dataframe_from_list_of_files(medpc_files=EXAMPLE_RECORDING_FILES[:number_of_files], columns=EXAMPLE_RECORDING_COLUMNS)
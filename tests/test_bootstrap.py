@@ -0,0 +1,28 @@
+"""
+Tests that the p-values of the hierarchical permutation test match the ones from counting every split of the units.
+"""
+import numpy as np
+import pytest
+from processing.bootstrap import get_hierarchical_permutation_test
+
+def test_permutation_p_value_matches_exact_split():
+    # 4 subjects with 2 tones each, and the means of the subjects are 1, 2, 3 and 4
+    values = np.array([0.5, 1.5, 1.5, 2.5, 2.5, 3.5, 3.5, 4.5])
+    subjects = np.repeat(["1.1", "1.2", "1.3", "1.4"], 2)
+    conditions = np.repeat(["a", "b"], 4)
+    difference, p_value = get_hierarchical_permutation_test(values=values, group_labels=[subjects], condition_labels=conditions, \
+        number_of_permutations=20000, seed=42)
+    assert difference == pytest.approx(-2)
+    # 2 of the 6 ways to split 4 subjects in 2 are as extreme as the observed split
+    assert p_value == pytest.approx(1 / 3, abs=0.02)
+
+def test_permutation_p_value_counts_splits_that_tie_up_to_rounding():
+    # The tones of every subject add up to 1.2, so every split has the same means. Adding up multiples of 0.1 in a different order
+    # gives differences like 1.1e-16 instead of 0, which must still be counted as being as extreme as the observed difference.
+    values = np.array([2, 6, 4, 2, 3, 7, 5, 4, 3, 0, 0, 12, 6, 6, 0, 6, 4, 2]) * 0.1
+    subjects = np.repeat(["1.1", "1.2", "1.3", "1.4", "2.1", "2.2"], 3)
+    conditions = np.repeat(["a", "b"], 9)
+    difference, p_value = get_hierarchical_permutation_test(values=values, group_labels=[subjects], condition_labels=conditions, \
+        number_of_permutations=999, seed=0)
+    assert difference == pytest.approx(0, abs=1e-12)
+    assert p_value == 1
@@ -0,0 +1,33 @@
+"""
+Tests that ingesting a directory adds the new and changed MED-PC files to the Parquet session store.
+"""
+import glob
+import os
+import shutil
+from extract.ingest import ingest_new_medpc_files, load_manifest
+from extract.storage import load_medpc_metadata, load_medpc_session_store
+from conftest import EXAMPLE_RECORDING_FILES, EXAMPLE_RECORDINGS_DIRECTORY
+
+def test_ingest_adds_new_and_changed_files_to_the_session_store(tmp_path):
+    medpc_directory = tmp_path / "data"
+    medpc_directory.mkdir()
+    for msn_file_path in glob.glob(os.path.join(EXAMPLE_RECORDINGS_DIRECTORY, "*.MPC")):
+        shutil.copy(msn_file_path, str(medpc_directory))
+    for file_path in EXAMPLE_RECORDING_FILES[:2]:
+        shutil.copy(file_path, str(medpc_directory))
+    store_directory = str(tmp_path / "store")
+
+    ingested_files, invalid_files = ingest_new_medpc_files(medpc_files=str(medpc_directory), store_directory=store_directory)
+    assert len(ingested_files) == 2 and invalid_files == []
+    # Nothing has changed, so nothing is read again
+    assert ingest_new_medpc_files(medpc_files=str(medpc_directory), store_directory=store_directory) == ([], [])
+
+    shutil.copy(EXAMPLE_RECORDING_FILES[2], str(medpc_directory))
+    (medpc_directory / "not_a_recording.txt").write_text("garbage\n")
+    ingested_files, invalid_files = ingest_new_medpc_files(medpc_files=str(medpc_directory), store_directory=store_directory)
+    assert len(ingested_files) == 1 and len(invalid_files) == 1
+
+    all_file_paths = set(glob.glob(os.path.join(str(medpc_directory), "*.txt"))) - set(invalid_files)
+    assert set(load_medpc_session_store(store_directory=store_directory)["file_path"]) == all_file_paths
+    assert set(load_medpc_metadata(store_directory=store_directory)["file_path"]) == all_file_paths
+    assert len(load_manifest(store_directory=store_directory)) == 4
@@ -0,0 +1,42 @@
+"""
+Tests that the cohort report's (session, increment) sums and counts, which are made a chunk of sessions at a time,
+are the same as adding up the (session, tone, increment) arrays over the tones.
+"""
+import numpy as np
+import pytest
+from extract.memory_map import save_memory_mapped_medpc_files
+from processing.port import get_cohort_peri_tone_inside_port_tensor, get_cohort_peri_tone_session_sums_and_counts, \
+    get_memory_mapped_peri_tone_session_sums_and_counts, save_memory_mapped_inside_port_masks
+from conftest import EXAMPLE_RECORDING_FILES
+
+NUMBER_OF_FILES = 12
+# Only parsing the first few files for all the tests of this module
+pytestmark = pytest.mark.parametrize("concatted_medpc_df", [NUMBER_OF_FILES], indirect=True)
+
+@pytest.fixture(scope="module")
+def expected_sums_and_counts(concatted_medpc_df):
+    peri_tone_tensor, is_valid, session_df = get_cohort_peri_tone_inside_port_tensor(concatted_medpc_df=concatted_medpc_df)
+    return np.where(is_valid, peri_tone_tensor, 0).sum(axis=1), is_valid.sum(axis=1), session_df
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 100])
+def test_cohort_session_sums_and_counts(concatted_medpc_df, expected_sums_and_counts, chunk_size):
+    expected_sums, expected_counts, expected_session_df = expected_sums_and_counts
+    session_sums, session_counts, session_df = get_cohort_peri_tone_session_sums_and_counts(concatted_medpc_df=concatted_medpc_df, \
+        chunk_size=chunk_size)
+    np.testing.assert_array_equal(session_sums, expected_sums)
+    np.testing.assert_array_equal(session_counts, expected_counts)
+    assert session_df.equals(expected_session_df)
+
+def test_memory_mapped_session_sums_and_counts(tmp_path, expected_sums_and_counts):
+    expected_sums, expected_counts, expected_session_df = expected_sums_and_counts
+    memory_map_directory = str(tmp_path / "memory_map")
+    save_memory_mapped_medpc_files(medpc_files=EXAMPLE_RECORDING_FILES[:NUMBER_OF_FILES], memory_map_directory=memory_map_directory, chunk_size=5)
+    save_memory_mapped_inside_port_masks(memory_map_directory=memory_map_directory, chunk_size=5)
+    session_sums, session_counts, session_df = get_memory_mapped_peri_tone_session_sums_and_counts( \
+        memory_map_directory=memory_map_directory, chunk_size=5)
+    # The memory-mapped sessions are in the order of the files, so they are lined up by file path
+    session_order = session_df["file_path"].map({file_path: index for index, file_path in \
+        enumerate(expected_session_df["file_path"])}).to_numpy()
+    np.testing.assert_array_equal(session_sums, expected_sums[session_order])
+    np.testing.assert_array_equal(session_counts, expected_counts[session_order])
+    np.testing.assert_array_equal(session_df["number_of_tones"].to_numpy(), expected_session_df["number_of_tones"].to_numpy()[session_order])
@@ -0,0 +1,27 @@
+"""
+Tests that the stages that run in worker processes are in the profiling report.
+"""
+import pytest
+from extract.dataframe import get_medpc_dataframe_from_list_of_files
+from profiling.stages import disable_profiling, enable_profiling, get_profiling_report
+from conftest import EXAMPLE_RECORDING_FILES
+
+# A few files are enough to check that the stages of every file are recorded
+PROFILED_FILES = EXAMPLE_RECORDING_FILES[:6]
+
+@pytest.mark.parametrize("number_of_workers", [1, 2])
+def test_stages_of_every_file_are_recorded(number_of_workers):
+    enable_profiling()
+    try:
+        get_medpc_dataframe_from_list_of_files(medpc_files=PROFILED_FILES, number_of_workers=number_of_workers)
+    finally:
+        disable_profiling()
+    report_df = get_profiling_report()
+    stage_counts = report_df["stage"].value_counts()
+    assert stage_counts["extract.dataframe.read_file"] == len(PROFILED_FILES)
+    assert stage_counts["extract.dataframe.parse_file"] == len(PROFILED_FILES)
+    assert stage_counts["extract.dataframe.read_files"] == 1
+    read_file_df = report_df[report_df["stage"] == "extract.dataframe.read_file"]
+    assert set(read_file_df["file_path"]) == set(PROFILED_FILES)
+    # The stages of the files are inside of the stage that reads all the files
+    assert (read_file_df["depth"] == 1).all()
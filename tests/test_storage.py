@@ -0,0 +1,42 @@
+"""
+Tests that saving sessions to the Parquet store keeps the other sessions, including the ones with the same date, subject and MSN.
+"""
+import glob
+import os
+import shutil
+from extract.dataframe import get_medpc_dataframe_from_list_of_files
+from extract.storage import load_medpc_metadata, load_medpc_session_store, save_medpc_session_store
+from conftest import EXAMPLE_RECORDING_FILES
+
+def copy_recording(file_path, copy_directory, copy_name):
+    """
+    Copies a recording and its MED-PC script, so that the copy can be read the same way as the original.
+    """
+    for msn_file_path in glob.glob(os.path.join(os.path.dirname(file_path), "*.MPC")):
+        shutil.copy(msn_file_path, copy_directory)
+    copy_file_path = os.path.join(copy_directory, copy_name)
+    shutil.copy(file_path, copy_file_path)
+    return copy_file_path
+
+def test_sessions_with_the_same_partition_are_kept(tmp_path):
+    first_file_path = copy_recording(file_path=EXAMPLE_RECORDING_FILES[0], copy_directory=str(tmp_path), copy_name="a.txt")
+    rerun_file_path = copy_recording(file_path=EXAMPLE_RECORDING_FILES[0], copy_directory=str(tmp_path), copy_name="b_rerun.txt")
+    store_directory = str(tmp_path / "store")
+    save_medpc_session_store(concatted_medpc_df=get_medpc_dataframe_from_list_of_files([first_file_path]), store_directory=store_directory)
+    save_medpc_session_store(concatted_medpc_df=get_medpc_dataframe_from_list_of_files([rerun_file_path]), store_directory=store_directory)
+
+    session_df = load_medpc_session_store(store_directory=store_directory)
+    assert set(session_df["file_path"]) == {first_file_path, rerun_file_path}
+    assert set(load_medpc_metadata(store_directory=store_directory)["file_path"]) == {first_file_path, rerun_file_path}
+    assert (session_df["file_path"] == first_file_path).sum() == (session_df["file_path"] == rerun_file_path).sum()
+
+def test_saving_a_session_again_replaces_its_rows(tmp_path):
+    store_directory = str(tmp_path / "store")
+    medpc_df = get_medpc_dataframe_from_list_of_files(EXAMPLE_RECORDING_FILES[:3])
+    save_medpc_session_store(concatted_medpc_df=medpc_df, store_directory=store_directory)
+    save_medpc_session_store(concatted_medpc_df=medpc_df[medpc_df["file_path"] == EXAMPLE_RECORDING_FILES[1]], \
+        store_directory=store_directory)
+
+    session_df = load_medpc_session_store(store_directory=store_directory)
+    assert len(session_df) == len(medpc_df)
+    assert set(session_df["file_path"]) == set(EXAMPLE_RECORDING_FILES[:3])
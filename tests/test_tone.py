@@ -0,0 +1,49 @@
+"""
+Tests that the binary search version of finding the port entries around the tones gives the same results as the loops over every tone.
+"""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from processing.tone import get_first_port_entries_after_tone, get_last_port_entries_before_tone, get_port_entries_around_tones, \
+    get_valid_tones
+from conftest import EXAMPLE_RECORDING_FILES
+
+def get_expected_port_entries_around_tones(tone_pd_series, port_entries_pd_series, port_exits_pd_series):
+    """
+    Gets the port entries around the tones with the loops over every tone, merged the same way as notebook 02.
+    """
+    first_port_entry_df = get_first_port_entries_after_tone(tone_pd_series=tone_pd_series, port_entries_pd_series=port_entries_pd_series, \
+        port_exits_pd_series=port_exits_pd_series)
+    last_port_entry_df = get_last_port_entries_before_tone(tone_pd_series=tone_pd_series, port_entries_pd_series=port_entries_pd_series, \
+        port_exits_pd_series=port_exits_pd_series)
+    return pd.merge(first_port_entry_df, last_port_entry_df.drop(columns=["current_tone_time"]), left_index=True, right_index=True)
+
+def assert_same_port_entries_around_tones(tone_pd_series, port_entries_pd_series, port_exits_pd_series):
+    expected_df = get_expected_port_entries_around_tones(tone_pd_series=tone_pd_series, port_entries_pd_series=port_entries_pd_series, \
+        port_exits_pd_series=port_exits_pd_series)
+    result_df = get_port_entries_around_tones(tone_pd_series=tone_pd_series, port_entries_pd_series=port_entries_pd_series, \
+        port_exits_pd_series=port_exits_pd_series)
+    pd.testing.assert_frame_equal(result_df[expected_df.columns], expected_df, check_dtype=False)
+
+def test_example_recordings_exist():
+    assert len(EXAMPLE_RECORDING_FILES) > 0
+
+@pytest.mark.parametrize("file_path", EXAMPLE_RECORDING_FILES, ids=os.path.basename)
+def test_port_entries_around_tones_match_loops_for_example_recordings(concatted_medpc_df, file_path):
+    session_df = concatted_medpc_df[concatted_medpc_df["file_path"] == file_path]
+    valid_tones = get_valid_tones(tone_pd_series=session_df["(S)CSpresentation"])
+    if len(valid_tones) == 0:
+        pytest.skip("No valid tones in {}".format(file_path))
+    assert_same_port_entries_around_tones(tone_pd_series=valid_tones, port_entries_pd_series=session_df["(P)Portentry"].dropna(), \
+        port_exits_pd_series=session_df["(N)Portexit"].dropna())
+
+def test_port_entries_around_tones_match_loops_for_probe_tones(concatted_medpc_df):
+    session_df = concatted_medpc_df[concatted_medpc_df["file_path"] == EXAMPLE_RECORDING_FILES[0]]
+    port_entries_pd_series = session_df["(P)Portentry"].dropna()
+    port_exits_pd_series = session_df["(N)Portexit"].dropna()
+    # Tones before the first port entry, on a port entry, after the last port entry, and NaN
+    probe_tones = pd.Series([port_entries_pd_series.min() - 5, port_entries_pd_series.iloc[len(port_entries_pd_series) // 2], \
+        port_entries_pd_series.max() + 5, np.nan])
+    assert_same_port_entries_around_tones(tone_pd_series=probe_tones, port_entries_pd_series=port_entries_pd_series, \
+        port_exits_pd_series=port_exits_pd_series)